@@ -8,7 +8,9 @@ from skimage.morphology import disk, ball
 class RankSuite(object):
 
     param_names = ["filter_func", "shape"]
-    params = [sorted(all_rank_filters), [(32, 32), (256, 256)]]
+    # `multi` applies several of the filters at once
+    params = [sorted(set(all_rank_filters) - {'multi'}),
+              [(32, 32), (256, 256)]]
 
     def setup(self, filter_func, shape):
         self.image = np.random.randint(0, 255, size=shape, dtype=np.uint8)
@@ -29,3 +31,18 @@ class Rank3DSuite(object):
 
     def time_3d_filters(self, filter3d, shape3d):
         getattr(rank, filter3d)(self.volume, self.selem_3d)
+
+
+class RankRectangleSuite(object):
+    """Rectangular footprints, whose cost should not depend on their size."""
+
+    param_names = ["filter_func", "width"]
+    params = [["minimum", "maximum"], [3, 15, 51]]
+
+    def setup(self, filter_func, width):
+        self.image = np.random.randint(0, 255, size=(1000, 1200),
+                                       dtype=np.uint8)
+        self.footprint = np.ones((width, width), dtype=np.uint8)
+
+    def time_filter(self, filter_func, width):
+        getattr(rank, filter_func)(self.image, self.footprint)
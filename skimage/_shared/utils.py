@@ -145,8 +145,15 @@ class deprecate_kwarg:
             self.warning_msg = warning_msg
 
     def __call__(self, func):
+        old_args = frozenset(self.kwarg_mapping)
+
         @functools.wraps(func)
         def fixed_func(*args, **kwargs):
+            # calls without deprecated names, by far the most frequent, only
+            # check that no keyword is one of them
+            if not kwargs or old_args.isdisjoint(kwargs):
+                return func(*args, **kwargs)
+
             for old_arg, new_arg in self.kwarg_mapping.items():
                 if old_arg in kwargs:
                     #  warn that the function interface has changed:
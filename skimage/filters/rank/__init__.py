@@ -1,7 +1,7 @@
 from .generic import (autolevel, equalize, gradient, majority, maximum,
                       mean, geometric_mean, subtract_mean, median, minimum,
                       modal, enhance_contrast, pop, threshold, noise_filter,
-                      entropy, otsu, sum, windowed_histogram)
+                      entropy, otsu, sum, windowed_histogram, multi)
 from ._percentile import (autolevel_percentile, gradient_percentile,
                           mean_percentile, subtract_mean_percentile,
                           enhance_contrast_percentile, percentile,
@@ -25,6 +25,7 @@ __all__ = ['autolevel',
            'median',
            'minimum',
            'modal',
+           'multi',
            'enhance_contrast',
            'enhance_contrast_percentile',
            'pop',
@@ -0,0 +1,234 @@
+"""CUDA implementation of the rank filters reducing the neighborhood values.
+
+The minimum, maximum, sum, mean and pop filters of CuPy images do not need a
+histogram: each thread reduces the neighborhood of one pixel. Each block of
+threads first loads the tile of the image its neighborhoods span into shared
+memory, together with whether each pixel of the tile is in the image and the
+mask, so that the image is read once per block instead of once per
+footprint element. The tiles of large footprints exceeding the shared
+memory are not loaded, the values being then read from the global memory.
+
+The filters take the arguments of their NumPy counterparts of `generic`,
+which forwards CuPy images to them (see `generic._forward_cupy`).
+
+"""
+
+from functools import lru_cache
+
+import cupy as cp
+import numpy as np
+
+
+_REDUCTIONS = {
+    'minimum': ('acc = pop ? min(acc, v) : v;', '(OUT)acc'),
+    'maximum': ('acc = pop ? max(acc, v) : v;', '(OUT)acc'),
+    'sum': ('acc += v;', '(OUT)acc'),
+    'mean': ('acc += v;', '(OUT)(acc / (double)pop)'),
+    'pop': ('', '(OUT)pop'),
+}
+
+_KERNEL_SOURCE = r'''
+typedef {image_type} T;
+typedef {out_type} OUT;
+
+extern "C" __global__
+void rank_reduce(const T* image, const unsigned char* mask,
+                 const int has_mask, const int* offsets, const int n_offsets,
+                 const int planes, const int rows, const int cols,
+                 const int halo_p, const int halo_r, const int halo_c,
+                 const int tile_p, const int tile_r, const int tile_c,
+                 OUT* out)
+{{
+    // the tile values, followed by whether each of them is in the
+    // neighborhoods, i.e. in the image and in the mask; tiles too large for
+    // the shared memory are given an empty shape, and the values are then
+    // read from the global memory
+    extern __shared__ unsigned char shared[];
+    T* tile = (T*)shared;
+    unsigned char* valid = shared + tile_p * tile_r * tile_c * sizeof(T);
+    const bool tiled = tile_p > 0;
+
+    if (tiled) {{
+        const int p0 = blockIdx.z * blockDim.z - halo_p;
+        const int r0 = blockIdx.y * blockDim.y - halo_r;
+        const int c0 = blockIdx.x * blockDim.x - halo_c;
+        const int n_threads = blockDim.x * blockDim.y * blockDim.z;
+        const int thread = ((threadIdx.z * blockDim.y + threadIdx.y)
+                            * blockDim.x + threadIdx.x);
+        for (int i = thread; i < tile_p * tile_r * tile_c; i += n_threads) {{
+            int p = p0 + i / (tile_r * tile_c);
+            int r = r0 + i / tile_c % tile_r;
+            int c = c0 + i % tile_c;
+            bool inside = (0 <= p && p < planes && 0 <= r && r < rows
+                           && 0 <= c && c < cols);
+            long long index = ((long long)p * rows + r) * cols + c;
+            inside = inside && (!has_mask || mask[index]);
+            tile[i] = inside ? image[index] : (T)0;
+            valid[i] = inside;
+        }}
+        __syncthreads();
+    }}
+
+    const int p = blockIdx.z * blockDim.z + threadIdx.z;
+    const int r = blockIdx.y * blockDim.y + threadIdx.y;
+    const int c = blockIdx.x * blockDim.x + threadIdx.x;
+    if (p >= planes || r >= rows || c >= cols) {{
+        return;
+    }}
+
+    long long pop = 0;
+    {acc_type} acc = 0;
+    for (int k = 0; k < n_offsets; k++) {{
+        bool inside;
+        T v;
+        if (tiled) {{
+            int i = ((threadIdx.z + halo_p + offsets[3 * k]) * tile_r
+                     + threadIdx.y + halo_r + offsets[3 * k + 1]) * tile_c
+                    + threadIdx.x + halo_c + offsets[3 * k + 2];
+            inside = valid[i];
+            v = tile[i];
+        }} else {{
+            int pp = p + offsets[3 * k];
+            int rr = r + offsets[3 * k + 1];
+            int cc = c + offsets[3 * k + 2];
+            long long index = ((long long)pp * rows + rr) * cols + cc;
+            inside = (0 <= pp && pp < planes && 0 <= rr && rr < rows
+                      && 0 <= cc && cc < cols
+                      && (!has_mask || mask[index]));
+            v = inside ? image[index] : (T)0;
+        }}
+        if (inside) {{
+            {update}
+            pop++;
+        }}
+    }}
+    out[((long long)p * rows + r) * cols + c] = pop ? {result} : (OUT)0;
+}}
+'''
+
+
+@lru_cache(maxsize=32)
+def _reduce_kernel(name, image_type, out_type):
+    """Compile the kernel of a reduction for the given C types."""
+    update, result = _REDUCTIONS[name]
+    # the minimum and maximum are exact in the image type, the sums need
+    # a wider accumulator
+    acc_type = 'T' if name in ('minimum', 'maximum') else 'long long'
+    source = _KERNEL_SOURCE.format(image_type=image_type, out_type=out_type,
+                                   acc_type=acc_type, update=update,
+                                   result=result)
+    return cp.RawKernel(source, 'rank_reduce')
+
+
+_C_TYPES = {
+    np.dtype(np.uint8): 'unsigned char',
+    np.dtype(np.uint16): 'unsigned short',
+    np.dtype(np.int32): 'int',
+    np.dtype(np.int64): 'long long',
+    np.dtype(np.float32): 'float',
+    np.dtype(np.float64): 'double',
+}
+
+
+def _supports(image):
+    """Check whether the kernels filter images of this dtype and dimension.
+
+    The other images are forwarded to cuCIM (see `generic._forward_cupy`).
+    """
+    return image.dtype in (np.uint8, np.uint16) and image.ndim in (2, 3)
+
+
+def _block_shape(ndim):
+    """Return the number of threads of a block along the planes, rows, cols."""
+    return (1, 16, 16) if ndim == 2 else (4, 8, 8)
+
+
+def _apply(name, image, footprint, out, mask, shift_x, shift_y, shift_z):
+    """Filter a CuPy image with the reduction `name` over the footprint."""
+    if image.ndim not in (2, 3):
+        raise ValueError(f'{name} filters 2-D and 3-D images only.')
+    if image.dtype not in (np.uint8, np.uint16):
+        raise TypeError(f'{name} filters uint8 and uint16 CuPy images only, '
+                        f'got {image.dtype}.')
+    footprint = cp.asnumpy(footprint) if isinstance(footprint, cp.ndarray) \
+        else np.asarray(footprint)
+    if footprint.ndim != image.ndim:
+        raise ValueError('Image dimensions and neighborhood dimensions '
+                         'do not match')
+
+    # same axes and shifts as the 3-D Cython core (see `generic._to_3D`)
+    if image.ndim == 2:
+        shifts = (0, shift_y, shift_x)
+        footprint = footprint[np.newaxis]
+    else:
+        shifts = (shift_x, shift_y, shift_z)
+    centre = np.array(footprint.shape) // 2 + np.array(shifts, dtype=int)
+    if not all(0 <= c < s for c, s in zip(centre, footprint.shape)):
+        raise ValueError('half footprint + shift must be between 0 and '
+                         'footprint')
+    offsets = np.array(np.nonzero(footprint > 0)).T - centre
+    n_offsets = len(offsets)
+    if n_offsets == 0:
+        offsets = np.zeros((1, 3), dtype=int)
+    halo_before = np.maximum(-offsets.min(axis=0), 0)
+    halo_after = np.maximum(offsets.max(axis=0), 0)
+
+    image = cp.ascontiguousarray(image)
+    shape = (1,) * (3 - image.ndim) + image.shape
+    has_mask = mask is not None
+    if has_mask:
+        mask = cp.ascontiguousarray(cp.asarray(mask) > 0).view(cp.uint8)
+    else:
+        # never read, a pointer is passed all the same
+        mask = cp.empty(1, dtype=cp.uint8)
+    if out is None:
+        out = cp.empty(image.shape, dtype=image.dtype)
+    elif out.shape[:image.ndim] != image.shape or not out.flags.c_contiguous:
+        raise ValueError('out must be a C-contiguous array with the shape '
+                         'of the image.')
+    elif out.dtype not in _C_TYPES:
+        raise TypeError(f'{name} does not support out arrays of dtype '
+                        f'{out.dtype}, use one of '
+                        f'{", ".join(str(dtype) for dtype in _C_TYPES)}.')
+
+    block = _block_shape(image.ndim)
+    tile = np.array(block) + halo_before + halo_after
+    shared_size = int(np.prod(tile)) * (image.dtype.itemsize + 1)
+    max_shared_size = cp.cuda.Device().attributes['MaxSharedMemoryPerBlock']
+    if shared_size > max_shared_size:
+        tile[:] = 0
+        shared_size = 0
+    grid = tuple((size + b - 1) // b for size, b in zip(shape, block))
+
+    kernel = _reduce_kernel(name, _C_TYPES[image.dtype],
+                            _C_TYPES[out.dtype])
+    args = (image, mask, np.int32(has_mask),
+            cp.asarray(offsets.ravel(), dtype=cp.int32),
+            np.int32(n_offsets), *(np.int32(size) for size in shape),
+            *(np.int32(h) for h in halo_before),
+            *(np.int32(t) for t in tile), out)
+    # the CUDA grid and block are ordered as columns, rows, planes
+    kernel(grid[::-1], block[::-1], args, shared_mem=shared_size)
+    return out
+
+
+def _make_filter(name):
+    """Return the CuPy filter `name` with the signature of the NumPy one."""
+
+    def rank_filter(image, footprint, out=None, mask=None, shift_x=False,
+                    shift_y=False, shift_z=False, n_bins=None,
+                    num_threads=None, max_n_bins=None):
+        # the values are reduced exactly, without histogram, the number of
+        # bins and threads thus do not apply
+        return _apply(name, image, footprint, out, mask, int(shift_x),
+                      int(shift_y), int(shift_z))
+
+    rank_filter.__name__ = name
+    return rank_filter
+
+
+minimum = _make_filter('minimum')
+maximum = _make_filter('maximum')
+sum = _make_filter('sum')
+mean = _make_filter('mean')
+pop = _make_filter('pop')
@@ -0,0 +1,409 @@
+"""Numba implementation of the generic rank filters.
+
+These filters take the same arguments as their Cython counterparts of
+`generic_cy`, and are used in their place when the ``SKIMAGE_BACKEND``
+environment variable is set to ``numba`` (see `generic._numba_filter`).
+
+The local histogram of each stripe of rows is built from the neighborhood of
+its first pixel, then updated with the elements entering and leaving the
+footprint as it moves along the rows, alternately east and west, and south
+from one row to the next, the stripes being processed in parallel.
+
+The minimum, maximum, sum, mean and pop filters of small footprints without
+mask are instead computed by kernels generated for the footprint, which read
+each element of the neighborhood without loop nor histogram (see
+`_specialized_kernel`).
+
+"""
+
+import math
+from functools import lru_cache
+
+import numba
+import numpy as np
+
+
+@numba.njit(cache=True)
+def _kernel_maximum(histo, pop, g, n_bins):
+    if pop:
+        for i in range(n_bins - 1, -1, -1):
+            if histo[i]:
+                return i
+    return 0
+
+
+@numba.njit(cache=True)
+def _kernel_mean(histo, pop, g, n_bins):
+    if pop:
+        mean = 0
+        for i in range(n_bins):
+            mean += histo[i] * i
+        return mean / pop
+    return 0
+
+
+@numba.njit(cache=True)
+def _kernel_minimum(histo, pop, g, n_bins):
+    if pop:
+        for i in range(n_bins):
+            if histo[i]:
+                return i
+    return 0
+
+
+@numba.njit(cache=True)
+def _kernel_modal(histo, pop, g, n_bins):
+    hmax = 0
+    imax = 0
+    if pop:
+        for i in range(n_bins):
+            if histo[i] > hmax:
+                hmax = histo[i]
+                imax = i
+    return imax
+
+
+@numba.njit(cache=True)
+def _kernel_pop(histo, pop, g, n_bins):
+    return pop
+
+
+@numba.njit(cache=True)
+def _kernel_sum(histo, pop, g, n_bins):
+    total = 0
+    if pop:
+        for i in range(n_bins):
+            total += histo[i] * i
+    return total
+
+
+@numba.njit(cache=True)
+def _kernel_threshold(histo, pop, g, n_bins):
+    if pop:
+        mean = 0
+        for i in range(n_bins):
+            mean += histo[i] * i
+        return 1 if g > mean / pop else 0
+    return 0
+
+
+@numba.njit(cache=True)
+def _kernel_entropy(histo, pop, g, n_bins):
+    e = 0.
+    if pop:
+        for i in range(n_bins):
+            p = histo[i] / pop
+            if p > 0:
+                e -= p * math.log(p) / 0.6931471805599453
+    return e
+
+
+@numba.njit(cache=True)
+def _kernel_otsu(histo, pop, g, n_bins):
+    if not pop:
+        return 0
+    mu = 0
+    for i in range(n_bins):
+        mu += histo[i] * i
+
+    # maximizing the between class variance
+    max_i = 0
+    q1 = histo[0]
+    mu1 = 0
+    max_sigma_b = 0.
+    for i in range(1, n_bins):
+        P = histo[i]
+        if P == 0:
+            continue
+        q1 += P
+        if q1 == pop:
+            break
+        mu1 += i * P
+        mu2 = mu - mu1
+        t = (pop - q1) * mu1 - mu2 * q1
+        sigma_b = (t * t) / (q1 * (pop - q1))
+        if sigma_b > max_sigma_b:
+            max_sigma_b = sigma_b
+            max_i = i
+    return max_i
+
+
+@numba.njit(cache=True)
+def _kernel_majority(histo, pop, g, n_bins):
+    candidate = 0
+    if pop:
+        votes = histo[0]
+        for i in range(1, n_bins):
+            if histo[i] > votes:
+                candidate = i
+                votes = histo[i]
+    return candidate
+
+
+# minimum number of rows of the stripes processed in parallel, as in the
+# Cython core
+_MIN_STRIPE_ROWS = 32
+
+
+@numba.njit(cache=True)
+def _add_elements(image, mask, histo, offsets, p, r, c, weight):
+    """Add `weight` to the bins of the elements at the offsets of a pixel.
+
+    Returns the change of the population of the histogram.
+    """
+    planes, rows, cols = image.shape
+    pop = 0
+    for k in range(offsets.shape[1]):
+        pp = p + offsets[0, k]
+        rr = r + offsets[1, k]
+        cc = c + offsets[2, k]
+        if (0 <= pp < planes and 0 <= rr < rows and 0 <= cc < cols
+                and mask[pp, rr, cc]):
+            histo[image[pp, rr, cc]] += weight
+            pop += weight
+    return pop
+
+
+def _make_core(kernel):
+    """Return the parallel core applying `kernel` to each local histogram."""
+
+    @numba.njit(parallel=True)
+    def core(image, mask, on, east, west, south, north, stripe_rows,
+             histo_size, n_bins, out):
+        planes, rows, cols = image.shape
+        n_stripes = (rows + stripe_rows - 1) // stripe_rows if cols else 0
+        for item in numba.prange(planes * n_stripes):
+            p = item // n_stripes
+            r_start = item % n_stripes * stripe_rows
+            r_stop = min(r_start + stripe_rows, rows)
+            # the histogram of the stripe is built from the neighborhood of
+            # its first pixel, then carried along its rows, east on the even
+            # ones and west on the odd ones, and south between them
+            histo = np.zeros(histo_size, dtype=np.intp)
+            pop = _add_elements(image, mask, histo, on, p, r_start, 0, 1)
+            out[p, r_start, 0, 0] = kernel(histo, pop, image[p, r_start, 0],
+                                           n_bins)
+            c = 0
+            for r in range(r_start, r_stop):
+                if r > r_start:
+                    pop += _add_elements(image, mask, histo, south, p, r, c,
+                                         1)
+                    pop += _add_elements(image, mask, histo, north, p, r - 1,
+                                         c, -1)
+                    out[p, r, c, 0] = kernel(histo, pop, image[p, r, c],
+                                             n_bins)
+                if (r - r_start) % 2 == 0:
+                    for c in range(1, cols):
+                        pop += _add_elements(image, mask, histo, east, p, r,
+                                             c, 1)
+                        pop += _add_elements(image, mask, histo, west, p, r,
+                                             c - 1, -1)
+                        out[p, r, c, 0] = kernel(histo, pop, image[p, r, c],
+                                                 n_bins)
+                    c = cols - 1
+                else:
+                    for c in range(cols - 2, -1, -1):
+                        pop += _add_elements(image, mask, histo, west, p, r,
+                                             c, 1)
+                        pop += _add_elements(image, mask, histo, east, p, r,
+                                             c + 1, -1)
+                        out[p, r, c, 0] = kernel(histo, pop, image[p, r, c],
+                                                 n_bins)
+                    c = 0
+
+    return core
+
+
+# maximum number of elements of the footprints with specialized kernels
+_MAX_SPECIALIZED_SIZE = 49
+
+# reductions of the filters with specialized kernels
+_MIN, _MAX, _SUM, _MEAN, _POP = range(5)
+
+_REDUCTION_SOURCE = {
+    _MIN: ('acc = {first}', 'acc = min(acc, {value})', 'acc'),
+    _MAX: ('acc = {first}', 'acc = max(acc, {value})', 'acc'),
+    _SUM: ('acc = np.int64({first})', 'acc += {value}', 'acc'),
+    _MEAN: ('acc = np.int64({first})', 'acc += {value}', 'acc / {size}'),
+    _POP: ('', '', '{size}'),
+}
+
+
+@lru_cache(maxsize=32)
+def _specialized_kernel(reduction, offsets):
+    """Generate the kernel of a reduction over a fixed footprint.
+
+    The kernel fills the output for the pixels whose neighborhood lies within
+    the image, each element of the footprint being read by its own line of
+    the generated source. The kernels are cached, a footprint being usually
+    applied to many images.
+
+    Parameters
+    ----------
+    reduction : int
+        One of `_MIN`, `_MAX`, `_SUM`, `_MEAN` or `_POP`.
+    offsets : tuple of tuple of int
+        Relative plane, row and column of each footprint element.
+
+    Returns
+    -------
+    kernel : function
+        Numba function taking the image, the output and the bounds
+        ``p0, p1, r0, r1, c0, c1`` of the pixels to process.
+
+    """
+    init, update, result = _REDUCTION_SOURCE[reduction]
+    values = [f'image[p + {dp}, r + {dr}, c + {dc}]'
+              for dp, dr, dc in offsets]
+    body = [init.format(first=values[0])] if init else []
+    body += [update.format(value=value) for value in values[1:] if update]
+    body.append(f'out[p, r, c, 0] = {result.format(size=len(offsets))}')
+    source = '\n'.join(
+        ['def kernel(image, out, p0, p1, r0, r1, c0, c1):',
+         '    for item in numba.prange((p1 - p0) * (r1 - r0)):',
+         '        p = p0 + item // (r1 - r0)',
+         '        r = r0 + item % (r1 - r0)',
+         '        for c in range(c0, c1):']
+        + ['            ' + line for line in body]
+    )
+    namespace = {'numba': numba, 'np': np}
+    exec(source, namespace)
+    return numba.njit(parallel=True)(namespace['kernel'])
+
+
+@numba.njit(parallel=True, cache=True)
+def _border_reduction(image, on, reduction, p0, p1, r0, r1, c0, c1, out):
+    """Apply a reduction to the pixels out of the bounds of a kernel."""
+    planes, rows, cols = image.shape
+    for item in numba.prange(planes * rows):
+        p = item // rows
+        r = item % rows
+        interior_row = p0 <= p < p1 and r0 <= r < r1
+        for c in range(cols):
+            if interior_row and c0 <= c < c1:
+                continue
+            pop = 0
+            low = 0
+            high = 0
+            total = 0
+            for k in range(on.shape[1]):
+                pp = p + on[0, k]
+                rr = r + on[1, k]
+                cc = c + on[2, k]
+                if 0 <= pp < planes and 0 <= rr < rows and 0 <= cc < cols:
+                    value = image[pp, rr, cc]
+                    if pop == 0 or value < low:
+                        low = value
+                    if pop == 0 or value > high:
+                        high = value
+                    total += value
+                    pop += 1
+            if reduction == _POP:
+                out[p, r, c, 0] = pop
+            elif pop == 0:
+                out[p, r, c, 0] = 0
+            elif reduction == _MIN:
+                out[p, r, c, 0] = low
+            elif reduction == _MAX:
+                out[p, r, c, 0] = high
+            elif reduction == _SUM:
+                out[p, r, c, 0] = total
+            else:
+                out[p, r, c, 0] = total / pop
+
+
+def _apply_specialized(reduction, image, on, out):
+    """Filter with the kernel generated for the footprint and its border."""
+    planes, rows, cols = image.shape
+    low = on.min(axis=1)
+    high = on.max(axis=1)
+    p0, r0, c0 = np.maximum(-low, 0)
+    p1, r1, c1 = np.maximum(np.array((planes, rows, cols)) - high, 0)
+    p1, r1, c1 = max(p0, p1), max(r0, r1), max(c0, c1)
+
+    kernel = _specialized_kernel(reduction, tuple(map(tuple, on.T.tolist())))
+    kernel(image, out, p0, p1, r0, r1, c0, c1)
+    _border_reduction(image, on, reduction, p0, p1, r0, r1, c0, c1, out)
+
+
+def _make_filter(kernel, reduction=None):
+    """Return a filter with the signature of the `generic_cy` filters.
+
+    The filters given a `reduction` use specialized kernels for the small
+    footprints without mask (see `_specialized_kernel`).
+    """
+    core = _make_core(kernel)
+
+    def rank_filter(image, footprint, mask, out, shift_x, shift_y, shift_z,
+                    n_bins, num_threads=0):
+        image = np.asarray(image)
+        footprint = np.asarray(footprint) > 0
+        centre = np.array(footprint.shape) // 2 + (shift_x, shift_y, shift_z)
+        if not all(0 <= c < s for c, s in zip(centre, footprint.shape)):
+            raise ValueError('half footprint + shift must be between 0 and '
+                             'footprint')
+
+        # the packed mask of the Cython core is unpacked, and replaced by
+        # an array of 1's if there is none
+        no_mask = mask is None or mask.size == 0
+        if no_mask:
+            mask = np.ones(image.shape, dtype=np.uint8)
+        else:
+            mask = np.unpackbits(mask, count=image.size, bitorder='little')
+            mask = mask.reshape(image.shape)
+
+        # elements on the east, west, south and north borders of the
+        # footprint, entering or leaving it as it moves by one pixel
+        padded = np.pad(footprint, ((0, 0), (1, 1), (1, 1)))
+        inner = padded[:, 1:-1, 1:-1]
+        east = inner & ~padded[:, 1:-1, 2:]
+        west = inner & ~padded[:, 1:-1, :-2]
+        south = inner & ~padded[:, 2:, 1:-1]
+        north = inner & ~padded[:, :-2, 1:-1]
+        centre = centre[:, np.newaxis]
+        on, east, west, south, north = (
+            np.ascontiguousarray(np.array(np.nonzero(fp)) - centre,
+                                 dtype=np.intp)
+            for fp in (footprint, east, west, south, north)
+        )
+
+        # any value of the dtype has its bin, as in the Cython core (see
+        # `_histo_size`), so that the image is not scanned for its maximum
+        dtype_bins = 1 << (8 * image.dtype.itemsize)
+        histo_size = max(n_bins, dtype_bins)
+        stripe_rows = image.shape[1]
+        if num_threads != 1:
+            stripe_rows = max(_MIN_STRIPE_ROWS, 2 * footprint.shape[1])
+
+        # the specialized kernels reduce the values themselves, and not the
+        # histogram, they are thus only valid if every value has its bin
+        specialized = (reduction is not None and no_mask
+                       and 0 < on.shape[1] <= _MAX_SPECIALIZED_SIZE
+                       and n_bins >= dtype_bins)
+
+        previous_threads = numba.get_num_threads()
+        if num_threads > 0:
+            numba.set_num_threads(min(num_threads,
+                                      numba.config.NUMBA_NUM_THREADS))
+        try:
+            if specialized:
+                _apply_specialized(reduction, image, on, out)
+            else:
+                core(image, mask, on, east, west, south, north,
+                     max(stripe_rows, 1), histo_size, n_bins, out)
+        finally:
+            numba.set_num_threads(previous_threads)
+
+    return rank_filter
+
+
+_maximum = _make_filter(_kernel_maximum, _MAX)
+_mean = _make_filter(_kernel_mean, _MEAN)
+_minimum = _make_filter(_kernel_minimum, _MIN)
+_modal = _make_filter(_kernel_modal)
+_pop = _make_filter(_kernel_pop, _POP)
+_sum = _make_filter(_kernel_sum, _SUM)
+_threshold = _make_filter(_kernel_threshold)
+_entropy = _make_filter(_kernel_entropy)
+_otsu = _make_filter(_kernel_otsu)
+_majority = _make_filter(_kernel_majority)
@@ -11,18 +11,36 @@ ctypedef fused dtype_t_out:
     double_t
 
 
+# number of low bits dropped from the values to index the coarse histogram
+cdef enum:
+    COARSE_SHIFT = 4
+
+
 cdef dtype_t _max(dtype_t a, dtype_t b) nogil
 cdef dtype_t _min(dtype_t a, dtype_t b) nogil
 
 
-cdef void _core_3D(void kernel(dtype_t_out*, Py_ssize_t, Py_ssize_t[::1], double,
+cdef inline Py_ssize_t _histo_size(Py_ssize_t n_bins, Py_ssize_t odepth,
+                                   dtype_t g) nogil:
+    """Return the size of the histogram passed to the kernels.
+
+    It holds any value of the image dtype (that of `g`) and can be read up to
+    the output depth, the coarse histogram being stored right after it.
+    """
+    return max(n_bins, odepth, 1 << (8 * sizeof(dtype_t)))
+
+
+cdef void _core_3D(void kernel(dtype_t_out*, Py_ssize_t, Py_ssize_t*, double,
                                dtype_t, Py_ssize_t, Py_ssize_t, double,
-                               double, Py_ssize_t, Py_ssize_t) nogil,
-                   dtype_t[:, :, ::1] image,
+                               double, Py_ssize_t, Py_ssize_t,
+                               const double*) nogil,
+                   dtype_t[:, :, :] image,
                    char[:, :, ::1] footprint,
-                   char[:, :, ::1] mask,
+                   char[::1] mask,
                    dtype_t_out[:, :, :, ::1] out,
                    signed char shift_x, signed char shift_y, signed char shift_z,
                    double p0, double p1,
                    Py_ssize_t s0, Py_ssize_t s1,
-                   Py_ssize_t n_bins) except *
+                   Py_ssize_t n_bins, int num_threads,
+                   bint coarse_histo=*,
+                   const double* lut=*) except *
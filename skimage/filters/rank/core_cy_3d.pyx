@@ -3,13 +3,27 @@
 #cython: nonecheck=False
 #cython: wraparound=False
 
+from functools import lru_cache
+
 import numpy as np
 
 cimport numpy as cnp
-from libc.stdlib cimport malloc, free
+from libc.stdlib cimport calloc, free
+from cython.parallel cimport prange
 
 cnp.import_array()
 
+# minimum number of rows of the stripes processed in parallel
+cdef Py_ssize_t _MIN_STRIPE_ROWS = 32
+
+# size in bytes of the image rows spanned by the footprint above which the
+# stripes are split in tiles of columns, so that these rows stay in the cache
+# from one row of the traversal to the next; about the size of a L2 cache
+cdef Py_ssize_t _TILE_BYTES = 1 << 18
+
+# minimum number of columns of the tiles
+cdef Py_ssize_t _MIN_TILE_COLS = 64
+
 cdef inline dtype_t _max(dtype_t a, dtype_t b) nogil:
     return a if a >= b else b
 
@@ -18,117 +32,109 @@ cdef inline dtype_t _min(dtype_t a, dtype_t b) nogil:
     return a if a <= b else b
 
 
-cdef inline void _count_attack_border_elements(char[:, :, ::1] footprint,
-                                               Py_ssize_t [:, :, ::1] se,
-                                               Py_ssize_t [::1] num_se,
-                                               Py_ssize_t splanes,
-                                               Py_ssize_t srows,
-                                               Py_ssize_t scols,
-                                               Py_ssize_t centre_p,
-                                               Py_ssize_t centre_r,
-                                               Py_ssize_t centre_c):
+@lru_cache(maxsize=32)
+def _footprint_offsets(footprint_data, shape, centre):
+    """Compute the offsets of the footprint elements relative to its centre.
+
+    The offsets are cached, a footprint being usually applied to many images.
+
+    Parameters
+    ----------
+    footprint_data : bytes
+        Raw data of the footprint, an uint8 array of 0's and 1's.
+    shape : tuple of int
+        Shape of the footprint.
+    centre : tuple of int
+        Coordinates of the footprint centre.
+
+    Returns
+    -------
+    se : (4, 3, N) ndarray of intp
+        Relative pixel plane, row and column of the elements of the 4 attack
+        borders east, north, west and south, e.g. ``se[0, 0, :num_se[0]]``
+        lists the planes of the east border.
+    num_se : (4,) ndarray of intp
+        Number of elements in each attack border.
+    on : (3, M) ndarray of intp
+        Relative pixel plane, row and column of all the footprint elements.
+
+    """
+    footprint = np.frombuffer(footprint_data, dtype=np.uint8).reshape(shape)
+    footprint = footprint > 0
+    centre = np.array(centre, dtype=np.intp)[:, np.newaxis]
 
-    cdef Py_ssize_t r, c, p
+    # build attack and release borders by comparing each element with its
+    # neighbor along the axis of the move
+    padded = np.pad(footprint, ((0, 0), (1, 1), (1, 1)))
+    borders = [footprint & ~padded[:, 1:-1, 2:],   # east
+               footprint & ~padded[:, :-2, 1:-1],  # north
+               footprint & ~padded[:, 1:-1, :-2],  # west
+               footprint & ~padded[:, 2:, 1:-1]]   # south
 
-    # build attack and release borders by using difference along axis
-    t = np.dstack(
-        (footprint, np.zeros((footprint.shape[0], footprint.shape[1], 1)))
-    )
-    cdef unsigned char[:, :, :] t_e = (np.diff(t, axis=2) < 0).view(np.uint8)
+    num_se = np.array([b.sum() for b in borders], dtype=np.intp)
+    se = np.zeros((4, 3, max(1, num_se.max())), dtype=np.intp)
+    for i, border in enumerate(borders):
+        se[i, :, :num_se[i]] = np.array(np.nonzero(border)) - centre
 
-    t = np.dstack(
-        (np.zeros((footprint.shape[0], footprint.shape[1], 1)), footprint)
-    )
-    cdef unsigned char[:, :, :] t_w = (np.diff(t, axis=2) > 0).view(np.uint8)
+    on = np.ascontiguousarray(np.array(np.nonzero(footprint)) - centre,
+                              dtype=np.intp)
 
-    t = np.hstack(
-        (footprint, np.zeros((footprint.shape[0], 1, footprint.shape[2])))
-    )
-    cdef unsigned char[:, :, :] t_s = (np.diff(t, axis=1) < 0).view(np.uint8)
+    return se, num_se, on
 
-    t = np.hstack(
-        (np.zeros((footprint.shape[0], 1, footprint.shape[2])), footprint)
-    )
-    cdef unsigned char[:, :, :] t_n = (np.diff(t, axis=1) > 0).view(np.uint8)
-
-    for r in range(srows):
-        for c in range(scols):
-            for p in range(splanes):
-                if t_e[p, r, c]:
-                    se[0, 0, num_se[0]] = p - centre_p
-                    se[0, 1, num_se[0]] = r - centre_r
-                    se[0, 2, num_se[0]] = c - centre_c
-                    num_se[0] += 1
-                if t_n[p, r, c]:
-                    se[1, 0, num_se[1]] = p - centre_p
-                    se[1, 1, num_se[1]] = r - centre_r
-                    se[1, 2, num_se[1]] = c - centre_c
-                    num_se[1] += 1
-                if t_w[p, r, c]:
-                    se[2, 0, num_se[2]] = p - centre_p
-                    se[2, 1, num_se[2]] = r - centre_r
-                    se[2, 2, num_se[2]] = c - centre_c
-                    num_se[2] += 1
-                if t_s[p, r, c]:
-                    se[3, 0, num_se[3]] = p - centre_p
-                    se[3, 1, num_se[3]] = r - centre_r
-                    se[3, 2, num_se[3]] = c - centre_c
-                    num_se[3] += 1
-
-
-cdef inline void _build_initial_histogram_from_neighborhood(dtype_t[:, :, ::1] image,
-                                                            char[:, :, ::1] footprint,
-                                                            Py_ssize_t [::1] histo,
+
+cdef inline void _build_initial_histogram_from_neighborhood(dtype_t[:, :, :] image,
+                                                            Py_ssize_t[:, ::1] on,
+                                                            Py_ssize_t* histo,
+                                                            Py_ssize_t* coarse,
                                                             double* pop,
                                                             char* mask_data,
                                                             Py_ssize_t p,
+                                                            Py_ssize_t r,
+                                                            Py_ssize_t c,
                                                             Py_ssize_t planes,
                                                             Py_ssize_t rows,
-                                                            Py_ssize_t cols,
-                                                            Py_ssize_t splanes,
-                                                            Py_ssize_t srows,
-                                                            Py_ssize_t scols,
-                                                            Py_ssize_t centre_p,
-                                                            Py_ssize_t centre_r,
-                                                            Py_ssize_t centre_c):
-
-    cdef Py_ssize_t r, c, j
-
-    for r in range(srows):
-        for c in range(scols):
-            for j in range(splanes):
-                pp = j - centre_p + p
-                rr = r - centre_r
-                cc = c - centre_c
-
-                if footprint[j, r, c]:
-                    if is_in_mask_3D(planes, rows, cols, pp, rr, cc,
-                                     mask_data):
-                        # histogram_increment(histo, pop, image[pp, rr, cc])
-                        histo[image[pp, rr, cc]] += 1
-                        pop[0] += 1
-
-
-cdef inline void _update_histogram(dtype_t[:, :, ::1] image,
+                                                            Py_ssize_t cols) nogil:
+
+    cdef Py_ssize_t k, pp, rr, cc
+
+    for k in range(on.shape[1]):
+        pp = p + on[0, k]
+        rr = r + on[1, k]
+        cc = c + on[2, k]
+        if is_in_mask_3D(planes, rows, cols, pp, rr, cc, mask_data):
+            _histogram_increment(histo, coarse, pop, image[pp, rr, cc])
+
+
+cdef inline void _update_histogram(dtype_t[:, :, :] image,
                                    Py_ssize_t [:, :, ::1] se,
+                                   Py_ssize_t [:, ::1] lin,
                                    Py_ssize_t [::1] num_se,
-                                   Py_ssize_t [::1] histo,
+                                   Py_ssize_t* histo, Py_ssize_t* coarse,
                                    double* pop, char* mask_data,
                                    Py_ssize_t p, Py_ssize_t r, Py_ssize_t c,
                                    Py_ssize_t planes, Py_ssize_t rows,
                                    Py_ssize_t cols,
-                                   Py_ssize_t axis_inc) nogil:
+                                   Py_ssize_t axis_inc,
+                                   bint unchecked) nogil:
 
     cdef Py_ssize_t pp, rr, cc, j
 
+    if unchecked:
+        # no mask and all the elements lie within the image
+        _update_histogram_unchecked(&image[p, r, c], lin, num_se, histo,
+                                    coarse,
+                                    image.strides[1] // sizeof(dtype_t),
+                                    image.strides[2] // sizeof(dtype_t),
+                                    axis_inc)
+        return
+
     # Increment histogram
     for j in range(num_se[axis_inc]):
         pp = p + se[axis_inc, 0, j]
         rr = r + se[axis_inc, 1, j]
         cc = c + se[axis_inc, 2, j]
         if is_in_mask_3D(planes, rows, cols, pp, rr, cc, mask_data):
-            histo[image[pp, rr, cc]] += 1
-            pop[0] += 1
+            _histogram_increment(histo, coarse, pop, image[pp, rr, cc])
 
     # Decrement histogram
     axis_dec = (axis_inc + 2) % 4
@@ -143,36 +149,109 @@ cdef inline void _update_histogram(dtype_t[:, :, ::1] image,
         elif axis_dec == 0:
             cc += 1
         if is_in_mask_3D(planes, rows, cols, pp, rr, cc, mask_data):
-            histo[image[pp, rr, cc]] -= 1
-            pop[0] -= 1
+            _histogram_decrement(histo, coarse, pop, image[pp, rr, cc])
+
+
+cdef inline void _update_histogram_unchecked(dtype_t* centre,
+                                             Py_ssize_t [:, ::1] lin,
+                                             Py_ssize_t [::1] num_se,
+                                             Py_ssize_t* histo,
+                                             Py_ssize_t* coarse,
+                                             Py_ssize_t row_step,
+                                             Py_ssize_t col_step,
+                                             Py_ssize_t axis_inc) nogil:
+
+    cdef Py_ssize_t j
+    cdef Py_ssize_t axis_dec = (axis_inc + 2) % 4
+    # the released elements are those of the previous window position
+    cdef dtype_t* previous = centre
+    if axis_dec == 1:
+        previous = centre - row_step
+    elif axis_dec == 2:
+        previous = centre - col_step
+    elif axis_dec == 0:
+        previous = centre + col_step
+    cdef dtype_t value
+
+    for j in range(num_se[axis_inc]):
+        value = centre[lin[axis_inc, j]]
+        histo[value] += 1
+        if coarse is not NULL:
+            coarse[value >> COARSE_SHIFT] += 1
+    for j in range(num_se[axis_dec]):
+        value = previous[lin[axis_dec, j]]
+        histo[value] -= 1
+        if coarse is not NULL:
+            coarse[value >> COARSE_SHIFT] -= 1
+    # opposite borders have as many elements, the population of the window
+    # thus remains the footprint area
+
+
+cdef inline void _histogram_increment(Py_ssize_t* histo, Py_ssize_t* coarse,
+                                      double* pop, dtype_t value) nogil:
+    histo[value] += 1
+    if coarse is not NULL:
+        coarse[value >> COARSE_SHIFT] += 1
+    pop[0] += 1
+
+
+cdef inline void _histogram_decrement(Py_ssize_t* histo, Py_ssize_t* coarse,
+                                      double* pop, dtype_t value) nogil:
+    histo[value] -= 1
+    if coarse is not NULL:
+        coarse[value >> COARSE_SHIFT] -= 1
+    pop[0] -= 1
 
 
 cdef inline char is_in_mask_3D(Py_ssize_t planes, Py_ssize_t rows,
                                Py_ssize_t cols, Py_ssize_t p, Py_ssize_t r,
                                Py_ssize_t c, char* mask) nogil:
-    """Check whether given coordinate is within image and mask is true."""
+    """Check whether given coordinate is within image and mask is true.
+
+    The mask holds one bit per pixel (see `_core_3D`).
+    """
+    cdef Py_ssize_t i
     if (r < 0 or r > rows - 1 or c < 0 or c > cols - 1 or
             p < 0 or p > planes - 1):
         return 0
     else:
         if not mask:
             return 1
-        return mask[p * rows * cols + r * cols + c]
+        i = (p * rows + r) * cols + c
+        return (<unsigned char>mask[i >> 3] >> (i & 7)) & 1
 
 
-cdef void _core_3D(void kernel(dtype_t_out*, Py_ssize_t, Py_ssize_t[::1], double,
+cdef void _core_3D(void kernel(dtype_t_out*, Py_ssize_t, Py_ssize_t*, double,
                                dtype_t, Py_ssize_t, Py_ssize_t, double,
-                               double, Py_ssize_t, Py_ssize_t) nogil,
-                   dtype_t[:, :, ::1] image,
+                               double, Py_ssize_t, Py_ssize_t,
+                               const double*) nogil,
+                   dtype_t[:, :, :] image,
                    char[:, :, ::1] footprint,
-                   char[:, :, ::1] mask,
+                   char[::1] mask,
                    dtype_t_out[:, :, :, ::1] out,
                    signed char shift_x, signed char shift_y,
                    signed char shift_z, double p0, double p1,
                    Py_ssize_t s0, Py_ssize_t s1,
-                   Py_ssize_t n_bins) except *:
+                   Py_ssize_t n_bins, int num_threads,
+                   bint coarse_histo=False,
+                   const double* lut=NULL) except *:
     """Compute histogram for each pixel neighborhood, apply kernel function and
     use kernel function return value for output image.
+
+    Each plane is split in stripes of rows, and the stripes of wide planes in
+    tiles of columns, which are processed in parallel, each with its own
+    histogram, by at most `num_threads` threads (0 meaning the OpenMP
+    default).
+
+    The mask, if not None, is packed with one bit per pixel, as returned by
+    ``np.packbits(mask, bitorder='little')``.
+
+    If `coarse_histo` is True, a coarse histogram, counting the values in
+    blocks of ``2 ** COARSE_SHIFT`` bins, is also maintained and passed to the
+    kernel right after the histogram (see `_histo_size`).
+
+    `lut`, if not NULL, is a lookup table passed as is to the kernel, which
+    defines its size and content.
     """
 
     cdef Py_ssize_t planes = image.shape[0]
@@ -204,82 +283,151 @@ cdef void _core_3D(void kernel(dtype_t_out*, Py_ssize_t, Py_ssize_t[::1], double
     cdef Py_ssize_t mid_bin = n_bins // 2
 
     # define pointers to the data
-    cdef char* mask_data = &mask[0, 0, 0]
+    cdef char* mask_data = NULL
+    if mask is not None and mask.shape[0] > 0:
+        mask_data = &mask[0]
 
     # define local variable types
-    cdef Py_ssize_t p, r, c, rr, cc, pp, value, local_max, i, even_row
+    cdef Py_ssize_t p, r, c, even_row, item, stripe, r_start, r_stop
+    cdef Py_ssize_t tile, c_start, c_stop
 
     # number of pixels actually inside the neighborhood (double)
-    cdef double pop = 0
-
-    # the current local histogram distribution
-    cdef Py_ssize_t [::1] histo = np.zeros(n_bins, dtype=np.intp)
-
-    # these lists contain the relative pixel plane, row and column for each of
-    # the 4 attack borders east, north, west and south
-    # e.g. se[0, 0, :] lists the planes of the east footprint border
-    cdef Py_ssize_t se_size = splanes * srows * scols
-    cdef Py_ssize_t [:, :, ::1] se = np.zeros([4, 3, se_size], dtype=np.intp)
-
-    # number of element in each attack border in 4 directions
-    cdef Py_ssize_t [::1] num_se = np.zeros(4, dtype=np.intp)
+    cdef double pop
+
+    # the local histogram distribution of the processed stripe, large enough
+    # to hold any value of the image dtype and to be read up to the output
+    # depth, as the image values are not checked against a user-supplied
+    # `n_bins`
+    cdef Py_ssize_t histo_size = _histo_size(n_bins, odepth, <dtype_t>0)
+    cdef Py_ssize_t alloc_size = histo_size
+    if coarse_histo:
+        alloc_size += (histo_size >> COARSE_SHIFT) + 1
+    cdef Py_ssize_t* histo
+    cdef Py_ssize_t* coarse
+
+    # offsets of the elements of the 4 attack borders east, north, west and
+    # south, their number in each border, and offsets of all the elements
+    cdef Py_ssize_t [:, :, ::1] se
+    cdef Py_ssize_t [::1] num_se
+    cdef Py_ssize_t [:, ::1] on
+    se, num_se, on = _footprint_offsets(
+        np.asarray(footprint).tobytes(), (splanes, srows, scols),
+        (centre_p, centre_r, centre_c)
+    )
 
-    _count_attack_border_elements(footprint, se, num_se, splanes, srows, scols,
-                                  centre_p, centre_r, centre_c)
+    # offsets of the attack borders in the image buffer, a single load
+    # locating each element entering or leaving an interior window; the
+    # image may be a strided view, whose strides are multiples of the item
+    # size (see `_preprocess_input`)
+    cdef Py_ssize_t [:, ::1] lin = np.ascontiguousarray(
+        np.dot(np.asarray(se).transpose(0, 2, 1),
+               [image.strides[i] // sizeof(dtype_t) for i in range(3)]),
+        dtype=np.intp
+    )
 
-    for p in range(planes):
-        histo[:] = 0
+    # the histogram of the first pixel of each stripe is built from its whole
+    # neighborhood, stripes are thus kept high enough for this initialization
+    # to be negligible; it runs once per stripe and not once per row, and
+    # stays a loop over the cached offsets since calling back into NumPy
+    # would need the GIL in the parallel loop
+    cdef Py_ssize_t stripe_rows = rows
+    if num_threads != 1:
+        stripe_rows = max(_MIN_STRIPE_ROWS, 2 * srows)
+    cdef Py_ssize_t n_stripes = (rows + stripe_rows - 1) // stripe_rows
+
+    # wide images are traversed by tiles of columns, each of them also
+    # starting from a new histogram; the columns are spread evenly over the
+    # tiles, so that no tile is a sliver paying the whole initialization for
+    # a few columns
+    cdef Py_ssize_t tile_cols = cols
+    if splanes * srows * cols * sizeof(dtype_t) > _TILE_BYTES:
+        tile_cols = max(_MIN_TILE_COLS, 2 * scols,
+                        _TILE_BYTES // (splanes * srows * sizeof(dtype_t)))
+    cdef Py_ssize_t n_tiles = max(1, cols // tile_cols)
+
+    # without mask, the elements entering and leaving the window do not need
+    # to be checked when both window positions lie within the image, i.e.
+    # within these rows and columns for planes of the interior
+    cdef bint interior_plane, interior_row
+    cdef Py_ssize_t r_min = centre_r + 1
+    cdef Py_ssize_t r_max = rows - srows + centre_r
+    cdef Py_ssize_t c_min = centre_c + 1
+    cdef Py_ssize_t c_max = cols - scols + centre_c - 1
+
+    for item in prange(planes * n_stripes * n_tiles, nogil=True,
+                       schedule='static', num_threads=num_threads):
+        p = item // (n_stripes * n_tiles)
+        stripe = item // n_tiles % n_stripes
+        tile = item % n_tiles
+        r_start = stripe * stripe_rows
+        r_stop = min(r_start + stripe_rows, rows)
+        c_start = tile * cols // n_tiles
+        c_stop = (tile + 1) * cols // n_tiles
+        interior_plane = (mask_data is NULL and p >= centre_p
+                          and p + splanes - centre_p <= planes)
+
+        histo = <Py_ssize_t*>calloc(alloc_size, sizeof(Py_ssize_t))
+        if histo is NULL:
+            with gil:
+                raise MemoryError()
+        coarse = histo + histo_size if coarse_histo else NULL
         pop = 0
-        _build_initial_histogram_from_neighborhood(image, footprint, histo,
+        _build_initial_histogram_from_neighborhood(image, on, histo, coarse,
                                                    &pop, mask_data, p,
-                                                   planes, rows, cols,
-                                                   splanes, srows, scols,
-                                                   centre_p, centre_r,
-                                                   centre_c)
-        r = 0
-        c = 0
+                                                   r_start, c_start, planes,
+                                                   rows, cols)
+        r = r_start
+        c = c_start
         kernel(&out[p, r, c, 0], odepth, histo, pop, image[p, r, c],
-               n_bins, mid_bin, p0, p1, s0, s1)
+               n_bins, mid_bin, p0, p1, s0, s1, lut)
+
+        # main loop
+        for even_row in range(r_start, r_stop, 2):
 
-        with nogil:
-            # main loop
+            # ---> west to east
+            interior_row = interior_plane and r_min <= r <= r_max
+            for c in range(c_start + 1, c_stop):
+                _update_histogram(image, se, lin, num_se, histo, coarse, &pop,
+                                  mask_data, p, r, c, planes, rows, cols, 0,
+                                  interior_row and c_min <= c <= c_max)
 
-            for even_row in range(0, rows, 2):
+                kernel(&out[p, r, c, 0], odepth, histo, pop,
+                       image[p, r, c], n_bins, mid_bin, p0, p1, s0, s1, lut)
 
-                # ---> west to east
-                for c in range(1, cols):
-                    _update_histogram(image, se, num_se, histo, &pop, mask_data, p,
-                                      r, c, planes, rows, cols, axis_inc=0)
+            r = r + 1  # pass to the next row
+            if r >= r_stop:
+                break
 
-                    kernel(&out[p, r, c, 0], odepth, histo, pop,
-                           image[p, r, c], n_bins, mid_bin, p0, p1, s0, s1)
+            # ---> north to south
+            _update_histogram(image, se, lin, num_se, histo, coarse, &pop,
+                              mask_data, p, r, c, planes, rows, cols, 3,
+                              interior_plane and r_min <= r <= r_max
+                              and c_min <= c <= c_max)
 
-                r += 1  # pass to the next row
-                if r >= rows:
-                    break
+            kernel(&out[p, r, c, 0], odepth, histo, pop,
+                   image[p, r, c], n_bins, mid_bin, p0, p1, s0, s1, lut)
 
-                # ---> north to south
-                _update_histogram(image, se, num_se, histo, &pop, mask_data, p,
-                                  r, c, planes, rows, cols, axis_inc=3)
+            # ---> east to west
+            interior_row = interior_plane and r_min <= r <= r_max
+            for c in range(c_stop - 2, c_start - 1, -1):
+                _update_histogram(image, se, lin, num_se, histo, coarse, &pop,
+                                  mask_data, p, r, c, planes, rows, cols, 2,
+                                  interior_row and c_min <= c <= c_max)
 
                 kernel(&out[p, r, c, 0], odepth, histo, pop,
-                       image[p, r, c], n_bins, mid_bin, p0, p1, s0, s1)
-
-                # ---> east to west
-                for c in range(cols - 2, -1, -1):
-                    _update_histogram(image, se, num_se, histo, &pop, mask_data, p,
-                                      r, c, planes, rows, cols, axis_inc=2)
+                       image[p, r, c], n_bins, mid_bin, p0, p1, s0, s1, lut)
 
-                    kernel(&out[p, r, c, 0], odepth, histo, pop,
-                           image[p, r, c], n_bins, mid_bin, p0, p1, s0, s1)
+            r = r + 1  # pass to the next row
+            if r >= r_stop:
+                break
 
-                r += 1  # pass to the next row
-                if r >= rows:
-                    break
+            # ---> north to south
+            _update_histogram(image, se, lin, num_se, histo, coarse, &pop,
+                              mask_data, p, r, c, planes, rows, cols, 3,
+                              interior_plane and r_min <= r <= r_max
+                              and c_min <= c <= c_max)
 
-                # ---> north to south
-                _update_histogram(image, se, num_se, histo, &pop, mask_data, p,
-                                  r, c, planes, rows, cols, axis_inc=3)
+            kernel(&out[p, r, c, 0], odepth, histo, pop, image[p, r, c],
+                   n_bins, mid_bin, p0, p1, s0, s1, lut)
 
-                kernel(&out[p, r, c, 0], odepth, histo, pop, image[p, r, c],
-                       n_bins, mid_bin, p0, p1, s0, s1)
+        free(histo)
@@ -28,8 +28,20 @@ for large footprints.
 
 Input images will be cast in unsigned 8-bit integer or unsigned 16-bit integer
 if necessary. The number of histogram bins is then determined from the maximum
-value present in the image. Eventually, the output image is cast in the input
-dtype, or the `output_dtype` if set.
+value present in the image, unless it is given by the `n_bins` parameter.
+Eventually, the output image is cast in the input dtype, or the `output_dtype`
+if set.
+
+The Global Interpreter Lock is released while the histograms are computed, so
+that several images (or tiles of an image, e.g. with :mod:`dask`) can be
+filtered concurrently from Python threads. In that case, setting
+`num_threads=1` avoids oversubscribing the processor with the threads each
+filter spawns.
+
+When the ``SKIMAGE_BACKEND`` environment variable is set to ``numba``, the
+minimum, maximum, mean, modal, majority, pop, sum, threshold, entropy and otsu
+filters use a Numba implementation instead of the compiled one, which
+requires the optional ``numba`` package.
 
 To do
 -----
@@ -48,9 +60,12 @@ References
 
 """
 
+import os
 import warnings
+from functools import lru_cache, wraps
 
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 from scipy import ndimage as ndi
 
 from ..._shared.utils import check_nD, deprecate_kwarg, warn
@@ -64,18 +79,34 @@ __all__ = ['autolevel', 'equalize', 'gradient', 'maximum', 'mean',
            'entropy', 'otsu']
 
 
+@lru_cache(maxsize=32)
+def _footprint_as_ubyte(footprint_data, shape, dtype):
+    """Convert the raw data of a footprint to a contiguous uint8 array.
+
+    The conversions are cached, a footprint being usually applied to many
+    images. The returned array must thus not be modified.
+
+    """
+    footprint = np.frombuffer(footprint_data, dtype=dtype).reshape(shape)
+    return np.ascontiguousarray(footprint > 0).view(np.uint8)
+
+
 def _preprocess_input(image, footprint=None, out=None, mask=None,
-                      out_dtype=None, pixel_size=1):
+                      out_dtype=None, pixel_size=1, n_bins=None,
+                      strided=False):
     """Preprocess and verify input for filters.rank methods.
 
     Parameters
     ----------
-    image : 2-D array (integer or float)
+    image : ([P,] M, N) ndarray (integer or float)
         Input image.
-    footprint : 2-D array (integer or float), optional
-        The neighborhood expressed as a 2-D array of 1's and 0's.
-    out : 2-D array (integer or float), optional
-        If None, a new array is allocated.
+    footprint : ([P,] M, N) ndarray (integer or float), optional
+        The neighborhood expressed as an array of 1's and 0's.
+    out : ([P,] M, N) ndarray (integer or float), optional
+        If None, a new array is allocated. Otherwise, it is filled in place,
+        which allows reusing the same buffer across calls. Views, e.g. slices
+        of a larger array, are filled without copy as long as the values of
+        each pixel are contiguous.
     mask : ndarray (integer or float), optional
         Mask array that defines (>0) area of the image included in the local
         neighborhood. If None, the complete image is used (default).
@@ -84,23 +115,35 @@ def _preprocess_input(image, footprint=None, out=None, mask=None,
         in input dtype.
     pixel_size : int, optional
         Dimension of each pixel. Default value is 1.
+    n_bins : int, optional
+        Number of histogram bins. If None (default), it is set to 256 for
+        8-bit images and determined from the maximum value of the image for
+        16-bit images. The supplied value is not checked against the image
+        values, which must all be lower than `n_bins`; the larger ones are
+        left out of the bins read by the kernels, those finding no value in
+        their bins writing 0.
+    strided : bool, optional
+        If True, an image view whose strides are multiples of its item size
+        is returned as is, for the 3-D Cython core which reads strided
+        images, instead of being copied to a C-contiguous array.
 
     Returns
     -------
-    image : 2-D array (np.uint8 or np.uint16)
-    footprint : 2-D array (np.uint8)
-        The neighborhood expressed as a binary 2-D array.
-    out : 3-D array (same dtype out_dtype or as input)
-        Output array. The two first dimensions are the spatial ones, the third
+    image : ([P,] M, N) ndarray (np.uint8 or np.uint16)
+    footprint : ([P,] M, N) ndarray (np.uint8)
+        The neighborhood expressed as a binary array.
+    out : ([P,] M, N, pixel_size) ndarray (same dtype out_dtype or as input)
+        Output array. The leading dimensions are the spatial ones, the last
         one is the pixel vector (length 1 by default).
-    mask : 2-D array (np.uint8)
+    mask : ([P,] M, N) ndarray (np.uint8)
         Mask array that defines (>0) area of the image included in the local
         neighborhood.
     n_bins : int
         Number of histogram bins.
 
     """
-    check_nD(image, 2)
+    image = np.asanyarray(image)
+    check_nD(image, (2, 3))
     input_dtype = image.dtype
     if (input_dtype in (bool, bool) or out_dtype in (bool, bool)):
         raise ValueError('dtype cannot be bool.')
@@ -112,15 +155,28 @@ def _preprocess_input(image, footprint=None, out=None, mask=None,
         warn(message, stacklevel=5)
         image = img_as_ubyte(image)
 
-    footprint = np.ascontiguousarray(img_as_ubyte(footprint > 0))
+    footprint = np.asarray(footprint)
+    if footprint.dtype.kind in 'biuf':
+        footprint = _footprint_as_ubyte(footprint.tobytes(), footprint.shape,
+                                        footprint.dtype)
+    else:
+        footprint = np.ascontiguousarray(footprint > 0).view(np.uint8)
     if footprint.ndim != image.ndim:
         raise ValueError('Image dimensions and neighborhood dimensions'
                          'do not match')
 
-    image = np.ascontiguousarray(image)
+    if not (strided and all(stride % image.itemsize == 0
+                            for stride in image.strides)):
+        image = np.ascontiguousarray(image)
 
     if mask is not None:
-        mask = img_as_ubyte(mask)
+        # only whether the mask is positive matters, bool and uint8 masks are
+        # thus used without conversion
+        mask = np.asarray(mask)
+        if mask.dtype == bool:
+            mask = mask.view(np.uint8)
+        elif mask.dtype != np.uint8:
+            mask = (mask > 0).view(np.uint8)
         mask = np.ascontiguousarray(mask)
 
     if image is out:
@@ -131,10 +187,31 @@ def _preprocess_input(image, footprint=None, out=None, mask=None,
             out_dtype = image.dtype
         out = np.empty(image.shape + (pixel_size,), dtype=out_dtype)
     else:
-        if len(out.shape) == 2:
-            out = out.reshape(out.shape + (pixel_size,))
-
-    if image.dtype in (np.uint8, np.int8):
+        # the output is filled in place, a reshaped copy would be lost
+        if out.shape[:image.ndim] != image.shape:
+            raise ValueError(f'out has shape {out.shape}, whereas the image '
+                             f'has shape {image.shape}.')
+        if out.shape[image.ndim:] not in ((), (pixel_size,)):
+            raise ValueError(f'out has shape {out.shape}, whereas the pixels '
+                             f'have {pixel_size} values.')
+        if out.ndim == image.ndim:
+            if pixel_size != 1:
+                raise ValueError(f'out must have a last axis of length '
+                                 f'{pixel_size}.')
+            # the pixel axis is added with the stride of one item, so that
+            # views are written in place as well
+            out = as_strided(out, out.shape + (1,),
+                             out.strides + (out.itemsize,))
+        # the 3-D Cython core only requires contiguous pixel vectors
+        if (out.strides[-1] != out.itemsize
+                or any(stride % out.itemsize for stride in out.strides)):
+            raise ValueError('out must have contiguous pixel vectors.')
+
+    if n_bins is not None:
+        n_bins = int(n_bins)
+        if n_bins < 1:
+            raise ValueError('n_bins must be a positive integer.')
+    elif image.dtype in (np.uint8, np.int8):
         n_bins = 256
     else:
         # Convert to a Python int to avoid the potential overflow when we add
@@ -150,143 +227,248 @@ def _preprocess_input(image, footprint=None, out=None, mask=None,
     return image, footprint, out, mask, n_bins
 
 
-def _handle_input_3D(image, footprint=None, out=None, mask=None,
-                     out_dtype=None, pixel_size=1):
-    """Preprocess and verify input for filters.rank methods.
+def _to_3D(image, footprint, out, mask, shift_x, shift_y, shift_z):
+    """Express the preprocessed input as arguments of the 3-D Cython core.
 
-    Parameters
-    ----------
-    image : 3-D array (integer or float)
-        Input image.
-    footprint : 3-D array (integer or float), optional
-        The neighborhood expressed as a 3-D array of 1's and 0's.
-    out : 3-D array (integer or float), optional
-        If None, a new array is allocated.
-    mask : ndarray (integer or float), optional
-        Mask array that defines (>0) area of the image included in the local
-        neighborhood. If None, the complete image is used (default).
-    out_dtype : data-type, optional
-        Desired output data-type. Default is None, which means we cast output
-        in input dtype.
-    pixel_size : int, optional
-        Dimension of each pixel. Default value is 1.
+    A 2-D image is filtered as a volume made of a single plane: its
+    `shift_x` and `shift_y` offset the columns and the rows of the footprint,
+    whereas for a 3-D image `shift_x`, `shift_y` and `shift_z` offset its
+    planes, rows and columns respectively.
+
+    The mask is packed with one bit per pixel, which divides by 8 the memory
+    read to check the pixels entering and leaving the neighborhoods.
 
     Returns
     -------
-    image : 3-D array (np.uint8 or np.uint16)
-    footprint : 3-D array (np.uint8)
-        The neighborhood expressed as a binary 3-D array.
-    out : 3-D array (same dtype out_dtype or as input)
-        Output array. The two first dimensions are the spatial ones, the third
-        one is the pixel vector (length 1 by default).
-    mask : 3-D array (np.uint8)
-        Mask array that defines (>0) area of the image included in the local
-        neighborhood.
-    n_bins : int
-        Number of histogram bins.
+    args : tuple
+        ``(image, footprint, mask, out, shift_x, shift_y, shift_z)`` where the
+        arrays have a leading plane axis, the mask is packed and the shifts
+        are ordered as the axes of the 3-D core.
 
     """
-    check_nD(image, 3)
-    if image.dtype not in (np.uint8, np.uint16):
-        message = (f'Possible precision loss converting image of type '
-                   f'{image.dtype} to uint8 as required by rank filters. '
-                   f'Convert manually using skimage.util.img_as_ubyte to '
-                   f'silence this warning.')
-        warn(message, stacklevel=2)
-        image = img_as_ubyte(image)
+    if mask is not None:
+        mask = np.packbits(mask, bitorder='little')
 
-    footprint = np.ascontiguousarray(img_as_ubyte(footprint > 0))
-    if footprint.ndim != image.ndim:
-        raise ValueError('Image dimensions and neighborhood dimensions'
-                         'do not match')
-    image = np.ascontiguousarray(image)
+    if image.ndim == 3:
+        return image, footprint, mask, out, shift_x, shift_y, shift_z
 
-    if mask is None:
-        mask = np.ones(image.shape, dtype=np.uint8)
-    else:
-        mask = img_as_ubyte(mask)
-        mask = np.ascontiguousarray(mask)
+    image = image.reshape((1,) + image.shape)
+    footprint = footprint.reshape((1,) + footprint.shape)
+    out = out.reshape((1,) + out.shape)
 
-    if image is out:
-        raise NotImplementedError("Cannot perform rank operation in place.")
+    return image, footprint, mask, out, 0, shift_y, shift_x
 
-    if out is None:
-        if out_dtype is None:
-            out_dtype = image.dtype
-        out = np.empty(image.shape + (pixel_size,), dtype=out_dtype)
-    else:
-        out = out.reshape(out.shape + (pixel_size,))
 
-    is_8bit = image.dtype in (np.uint8, np.int8)
+# number of pixels below which images are filtered by a single thread by
+# default, starting the threads costing more than they save
+_MIN_PARALLEL_SIZE = 256 * 256
 
-    if is_8bit:
-        n_bins = 256
-    else:
-        # Convert to a Python int to avoid the potential overflow when we add
-        # 1 to the maximum of the image.
+
+def _default_num_threads(image, num_threads):
+    """Return the number of threads to filter `image` with.
+
+    If `num_threads` is None, small images are filtered serially, and larger
+    ones with the OpenMP default number of threads (0).
+    """
+    if num_threads is not None:
+        return num_threads
+    return 1 if image.size < _MIN_PARALLEL_SIZE else 0
+
+
+def _quantize(image, n_bins, max_n_bins):
+    """Quantize a 16-bit image so that its histogram has `max_n_bins` bins.
+
+    Parameters
+    ----------
+    image : ndarray
+        Input image.
+    n_bins : int or None
+        Number of histogram bins of the image. If None, it is determined from
+        the maximum value of the image.
+    max_n_bins : int
+        Maximum number of histogram bins.
+
+    Returns
+    -------
+    image : ndarray
+        The input image, quantized if it needs more than `max_n_bins` bins.
+        A quantized image has the uint8 dtype if `max_n_bins` is at most 256.
+    n_bins : int or None
+        Number of histogram bins of the returned image.
+    scale : float or None
+        Factor applied to the image values, None if it was not quantized.
+
+    """
+    image = np.asanyarray(image)
+    if image.dtype != np.uint16:
+        return image, n_bins, None
+    if n_bins is None:
         n_bins = int(max(3, image.max())) + 1
+    if n_bins <= max_n_bins:
+        return image, n_bins, None
+    scale = (max_n_bins - 1) / (n_bins - 1)
+    # the quantized values fit in 8 bits when possible, so that the filter
+    # works on a 256-bin histogram instead of one covering the uint16 range
+    dtype = np.uint8 if max_n_bins <= 256 else np.uint16
+    return (image * scale).astype(dtype), max_n_bins, scale
+
+
+# Cython functions whose output is expressed in image intensities, mapped back
+# to the input range when the image is quantized
+_INTENSITY_FILTERS = {
+    generic_cy._autolevel, generic_cy._equalize, generic_cy._gradient,
+    generic_cy._maximum, generic_cy._mean, generic_cy._geometric_mean,
+    generic_cy._subtract_mean, generic_cy._median, generic_cy._minimum,
+    generic_cy._modal, generic_cy._enhance_contrast, generic_cy._sum,
+    generic_cy._noise_filter, generic_cy._otsu, generic_cy._majority,
+}
+
+# Cython functions returning the value of the pixel when its neighborhood is
+# made of this pixel only
+_IDENTITY_FILTERS = {
+    generic_cy._maximum, generic_cy._mean, generic_cy._geometric_mean,
+    generic_cy._median, generic_cy._minimum, generic_cy._modal,
+    generic_cy._enhance_contrast, generic_cy._sum, generic_cy._majority,
+}
+
+
+def _numba_filter(func):
+    """Return the Numba version of a Cython filter, if it is selected.
+
+    The Numba filters of `_generic_numba` replace their Cython counterparts
+    when the ``SKIMAGE_BACKEND`` environment variable is set to ``numba``.
+    The filters without Numba version always use Cython.
 
-    if n_bins > 2**10:
-        warn(f'Bad rank filter performance is expected due to a '
-             f'large number of bins ({n_bins}), equivalent to an approximate '
-             f'bitdepth of {np.log2(n_bins):.1f}.',
-             stacklevel=2)
+    Returns
+    -------
+    numba_func : function or None
+        The Numba filter, None if the Cython one is to be used.
 
-    return image, footprint, out, mask, n_bins
+    """
+    if os.environ.get('SKIMAGE_BACKEND') != 'numba':
+        return None
+    try:
+        # Numba is an optional dependency, only imported when selected
+        from . import _generic_numba
+    except ImportError:
+        raise RuntimeError("Could not import 'numba'. Please install "
+                           "using 'pip install numba'")
+    return getattr(_generic_numba, func.__name__, None)
+
+
+def _apply_degenerate_footprint(func, image, footprint, mask, out, shift_x,
+                                shift_y, shift_z, n_bins):
+    """Fill `out` without histograms if the footprint is degenerate.
+
+    The arguments are those of the 3-D Cython core, as returned by `_to_3D`.
+    Empty footprints give empty neighborhoods, for which the kernels return 0
+    (but that of `noise_filter`), and footprints made of their center only
+    give the image itself for the filters of `_IDENTITY_FILTERS`, provided
+    that no pixel is masked and all the image values fall in the `n_bins`
+    bins of the histogram.
+
+    Returns
+    -------
+    filled : bool
+        Whether `out` was filled.
+
+    """
+    centre = tuple(size // 2 + shift for size, shift
+                   in zip(footprint.shape, (shift_x, shift_y, shift_z)))
+    if not all(0 <= c < size for c, size in zip(centre, footprint.shape)):
+        # let the Cython core report the invalid shift
+        return False
+
+    n_elements = np.count_nonzero(footprint)
+    if n_elements == 0 and func is not generic_cy._noise_filter:
+        out.fill(0)
+        return True
+    if (n_elements == 1 and footprint[centre] and mask is None
+            and func in _IDENTITY_FILTERS and n_bins is None):
+        out[..., 0] = image
+        return True
+    return False
 
 
 def _apply_scalar_per_pixel(func, image, footprint, out, mask, shift_x,
-                            shift_y, out_dtype=None):
+                            shift_y, shift_z=False, out_dtype=None,
+                            n_bins=None, num_threads=None, max_n_bins=None):
     """Process the specific cython function to the image.
 
     Parameters
     ----------
     func : function
-        Cython function to apply.
-    image : 2-D array (integer or float)
+        Cython function to apply. It operates on 3-D arrays; 2-D images are
+        processed as a single plane.
+    image : ([P,] M, N) ndarray (integer or float)
         Input image.
-    footprint : 2-D array (integer or float)
-        The neighborhood expressed as a 2-D array of 1's and 0's.
-    out : 2-D array (integer or float)
+    footprint : ([P,] M, N) ndarray (integer or float)
+        The neighborhood expressed as an array of 1's and 0's.
+    out : ([P,] M, N) ndarray (integer or float)
         If None, a new array is allocated.
     mask : ndarray (integer or float)
         Mask array that defines (>0) area of the image included in the local
         neighborhood. If None, the complete image is used (default).
-    shift_x, shift_y : int
+    shift_x, shift_y, shift_z : int
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+        `shift_z` is ignored for 2-D images.
     out_dtype : data-type, optional
         Desired output data-type. Default is None, which means we cast output
         in input dtype.
+    n_bins : int, optional
+        Number of histogram bins. If None (default), it is determined from
+        the image dtype and, for 16-bit images, its maximum value.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, or a single thread for small images (see
+        `_default_num_threads`).
+    max_n_bins : int, optional
+        Maximum number of histogram bins, 16-bit images needing more being
+        quantized (see `_quantize`). If None (default), the image is never
+        quantized.
 
     """
+    scale = None
+    n_bins_arg = n_bins
+    if max_n_bins is not None:
+        image, n_bins, scale = _quantize(image, n_bins, max_n_bins)
+        if scale is not None and out_dtype is None:
+            # the output keeps the dtype of the original image
+            out_dtype = np.uint16
+
     # preprocess and verify the input
+    out_arg = out
     image, footprint, out, mask, n_bins = _preprocess_input(image, footprint,
                                                             out, mask,
-                                                            out_dtype)
-
-    # apply cython function
-    func(image, footprint, shift_x=shift_x, shift_y=shift_y, mask=mask,
-         out=out, n_bins=n_bins)
-
-    return np.squeeze(out, axis=-1)
-
+                                                            out_dtype,
+                                                            n_bins=n_bins,
+                                                            strided=True)
 
-def _apply_scalar_per_pixel_3D(func, image, footprint, out, mask, shift_x,
-                               shift_y, shift_z, out_dtype=None):
+    num_threads = _default_num_threads(image, num_threads)
 
-    image, footprint, out, mask, n_bins = _handle_input_3D(
-        image, footprint, out, mask, out_dtype
-    )
+    # apply cython function, or its Numba version if selected
+    args = _to_3D(image, footprint, out, mask, shift_x, shift_y, shift_z)
+    if not _apply_degenerate_footprint(func, *args, n_bins=n_bins_arg):
+        filter_func = _numba_filter(func) or func
+        filter_func(*args, n_bins=n_bins, num_threads=num_threads)
 
-    func(image, footprint, shift_x=shift_x, shift_y=shift_y, shift_z=shift_z,
-         mask=mask, out=out, n_bins=n_bins)
+    if scale is not None and func in _INTENSITY_FILTERS:
+        rescaled = np.round(out / scale)
+        if out.dtype.kind in 'ui':
+            np.clip(rescaled, 0, np.iinfo(out.dtype).max, out=rescaled)
+        out[...] = rescaled
 
-    return out.reshape(out.shape[:3])
+    # the Cython function filled the caller's array in place through a view
+    # with a trailing pixel axis, return it as such
+    if out_arg is not None and out_arg.ndim == image.ndim:
+        return out_arg
+    return out.reshape(image.shape)
 
 
 def _apply_vector_per_pixel(func, image, footprint, out, mask, shift_x,
-                            shift_y, out_dtype=None, pixel_size=1):
+                            shift_y, out_dtype=None, pixel_size=1,
+                            n_bins=None, num_threads=None):
     """
 
     Parameters
@@ -295,8 +477,10 @@ def _apply_vector_per_pixel(func, image, footprint, out, mask, shift_x,
         Cython function to apply.
     image : 2-D array (integer or float)
         Input image.
-    footprint : 2-D array (integer or float)
-        The neighborhood expressed as a 2-D array of 1's and 0's.
+    footprint : 2-D array (integer or float), int or tuple of int
+        The neighborhood expressed as a 2-D array of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along both
+        axes).
     out : 2-D array (integer or float)
         If None, a new array is allocated.
     mask : ndarray (integer or float)
@@ -310,6 +494,13 @@ def _apply_vector_per_pixel(func, image, footprint, out, mask, shift_x,
         in input dtype.
     pixel_size : int, optional
         Dimension of each pixel.
+    n_bins : int, optional
+        Number of histogram bins. If None (default), it is determined from
+        the image dtype and, for 16-bit images, its maximum value.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, or a single thread for small images (see
+        `_default_num_threads`).
 
     Returns
     -------
@@ -322,22 +513,402 @@ def _apply_vector_per_pixel(func, image, footprint, out, mask, shift_x,
         case all elements will be 0.
 
     """
+    check_nD(image, 2)
+
     # preprocess and verify the input
     image, footprint, out, mask, n_bins = _preprocess_input(image, footprint,
                                                             out, mask,
                                                             out_dtype,
-                                                            pixel_size)
+                                                            pixel_size,
+                                                            n_bins,
+                                                            strided=True)
+
+    num_threads = _default_num_threads(image, num_threads)
 
     # apply cython function
-    func(image, footprint, shift_x=shift_x, shift_y=shift_y, mask=mask,
-         out=out, n_bins=n_bins)
+    func(*_to_3D(image, footprint, out, mask, shift_x, shift_y, False),
+         n_bins=n_bins, num_threads=num_threads)
 
     return out
 
 
+def _apply_rectangle_filter(filter_func, image, footprint, out, shift_x,
+                            shift_y, shift_z=False):
+    """Apply a SciPy filter over the rectangular neighborhood of each pixel.
+
+    This is a fast path for filters whose histogram-based version is
+    equivalent to a separable SciPy filter when the footprint is a rectangle
+    and there is no mask.
+
+    Parameters
+    ----------
+    filter_func : function
+        Either `scipy.ndimage.minimum_filter` or
+        `scipy.ndimage.maximum_filter`.
+    image : ([P,] M, N) ndarray (integer or float)
+        Input image.
+    footprint : ([P,] M, N) ndarray
+        The neighborhood, an array of 1's only.
+    out : ([P,] M, N) ndarray (integer or float)
+        If None, a new array is allocated.
+    shift_x, shift_y, shift_z : int
+        Offset added to the footprint center point. Shift is bounded to the
+        footprint sizes (center must be inside the given footprint).
+        `shift_z` is ignored for 2-D images.
+
+    """
+    out_arg = out
+    # the number of bins is irrelevant here, it is given only to skip its
+    # computation
+    image, footprint, out, _, _ = _preprocess_input(image, footprint, out,
+                                                    n_bins=2)
+    shifts = _rectangle_shifts(footprint, shift_x, shift_y, shift_z)
+
+    # pixels outside of the image must not contribute to the neighborhood
+    if filter_func is ndi.maximum_filter:
+        cval = 0
+    else:
+        cval = np.iinfo(image.dtype).max
+    filter_func(image, size=footprint.shape, output=out.reshape(image.shape),
+                mode='constant', cval=cval, origin=shifts)
+
+    if out_arg is not None and out_arg.ndim == image.ndim:
+        return out_arg
+    return out.reshape(image.shape)
+
+
+def _rectangle_min_max(image, footprint, shift_x, shift_y, shift_z=False):
+    """Return the local minimum and maximum over a rectangular neighborhood.
+
+    The input is preprocessed once for both separable SciPy filters, which
+    `gradient` and `enhance_contrast` combine as their Cython kernels do
+    with the extrema of the local histogram.
+
+    Returns
+    -------
+    image : ([P,] M, N) ndarray (np.uint8 or np.uint16)
+        The preprocessed image.
+    local_min, local_max : ([P,] M, N) ndarray (same dtype as `image`)
+        The extrema of the neighborhood of each pixel.
+
+    """
+    image, footprint, _, _, _ = _preprocess_input(image, footprint, n_bins=2)
+    shifts = _rectangle_shifts(footprint, shift_x, shift_y, shift_z)
+    local_min = ndi.minimum_filter(image, size=footprint.shape,
+                                   mode='constant',
+                                   cval=np.iinfo(image.dtype).max,
+                                   origin=shifts)
+    local_max = ndi.maximum_filter(image, size=footprint.shape,
+                                   mode='constant', cval=0, origin=shifts)
+    return image, local_min, local_max
+
+
+def _enhance_from_min_max(image, local_min, local_max):
+    """Choose the closest local extremum, as `generic_cy._enhance_contrast`."""
+    # signed arithmetic, the differences being negative
+    g = image.astype(np.int64)
+    result = np.where(local_max - g < g - local_min, local_max, local_min)
+    return result.astype(image.dtype)
+
+
+def _write_output(result, out):
+    """Return `result`, copied into `out` if given."""
+    if out is None:
+        return result
+    out[...] = result.reshape(out.shape)
+    return out
+
+
+def _rectangle_shifts(footprint, shift_x, shift_y, shift_z):
+    """Return the shifts of a rectangular footprint ordered as its axes."""
+    if footprint.ndim == 2:
+        shifts = (shift_y, shift_x)
+    else:
+        shifts = (shift_x, shift_y, shift_z)
+    for axis, (size, shift) in enumerate(zip(footprint.shape, shifts)):
+        if not 0 <= size // 2 + shift < size:
+            raise ValueError(f'half footprint + shift must be between 0 and '
+                             f'footprint along axis {axis}')
+    return shifts
+
+
+def _box_sum(image, size, shift, axis, max_value):
+    """Sum `image` over a sliding window along `axis`, using a cumulative sum.
+
+    The cumulative sums are computed with 32-bit integers when they cannot
+    exceed them, given that the values of `image` are at most `max_value`,
+    which halves the memory they take and traverse.
+
+    Returns the window sums and the number of pixels of each window lying
+    inside the image.
+    """
+    length = image.shape[axis]
+    dtype = np.uint32 if length * max_value < 2 ** 32 else np.int64
+    cumsum = np.zeros(image.shape[:axis] + (length + 1,)
+                      + image.shape[axis + 1:], dtype=dtype)
+    np.cumsum(image, axis=axis, dtype=dtype,
+              out=cumsum[(slice(None),) * axis + (slice(1, None),)])
+    start = np.arange(length) - (size // 2 + shift)
+    stop = np.clip(start + size, 0, length)
+    start = np.clip(start, 0, length)
+    sums = (np.take(cumsum, stop, axis=axis)
+            - np.take(cumsum, start, axis=axis))
+    return sums, stop - start
+
+
+def _apply_rectangle_mean(func, image, footprint, out, shift_x, shift_y,
+                          shift_z=False):
+    """Apply a mean-based filter over the rectangular neighborhood of pixels.
+
+    The sum of each neighborhood is read from the cumulative sums of the
+    image, whatever the size of the footprint. The result is identical to the
+    one of the histogram-based filter when there is no mask and all the image
+    values fall in the histogram.
+
+    Parameters
+    ----------
+    func : function
+        One of `generic_cy._mean`, `generic_cy._subtract_mean`,
+        `generic_cy._pop`, `generic_cy._sum` or `generic_cy._threshold`,
+        which is emulated.
+    image : ([P,] M, N) ndarray (uint8, uint16)
+        Input image.
+    footprint : ([P,] M, N) ndarray
+        The neighborhood, an array of 1's only.
+    out : ([P,] M, N) ndarray
+        If None, a new array is allocated.
+    shift_x, shift_y, shift_z : int
+        Offset added to the footprint center point. Shift is bounded to the
+        footprint sizes (center must be inside the given footprint).
+        `shift_z` is ignored for 2-D images.
+
+    """
+    out_arg = out
+    if func is generic_cy._subtract_mean:
+        image, footprint, out, _, n_bins = _preprocess_input(image, footprint,
+                                                             out)
+    else:
+        # the number of bins is not needed, it is given to skip its
+        # computation
+        image, footprint, out, _, n_bins = _preprocess_input(image, footprint,
+                                                             out, n_bins=2)
+    shifts = _rectangle_shifts(footprint, shift_x, shift_y, shift_z)
+
+    sums = image
+    max_value = np.iinfo(image.dtype).max
+    pop = np.ones((), dtype=np.float64)
+    for axis, (size, shift) in enumerate(zip(footprint.shape, shifts)):
+        sums, counts = _box_sum(sums, size, shift, axis, max_value)
+        # the window sums are the values summed along the next axis
+        max_value *= size
+        pop = np.multiply.outer(pop, counts)
+
+    # same arithmetic as the Cython kernels; the center of the footprint lies
+    # in the image, hence no neighborhood is empty
+    if func is generic_cy._pop:
+        result = pop
+    elif func is generic_cy._sum:
+        result = sums
+    else:
+        result = sums / pop
+        if func is generic_cy._subtract_mean:
+            result = (image - result) / 2 + (n_bins // 2 - 1)
+        elif func is generic_cy._threshold:
+            result = image > result
+    out.reshape(image.shape)[...] = result.astype(out.dtype)
+
+    if out_arg is not None and out_arg.ndim == image.ndim:
+        return out_arg
+    return out.reshape(image.shape)
+
+
+# compare-exchange pairs of a sorting network leaving the median of 9 values
+# at index 4 [Paeth, "Median finding on a 3x3 grid", Graphics Gems, 1990]
+_MEDIAN_9_NETWORK = ((1, 2), (4, 5), (7, 8), (0, 1), (3, 4), (6, 7), (1, 2),
+                     (4, 5), (7, 8), (0, 3), (5, 8), (4, 7), (3, 6), (1, 4),
+                     (2, 5), (4, 7), (4, 2), (6, 4), (4, 2))
+
+
+def _median_3x3(image, out):
+    """Apply the median filter over the 3x3 square neighborhood of pixels.
+
+    The neighborhoods of the interior pixels are sorted all at once by a
+    sorting network of element-wise minima and maxima, which NumPy
+    vectorizes. Those of the one-pixel frame of the image, truncated by its
+    border, are left to the histogram-based filter.
+
+    Parameters
+    ----------
+    image : (M, N) ndarray (uint8, uint16)
+        Input image, with at least 3 rows and 3 columns.
+    out : (M, N) ndarray
+        If None, a new array is allocated.
+
+    """
+    out_arg = out
+    image, footprint, out, _, n_bins = _preprocess_input(
+        image, np.ones((3, 3), dtype=np.uint8), out)
+    rows, cols = image.shape
+    out_2D = out.reshape(image.shape)
+
+    values = [image[r:rows - 2 + r, c:cols - 2 + c].copy()
+              for r in range(3) for c in range(3)]
+    low = np.empty_like(values[0])
+    for i, j in _MEDIAN_9_NETWORK:
+        np.minimum(values[i], values[j], out=low)
+        np.maximum(values[i], values[j], out=values[j])
+        values[i], low = low, values[i]
+    out_2D[1:-1, 1:-1] = values[4]
+
+    for window, edge in [(np.s_[:2], np.s_[0]), (np.s_[-2:], np.s_[-1]),
+                         (np.s_[:, :2], np.s_[:, 0]),
+                         (np.s_[:, -2:], np.s_[:, -1])]:
+        frame = np.ascontiguousarray(image[window])
+        frame_out = np.empty(frame.shape + (1,), dtype=out.dtype)
+        generic_cy._median(*_to_3D(frame, footprint, frame_out, None, 0, 0,
+                                   0),
+                           n_bins=n_bins, num_threads=1)
+        out_2D[edge] = frame_out[..., 0][edge]
+
+    if out_arg is not None and out_arg.ndim == image.ndim:
+        return out_arg
+    return out_2D
+
+
+def _forward_cupy(func):
+    """Forward a filter to its CUDA implementation for CuPy images.
+
+    The filters of `_generic_cupy` are used when they exist and support the
+    dtype and dimensions of the image, and those of cuCIM otherwise. Both are
+    only imported when a CuPy array is passed, so that they are not
+    dependencies of the NumPy code path.
+    """
+    @wraps(func)
+    def wrapper(image, *args, **kwargs):
+        if type(image).__module__.split('.')[0] != 'cupy':
+            return func(image, *args, **kwargs)
+        try:
+            from . import _generic_cupy
+            gpu_func = getattr(_generic_cupy, func.__name__)
+            if not _generic_cupy._supports(image):
+                gpu_func = None
+        except (ImportError, AttributeError):
+            gpu_func = None
+        if gpu_func is None:
+            try:
+                from cucim.skimage.filters import rank as cucim_rank
+                gpu_func = getattr(cucim_rank, func.__name__)
+            except (ImportError, AttributeError):
+                raise TypeError(f'{func.__name__} requires cuCIM to filter '
+                                f'CuPy arrays; install it or pass a NumPy '
+                                f'array.')
+        return gpu_func(image, *args, **kwargs)
+
+    return wrapper
+
+
+def _is_rectangle(footprint):
+    """Check whether a footprint is a non-empty array of 1's only."""
+    footprint = np.asarray(footprint)
+    return footprint.size > 0 and bool(np.all(footprint > 0))
+
+
+@lru_cache(maxsize=32)
+def _rectangle_footprint(shape):
+    """Return a rectangular footprint of the given shape.
+
+    The footprints are cached and must thus not be modified.
+
+    """
+    footprint = np.ones(shape, dtype=np.uint8)
+    footprint.flags.writeable = False
+    return footprint
+
+
+def _footprint_from_shape(func):
+    """Accept the shape of a rectangular footprint in place of the array.
+
+    A footprint given as an int, the size along every axis of the image, or
+    as a tuple of ints, is replaced by the rectangle of 1's of this shape,
+    which the filters then handle as any rectangular footprint.
+    """
+    @wraps(func)
+    def wrapper(image, footprint=None, *args, **kwargs):
+        if isinstance(footprint, (int, np.integer)):
+            footprint = (int(footprint),) * np.ndim(image)
+        if (isinstance(footprint, tuple) and footprint
+                and all(isinstance(size, (int, np.integer))
+                        for size in footprint)):
+            footprint = _rectangle_footprint(tuple(map(int, footprint)))
+        return func(image, footprint, *args, **kwargs)
+
+    return wrapper
+
+
+def _footprint_is_sequence(footprint):
+    """Check whether a footprint is a sequence of ``(footprint, n)`` pairs."""
+    return (isinstance(footprint, tuple) and len(footprint) > 0
+            and all(isinstance(item, tuple) and len(item) == 2
+                    and isinstance(item[0], np.ndarray)
+                    and isinstance(item[1], (int, np.integer))
+                    for item in footprint))
+
+
+def _apply_footprint_sequence(filter_func, image, footprint, out, mask,
+                              shift_x, shift_y, shift_z, **kwargs):
+    """Apply `minimum` or `maximum` successively with each footprint.
+
+    Parameters
+    ----------
+    filter_func : function
+        Either `minimum` or `maximum`.
+    image : ([P,] M, N) ndarray (integer or float)
+        Input image.
+    footprint : tuple of (ndarray, int)
+        Sequence of footprints, each applied the given number of times. The
+        neighborhood is the Minkowski sum of all these footprints.
+    out : ([P,] M, N) ndarray (integer or float)
+        If None, a new array is allocated.
+    mask, shift_x, shift_y, shift_z
+        Unsupported with footprint sequences, they must keep their default
+        values.
+    **kwargs
+        Passed to `filter_func` for each footprint.
+
+    """
+    if mask is not None or shift_x or shift_y or shift_z:
+        raise ValueError('mask and shifts are not supported with footprint '
+                         'sequences.')
+
+    # the input is converted once, and not by each filter of the chain
+    image, _, _, _, _ = _preprocess_input(image, footprint[0][0], n_bins=2)
+    pads = np.zeros(image.ndim, dtype=int)
+    for fp, num_iter in footprint:
+        if np.ndim(fp) != image.ndim:
+            raise ValueError('Image dimensions and neighborhood dimensions '
+                             'do not match')
+        pads += num_iter * (np.array(fp.shape) // 2)
+
+    # the pixels out of the image do not belong to the neighborhoods; the
+    # image is padded by the extent of the composite footprint with a value
+    # that never wins, so that each filter of the chain also spreads the
+    # values reaching the image through its surroundings
+    pad_value = image.max() if filter_func is minimum else image.min()
+    padded = np.pad(image, [(pad, pad) for pad in pads],
+                    constant_values=pad_value)
+    for fp, num_iter in footprint:
+        for _ in range(num_iter):
+            padded = filter_func(padded, fp, **kwargs)
+    result = padded[tuple(slice(pad, pad + size)
+                          for pad, size in zip(pads, image.shape))]
+    return _write_output(result, out)
+
+
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
 def autolevel(image, footprint, out=None, mask=None,
-              shift_x=False, shift_y=False, shift_z=False):
+              shift_x=False, shift_y=False, shift_z=False, n_bins=None,
+              num_threads=None, max_n_bins=None):
     """Auto-level image using local histogram.
 
     This filter locally stretches the histogram of gray values to cover the
@@ -347,8 +918,10 @@ def autolevel(image, footprint, out=None, mask=None,
     ----------
     image : ([P,] M, N) ndarray (uint8, uint16)
         Input image.
-    footprint : ndarray
-        The neighborhood expressed as an ndarray of 1's and 0's.
+    footprint : ndarray, int or tuple of int
+        The neighborhood expressed as an ndarray of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along every
+        axis).
     out : ([P,] M, N) array (same dtype as input)
         If None, a new array is allocated.
     mask : ndarray (integer or float), optional
@@ -357,6 +930,23 @@ def autolevel(image, footprint, out=None, mask=None,
     shift_x, shift_y, shift_z : int
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before filtering, and intensity
+        outputs are mapped back to the input range, which trades accuracy for
+        speed on high bit-depth images. Default is None, which means no
+        quantization.
 
     Returns
     -------
@@ -377,29 +967,29 @@ def autolevel(image, footprint, out=None, mask=None,
 
     """
 
-    np_image = np.asanyarray(image)
-    if np_image.ndim == 2:
-        return _apply_scalar_per_pixel(generic_cy._autolevel, image, footprint,
-                                       out=out, mask=mask,
-                                       shift_x=shift_x, shift_y=shift_y)
-    else:
-        return _apply_scalar_per_pixel_3D(generic_cy._autolevel_3D, image,
-                                          footprint, out=out, mask=mask,
-                                          shift_x=shift_x, shift_y=shift_y,
-                                          shift_z=shift_z)
+    return _apply_scalar_per_pixel(generic_cy._autolevel, image, footprint,
+                                   out=out, mask=mask,
+                                   shift_x=shift_x, shift_y=shift_y,
+                                   shift_z=shift_z, n_bins=n_bins,
+                                   num_threads=num_threads,
+                                   max_n_bins=max_n_bins)
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
 def equalize(image, footprint, out=None, mask=None,
-             shift_x=False, shift_y=False, shift_z=False):
+             shift_x=False, shift_y=False, shift_z=False, n_bins=None,
+             num_threads=None, max_n_bins=None):
     """Equalize image using local histogram.
 
     Parameters
     ----------
     image : ([P,] M, N) ndarray (uint8, uint16)
         Input image.
-    footprint : ndarray
-        The neighborhood expressed as an ndarray of 1's and 0's.
+    footprint : ndarray, int or tuple of int
+        The neighborhood expressed as an ndarray of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along every
+        axis).
     out : ([P,] M, N) array (same dtype as input)
         If None, a new array is allocated.
     mask : ndarray (integer or float), optional
@@ -408,6 +998,23 @@ def equalize(image, footprint, out=None, mask=None,
     shift_x, shift_y, shift_z : int
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before filtering, and intensity
+        outputs are mapped back to the input range, which trades accuracy for
+        speed on high bit-depth images. Default is None, which means no
+        quantization.
 
     Returns
     -------
@@ -428,29 +1035,29 @@ def equalize(image, footprint, out=None, mask=None,
 
     """
 
-    np_image = np.asanyarray(image)
-    if np_image.ndim == 2:
-        return _apply_scalar_per_pixel(generic_cy._equalize, image, footprint,
-                                       out=out, mask=mask,
-                                       shift_x=shift_x, shift_y=shift_y)
-    else:
-        return _apply_scalar_per_pixel_3D(generic_cy._equalize_3D, image,
-                                          footprint, out=out, mask=mask,
-                                          shift_x=shift_x, shift_y=shift_y,
-                                          shift_z=shift_z)
+    return _apply_scalar_per_pixel(generic_cy._equalize, image, footprint,
+                                   out=out, mask=mask,
+                                   shift_x=shift_x, shift_y=shift_y,
+                                   shift_z=shift_z, n_bins=n_bins,
+                                   num_threads=num_threads,
+                                   max_n_bins=max_n_bins)
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
 def gradient(image, footprint, out=None, mask=None,
-             shift_x=False, shift_y=False, shift_z=False):
+             shift_x=False, shift_y=False, shift_z=False, n_bins=None,
+             num_threads=None, max_n_bins=None):
     """Return local gradient of an image (i.e. local maximum - local minimum).
 
     Parameters
     ----------
     image : ([P,] M, N) ndarray (uint8, uint16)
         Input image.
-    footprint : ndarray
-        The neighborhood expressed as an ndarray of 1's and 0's.
+    footprint : ndarray, int or tuple of int
+        The neighborhood expressed as an ndarray of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along every
+        axis).
     out : ([P,] M, N) array (same dtype as input)
         If None, a new array is allocated.
     mask : ndarray (integer or float), optional
@@ -459,6 +1066,23 @@ def gradient(image, footprint, out=None, mask=None,
     shift_x, shift_y, shift_z : int
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before filtering, and intensity
+        outputs are mapped back to the input range, which trades accuracy for
+        speed on high bit-depth images. Default is None, which means no
+        quantization.
 
     Returns
     -------
@@ -479,29 +1103,40 @@ def gradient(image, footprint, out=None, mask=None,
 
     """
 
-    np_image = np.asanyarray(image)
-    if np_image.ndim == 2:
-        return _apply_scalar_per_pixel(generic_cy._gradient, image, footprint,
-                                       out=out, mask=mask,
-                                       shift_x=shift_x, shift_y=shift_y)
-    else:
-        return _apply_scalar_per_pixel_3D(generic_cy._gradient_3D, image,
-                                          footprint, out=out, mask=mask,
-                                          shift_x=shift_x, shift_y=shift_y,
-                                          shift_z=shift_z)
+    if mask is None and _is_rectangle(footprint):
+        _, local_min, local_max = _rectangle_min_max(image, footprint,
+                                                     shift_x, shift_y,
+                                                     shift_z)
+        return _write_output(local_max - local_min, out)
+
+    return _apply_scalar_per_pixel(generic_cy._gradient, image, footprint,
+                                   out=out, mask=mask,
+                                   shift_x=shift_x, shift_y=shift_y,
+                                   shift_z=shift_z, n_bins=n_bins,
+                                   num_threads=num_threads,
+                                   max_n_bins=max_n_bins)
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
+@_forward_cupy
 def maximum(image, footprint, out=None, mask=None,
-            shift_x=False, shift_y=False, shift_z=False):
+            shift_x=False, shift_y=False, shift_z=False, n_bins=None,
+            num_threads=None, max_n_bins=None):
     """Return local maximum of an image.
 
     Parameters
     ----------
     image : ([P,] M, N) ndarray (uint8, uint16)
         Input image.
-    footprint : ndarray
-        The neighborhood expressed as an ndarray of 1's and 0's.
+    footprint : ndarray, int, tuple of int or tuple of (ndarray, int)
+        The neighborhood expressed as an ndarray of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along every
+        axis). It can also be a sequence of ``(footprint, num_iter)`` pairs,
+        each footprint being applied `num_iter` times in turn, which filters
+        with their composite neighborhood (e.g. a large footprint decomposed
+        into smaller ones). Neither `mask` nor shifts can be used with such
+        sequences.
     out : ([P,] M, N) array (same dtype as input)
         If None, a new array is allocated.
     mask : ndarray (integer or float), optional
@@ -510,6 +1145,23 @@ def maximum(image, footprint, out=None, mask=None,
     shift_x, shift_y, shift_z : int
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before filtering, and intensity
+        outputs are mapped back to the input range, which trades accuracy for
+        speed on high bit-depth images. Default is None, which means no
+        quantization.
 
     Returns
     -------
@@ -525,6 +1177,10 @@ def maximum(image, footprint, out=None, mask=None,
     The lower algorithm complexity makes `skimage.filters.rank.maximum`
     more efficient for larger images and footprints.
 
+    Without mask, a rectangular footprint (i.e. made of 1's only) is handled
+    by the separable `scipy.ndimage.maximum_filter`, whose cost does not
+    depend on the footprint size.
+
     Examples
     --------
     >>> from skimage import data
@@ -539,29 +1195,42 @@ def maximum(image, footprint, out=None, mask=None,
 
     """
 
-    np_image = np.asanyarray(image)
-    if np_image.ndim == 2:
-        return _apply_scalar_per_pixel(generic_cy._maximum, image, footprint,
-                                       out=out, mask=mask,
-                                       shift_x=shift_x, shift_y=shift_y)
-    else:
-        return _apply_scalar_per_pixel_3D(generic_cy._maximum_3D, image,
-                                          footprint, out=out, mask=mask,
-                                          shift_x=shift_x, shift_y=shift_y,
-                                          shift_z=shift_z)
+    if _footprint_is_sequence(footprint):
+        return _apply_footprint_sequence(maximum, image, footprint, out, mask,
+                                         shift_x, shift_y, shift_z,
+                                         n_bins=n_bins,
+                                         num_threads=num_threads,
+                                         max_n_bins=max_n_bins)
+
+    if mask is None and _is_rectangle(footprint):
+        return _apply_rectangle_filter(ndi.maximum_filter, image, footprint,
+                                       out=out, shift_x=shift_x,
+                                       shift_y=shift_y, shift_z=shift_z)
+
+    return _apply_scalar_per_pixel(generic_cy._maximum, image, footprint,
+                                   out=out, mask=mask,
+                                   shift_x=shift_x, shift_y=shift_y,
+                                   shift_z=shift_z, n_bins=n_bins,
+                                   num_threads=num_threads,
+                                   max_n_bins=max_n_bins)
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
+@_forward_cupy
 def mean(image, footprint, out=None, mask=None,
-         shift_x=False, shift_y=False, shift_z=False):
+         shift_x=False, shift_y=False, shift_z=False, n_bins=None,
+         num_threads=None, max_n_bins=None):
     """Return local mean of an image.
 
     Parameters
     ----------
     image : ([P,] M, N) ndarray (uint8, uint16)
         Input image.
-    footprint : ndarray
-        The neighborhood expressed as an ndarray of 1's and 0's.
+    footprint : ndarray, int or tuple of int
+        The neighborhood expressed as an ndarray of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along every
+        axis).
     out : ([P,] M, N) array (same dtype as input)
         If None, a new array is allocated.
     mask : ndarray (integer or float), optional
@@ -570,6 +1239,23 @@ def mean(image, footprint, out=None, mask=None,
     shift_x, shift_y, shift_z : int
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before filtering, and intensity
+        outputs are mapped back to the input range, which trades accuracy for
+        speed on high bit-depth images. Default is None, which means no
+        quantization.
 
     Returns
     -------
@@ -590,29 +1276,35 @@ def mean(image, footprint, out=None, mask=None,
 
     """
 
-    np_image = np.asanyarray(image)
-    if np_image.ndim == 2:
-        return _apply_scalar_per_pixel(generic_cy._mean, image, footprint,
-                                       out=out, mask=mask,
-                                       shift_x=shift_x, shift_y=shift_y)
-    else:
-        return _apply_scalar_per_pixel_3D(generic_cy._mean_3D, image,
-                                          footprint, out=out, mask=mask,
-                                          shift_x=shift_x, shift_y=shift_y,
-                                          shift_z=shift_z)
+    if (mask is None and n_bins is None and max_n_bins is None
+            and _is_rectangle(footprint)):
+        return _apply_rectangle_mean(generic_cy._mean, image, footprint,
+                                     out=out, shift_x=shift_x,
+                                     shift_y=shift_y, shift_z=shift_z)
+
+    return _apply_scalar_per_pixel(generic_cy._mean, image, footprint,
+                                   out=out, mask=mask,
+                                   shift_x=shift_x, shift_y=shift_y,
+                                   shift_z=shift_z, n_bins=n_bins,
+                                   num_threads=num_threads,
+                                   max_n_bins=max_n_bins)
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
 def geometric_mean(image, footprint, out=None, mask=None,
-                   shift_x=False, shift_y=False, shift_z=False):
+                   shift_x=False, shift_y=False, shift_z=False, n_bins=None,
+                   num_threads=None, max_n_bins=None):
     """Return local geometric mean of an image.
 
     Parameters
     ----------
     image : ([P,] M, N) ndarray (uint8, uint16)
         Input image.
-    footprint : ndarray
-        The neighborhood expressed as an ndarray of 1's and 0's.
+    footprint : ndarray, int or tuple of int
+        The neighborhood expressed as an ndarray of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along every
+        axis).
     out : ([P,] M, N) array (same dtype as input)
         If None, a new array is allocated.
     mask : ndarray (integer or float), optional
@@ -621,6 +1313,23 @@ def geometric_mean(image, footprint, out=None, mask=None,
     shift_x, shift_y, shift_z : int
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before filtering, and intensity
+        outputs are mapped back to the input range, which trades accuracy for
+        speed on high bit-depth images. Default is None, which means no
+        quantization.
 
     Returns
     -------
@@ -646,29 +1355,29 @@ def geometric_mean(image, footprint, out=None, mask=None,
 
     """
 
-    np_image = np.asanyarray(image)
-    if np_image.ndim == 2:
-        return _apply_scalar_per_pixel(generic_cy._geometric_mean, image,
-                                       footprint, out=out, mask=mask,
-                                       shift_x=shift_x, shift_y=shift_y)
-    else:
-        return _apply_scalar_per_pixel_3D(generic_cy._geometric_mean_3D, image,
-                                          footprint, out=out, mask=mask,
-                                          shift_x=shift_x, shift_y=shift_y,
-                                          shift_z=shift_z)
+    return _apply_scalar_per_pixel(generic_cy._geometric_mean, image,
+                                   footprint, out=out, mask=mask,
+                                   shift_x=shift_x, shift_y=shift_y,
+                                   shift_z=shift_z, n_bins=n_bins,
+                                   num_threads=num_threads,
+                                   max_n_bins=max_n_bins)
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
 def subtract_mean(image, footprint, out=None, mask=None,
-                  shift_x=False, shift_y=False, shift_z=False):
+                  shift_x=False, shift_y=False, shift_z=False, n_bins=None,
+                  num_threads=None, max_n_bins=None):
     """Return image subtracted from its local mean.
 
     Parameters
     ----------
     image : ([P,] M, N) ndarray (uint8, uint16)
         Input image.
-    footprint : ndarray
-        The neighborhood expressed as an ndarray of 1's and 0's.
+    footprint : ndarray, int or tuple of int
+        The neighborhood expressed as an ndarray of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along every
+        axis).
     out : ([P,] M, N) array (same dtype as input)
         If None, a new array is allocated.
     mask : ndarray (integer or float), optional
@@ -677,6 +1386,23 @@ def subtract_mean(image, footprint, out=None, mask=None,
     shift_x, shift_y, shift_z : int
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before filtering, and intensity
+        outputs are mapped back to the input range, which trades accuracy for
+        speed on high bit-depth images. Default is None, which means no
+        quantization.
 
     Returns
     -------
@@ -705,30 +1431,36 @@ def subtract_mean(image, footprint, out=None, mask=None,
 
     """
 
-    np_image = np.asanyarray(image)
-    if np_image.ndim == 2:
-        return _apply_scalar_per_pixel(generic_cy._subtract_mean, image,
-                                       footprint, out=out, mask=mask,
-                                       shift_x=shift_x, shift_y=shift_y)
-    else:
-        return _apply_scalar_per_pixel_3D(generic_cy._subtract_mean_3D, image,
-                                          footprint, out=out, mask=mask,
-                                          shift_x=shift_x, shift_y=shift_y,
-                                          shift_z=shift_z)
+    if (mask is None and n_bins is None and max_n_bins is None
+            and _is_rectangle(footprint)):
+        return _apply_rectangle_mean(generic_cy._subtract_mean, image,
+                                     footprint, out=out, shift_x=shift_x,
+                                     shift_y=shift_y, shift_z=shift_z)
+
+    return _apply_scalar_per_pixel(generic_cy._subtract_mean, image,
+                                   footprint, out=out, mask=mask,
+                                   shift_x=shift_x, shift_y=shift_y,
+                                   shift_z=shift_z, n_bins=n_bins,
+                                   num_threads=num_threads,
+                                   max_n_bins=max_n_bins)
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
+@_forward_cupy
 def median(image, footprint=None, out=None, mask=None,
-           shift_x=False, shift_y=False, shift_z=False):
+           shift_x=False, shift_y=False, shift_z=False, n_bins=None,
+           num_threads=None, max_n_bins=None):
     """Return local median of an image.
 
     Parameters
     ----------
     image : ([P,] M, N) ndarray (uint8, uint16)
         Input image.
-    footprint : ndarray
-        The neighborhood expressed as an ndarray of 1's and 0's. If None, a
-        full square of size 3 is used.
+    footprint : ndarray, int or tuple of int, optional
+        The neighborhood expressed as an ndarray of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along every
+        axis). If None, a full square of size 3 is used.
     out : ([P,] M, N) array (same dtype as input)
         If None, a new array is allocated.
     mask : ndarray (integer or float), optional
@@ -737,6 +1469,23 @@ def median(image, footprint=None, out=None, mask=None,
     shift_x, shift_y, shift_z : int
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before filtering, and intensity
+        outputs are mapped back to the input range, which trades accuracy for
+        speed on high bit-depth images. Default is None, which means no
+        quantization.
 
     Returns
     -------
@@ -762,31 +1511,43 @@ def median(image, footprint=None, out=None, mask=None,
 
     """
 
-    np_image = np.asanyarray(image)
     if footprint is None:
-        footprint = ndi.generate_binary_structure(image.ndim, image.ndim)
-    if np_image.ndim == 2:
-        return _apply_scalar_per_pixel(generic_cy._median, image, footprint,
-                                       out=out, mask=mask,
-                                       shift_x=shift_x, shift_y=shift_y)
-    else:
-        return _apply_scalar_per_pixel_3D(generic_cy._median_3D, image,
-                                          footprint, out=out, mask=mask,
-                                          shift_x=shift_x, shift_y=shift_y,
-                                          shift_z=shift_z)
+        ndim = np.ndim(image)
+        footprint = ndi.generate_binary_structure(ndim, ndim)
+    if (mask is None and n_bins is None and max_n_bins is None
+            and not shift_x and not shift_y and np.ndim(image) == 2
+            and min(np.shape(image)) >= 3 and np.shape(footprint) == (3, 3)
+            and _is_rectangle(footprint)):
+        return _median_3x3(image, out)
+
+    return _apply_scalar_per_pixel(generic_cy._median, image, footprint,
+                                   out=out, mask=mask,
+                                   shift_x=shift_x, shift_y=shift_y,
+                                   shift_z=shift_z, n_bins=n_bins,
+                                   num_threads=num_threads,
+                                   max_n_bins=max_n_bins)
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
+@_forward_cupy
 def minimum(image, footprint, out=None, mask=None,
-            shift_x=False, shift_y=False, shift_z=False):
+            shift_x=False, shift_y=False, shift_z=False, n_bins=None,
+            num_threads=None, max_n_bins=None):
     """Return local minimum of an image.
 
     Parameters
     ----------
     image : ([P,] M, N) ndarray (uint8, uint16)
         Input image.
-    footprint : ndarray
-        The neighborhood expressed as an ndarray of 1's and 0's.
+    footprint : ndarray, int, tuple of int or tuple of (ndarray, int)
+        The neighborhood expressed as an ndarray of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along every
+        axis). It can also be a sequence of ``(footprint, num_iter)`` pairs,
+        each footprint being applied `num_iter` times in turn, which filters
+        with their composite neighborhood (e.g. a large footprint decomposed
+        into smaller ones). Neither `mask` nor shifts can be used with such
+        sequences.
     out : ([P,] M, N) array (same dtype as input)
         If None, a new array is allocated.
     mask : ndarray (integer or float), optional
@@ -795,6 +1556,23 @@ def minimum(image, footprint, out=None, mask=None,
     shift_x, shift_y, shift_z : int
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before filtering, and intensity
+        outputs are mapped back to the input range, which trades accuracy for
+        speed on high bit-depth images. Default is None, which means no
+        quantization.
 
     Returns
     -------
@@ -810,6 +1588,10 @@ def minimum(image, footprint, out=None, mask=None,
     The lower algorithm complexity makes `skimage.filters.rank.minimum` more
     efficient for larger images and footprints.
 
+    Without mask, a rectangular footprint (i.e. made of 1's only) is handled
+    by the separable `scipy.ndimage.minimum_filter`, whose cost does not
+    depend on the footprint size.
+
     Examples
     --------
     >>> from skimage import data
@@ -824,21 +1606,31 @@ def minimum(image, footprint, out=None, mask=None,
 
     """
 
-    np_image = np.asanyarray(image)
-    if np_image.ndim == 2:
-        return _apply_scalar_per_pixel(generic_cy._minimum, image, footprint,
-                                       out=out, mask=mask,
-                                       shift_x=shift_x, shift_y=shift_y)
-    else:
-        return _apply_scalar_per_pixel_3D(generic_cy._minimum_3D, image,
-                                          footprint, out=out, mask=mask,
-                                          shift_x=shift_x, shift_y=shift_y,
-                                          shift_z=shift_z)
+    if _footprint_is_sequence(footprint):
+        return _apply_footprint_sequence(minimum, image, footprint, out, mask,
+                                         shift_x, shift_y, shift_z,
+                                         n_bins=n_bins,
+                                         num_threads=num_threads,
+                                         max_n_bins=max_n_bins)
+
+    if mask is None and _is_rectangle(footprint):
+        return _apply_rectangle_filter(ndi.minimum_filter, image, footprint,
+                                       out=out, shift_x=shift_x,
+                                       shift_y=shift_y, shift_z=shift_z)
+
+    return _apply_scalar_per_pixel(generic_cy._minimum, image, footprint,
+                                   out=out, mask=mask,
+                                   shift_x=shift_x, shift_y=shift_y,
+                                   shift_z=shift_z, n_bins=n_bins,
+                                   num_threads=num_threads,
+                                   max_n_bins=max_n_bins)
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
 def modal(image, footprint, out=None, mask=None,
-          shift_x=False, shift_y=False, shift_z=False):
+          shift_x=False, shift_y=False, shift_z=False, n_bins=None,
+          num_threads=None, max_n_bins=None):
     """Return local mode of an image.
 
     The mode is the value that appears most often in the local histogram.
@@ -847,8 +1639,10 @@ def modal(image, footprint, out=None, mask=None,
     ----------
     image : ([P,] M, N) ndarray (uint8, uint16)
         Input image.
-    footprint : ndarray
-        The neighborhood expressed as an ndarray of 1's and 0's.
+    footprint : ndarray, int or tuple of int
+        The neighborhood expressed as an ndarray of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along every
+        axis).
     out : ([P,] M, N) array (same dtype as input)
         If None, a new array is allocated.
     mask : ndarray (integer or float), optional
@@ -857,6 +1651,23 @@ def modal(image, footprint, out=None, mask=None,
     shift_x, shift_y, shift_z : int
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before filtering, and intensity
+        outputs are mapped back to the input range, which trades accuracy for
+        speed on high bit-depth images. Default is None, which means no
+        quantization.
 
     Returns
     -------
@@ -877,21 +1688,19 @@ def modal(image, footprint, out=None, mask=None,
 
     """
 
-    np_image = np.asanyarray(image)
-    if np_image.ndim == 2:
-        return _apply_scalar_per_pixel(generic_cy._modal, image, footprint,
-                                       out=out, mask=mask,
-                                       shift_x=shift_x, shift_y=shift_y)
-    else:
-        return _apply_scalar_per_pixel_3D(generic_cy._modal_3D, image,
-                                          footprint, out=out, mask=mask,
-                                          shift_x=shift_x, shift_y=shift_y,
-                                          shift_z=shift_z)
+    return _apply_scalar_per_pixel(generic_cy._modal, image, footprint,
+                                   out=out, mask=mask,
+                                   shift_x=shift_x, shift_y=shift_y,
+                                   shift_z=shift_z, n_bins=n_bins,
+                                   num_threads=num_threads,
+                                   max_n_bins=max_n_bins)
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
 def enhance_contrast(image, footprint, out=None, mask=None,
-                     shift_x=False, shift_y=False, shift_z=False):
+                     shift_x=False, shift_y=False, shift_z=False, n_bins=None,
+                     num_threads=None, max_n_bins=None):
     """Enhance contrast of an image.
 
     This replaces each pixel by the local maximum if the pixel gray value is
@@ -902,8 +1711,14 @@ def enhance_contrast(image, footprint, out=None, mask=None,
     ----------
     image : ([P,] M, N) ndarray (uint8, uint16)
         Input image.
-    footprint : ndarray
-        The neighborhood expressed as an ndarray of 1's and 0's.
+    footprint : ndarray, int, tuple of int or tuple of (ndarray, int)
+        The neighborhood expressed as an ndarray of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along every
+        axis). It can also be a sequence of ``(footprint, num_iter)`` pairs,
+        each footprint being applied `num_iter` times in turn, which filters
+        with their composite neighborhood (e.g. a large footprint decomposed
+        into smaller ones). Neither `mask` nor shifts can be used with such
+        sequences.
     out : ([P,] M, N) array (same dtype as input)
         If None, a new array is allocated.
     mask : ndarray (integer or float), optional
@@ -912,6 +1727,23 @@ def enhance_contrast(image, footprint, out=None, mask=None,
     shift_x, shift_y, shift_z : int
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before filtering, and intensity
+        outputs are mapped back to the input range, which trades accuracy for
+        speed on high bit-depth images. Default is None, which means no
+        quantization.
 
     Returns
     -------
@@ -932,21 +1764,41 @@ def enhance_contrast(image, footprint, out=None, mask=None,
 
     """
 
-    np_image = np.asanyarray(image)
-    if np_image.ndim == 2:
-        return _apply_scalar_per_pixel(generic_cy._enhance_contrast, image,
-                                       footprint, out=out, mask=mask,
-                                       shift_x=shift_x, shift_y=shift_y)
-    else:
-        return _apply_scalar_per_pixel_3D(generic_cy._enhance_contrast_3D,
-                                          image, footprint, out=out, mask=mask,
-                                          shift_x=shift_x, shift_y=shift_y,
-                                          shift_z=shift_z)
+    if _footprint_is_sequence(footprint):
+        image, _, _, _, _ = _preprocess_input(image, footprint[0][0],
+                                              n_bins=2)
+        kwargs = dict(n_bins=n_bins, num_threads=num_threads,
+                      max_n_bins=max_n_bins)
+        local_min = _apply_footprint_sequence(minimum, image, footprint, None,
+                                              mask, shift_x, shift_y, shift_z,
+                                              **kwargs)
+        local_max = _apply_footprint_sequence(maximum, image, footprint, None,
+                                              mask, shift_x, shift_y, shift_z,
+                                              **kwargs)
+        return _write_output(_enhance_from_min_max(image, local_min,
+                                                   local_max), out)
+
+    if mask is None and _is_rectangle(footprint):
+        image, local_min, local_max = _rectangle_min_max(image, footprint,
+                                                         shift_x, shift_y,
+                                                         shift_z)
+        return _write_output(_enhance_from_min_max(image, local_min,
+                                                   local_max), out)
+
+    return _apply_scalar_per_pixel(generic_cy._enhance_contrast, image,
+                                   footprint, out=out, mask=mask,
+                                   shift_x=shift_x, shift_y=shift_y,
+                                   shift_z=shift_z, n_bins=n_bins,
+                                   num_threads=num_threads,
+                                   max_n_bins=max_n_bins)
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
+@_forward_cupy
 def pop(image, footprint, out=None, mask=None,
-        shift_x=False, shift_y=False, shift_z=False):
+        shift_x=False, shift_y=False, shift_z=False, n_bins=None,
+        num_threads=None, max_n_bins=None):
     """Return the local number (population) of pixels.
 
     The number of pixels is defined as the number of pixels which are included
@@ -956,8 +1808,10 @@ def pop(image, footprint, out=None, mask=None,
     ----------
     image : ([P,] M, N) ndarray (uint8, uint16)
         Input image.
-    footprint : ndarray
-        The neighborhood expressed as an ndarray of 1's and 0's.
+    footprint : ndarray, int or tuple of int
+        The neighborhood expressed as an ndarray of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along every
+        axis).
     out : ([P,] M, N) array (same dtype as input)
         If None, a new array is allocated.
     mask : ndarray (integer or float), optional
@@ -966,6 +1820,23 @@ def pop(image, footprint, out=None, mask=None,
     shift_x, shift_y, shift_z : int
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before filtering, and intensity
+        outputs are mapped back to the input range, which trades accuracy for
+        speed on high bit-depth images. Default is None, which means no
+        quantization.
 
     Returns
     -------
@@ -990,21 +1861,26 @@ def pop(image, footprint, out=None, mask=None,
 
     """
 
-    np_image = np.asanyarray(image)
-    if np_image.ndim == 2:
-        return _apply_scalar_per_pixel(generic_cy._pop, image, footprint,
-                                       out=out, mask=mask,
-                                       shift_x=shift_x, shift_y=shift_y)
-    else:
-        return _apply_scalar_per_pixel_3D(generic_cy._pop_3D, image,
-                                          footprint, out=out, mask=mask,
-                                          shift_x=shift_x, shift_y=shift_y,
-                                          shift_z=shift_z)
+    if (mask is None and n_bins is None and max_n_bins is None
+            and _is_rectangle(footprint)):
+        return _apply_rectangle_mean(generic_cy._pop, image, footprint,
+                                     out=out, shift_x=shift_x,
+                                     shift_y=shift_y, shift_z=shift_z)
+
+    return _apply_scalar_per_pixel(generic_cy._pop, image, footprint,
+                                   out=out, mask=mask,
+                                   shift_x=shift_x, shift_y=shift_y,
+                                   shift_z=shift_z, n_bins=n_bins,
+                                   num_threads=num_threads,
+                                   max_n_bins=max_n_bins)
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
+@_forward_cupy
 def sum(image, footprint, out=None, mask=None,
-        shift_x=False, shift_y=False, shift_z=False):
+        shift_x=False, shift_y=False, shift_z=False, n_bins=None,
+        num_threads=None, max_n_bins=None):
     """Return the local sum of pixels.
 
     Note that the sum may overflow depending on the data type of the input
@@ -1014,8 +1890,10 @@ def sum(image, footprint, out=None, mask=None,
     ----------
     image : ([P,] M, N) ndarray (uint8, uint16)
         Input image.
-    footprint : ndarray
-        The neighborhood expressed as an ndarray of 1's and 0's.
+    footprint : ndarray, int or tuple of int
+        The neighborhood expressed as an ndarray of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along every
+        axis).
     out : ([P,] M, N) array (same dtype as input)
         If None, a new array is allocated.
     mask : ndarray (integer or float), optional
@@ -1024,6 +1902,23 @@ def sum(image, footprint, out=None, mask=None,
     shift_x, shift_y, shift_z : int
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before filtering, and intensity
+        outputs are mapped back to the input range, which trades accuracy for
+        speed on high bit-depth images. Default is None, which means no
+        quantization.
 
     Returns
     -------
@@ -1048,21 +1943,25 @@ def sum(image, footprint, out=None, mask=None,
 
     """
 
-    np_image = np.asanyarray(image)
-    if np_image.ndim == 2:
-        return _apply_scalar_per_pixel(generic_cy._sum, image, footprint,
-                                       out=out, mask=mask,
-                                       shift_x=shift_x, shift_y=shift_y)
-    else:
-        return _apply_scalar_per_pixel_3D(generic_cy._sum_3D, image,
-                                          footprint, out=out, mask=mask,
-                                          shift_x=shift_x, shift_y=shift_y,
-                                          shift_z=shift_z)
+    if (mask is None and n_bins is None and max_n_bins is None
+            and _is_rectangle(footprint)):
+        return _apply_rectangle_mean(generic_cy._sum, image, footprint,
+                                     out=out, shift_x=shift_x,
+                                     shift_y=shift_y, shift_z=shift_z)
+
+    return _apply_scalar_per_pixel(generic_cy._sum, image, footprint,
+                                   out=out, mask=mask,
+                                   shift_x=shift_x, shift_y=shift_y,
+                                   shift_z=shift_z, n_bins=n_bins,
+                                   num_threads=num_threads,
+                                   max_n_bins=max_n_bins)
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
 def threshold(image, footprint, out=None, mask=None,
-              shift_x=False, shift_y=False, shift_z=False):
+              shift_x=False, shift_y=False, shift_z=False, n_bins=None,
+              num_threads=None, max_n_bins=None):
     """Local threshold of an image.
 
     The resulting binary mask is True if the gray value of the center pixel is
@@ -1072,8 +1971,10 @@ def threshold(image, footprint, out=None, mask=None,
     ----------
     image : ([P,] M, N) ndarray (uint8, uint16)
         Input image.
-    footprint : ndarray
-        The neighborhood expressed as an ndarray of 1's and 0's.
+    footprint : ndarray, int or tuple of int
+        The neighborhood expressed as an ndarray of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along every
+        axis).
     out : ([P,] M, N) array (same dtype as input)
         If None, a new array is allocated.
     mask : ndarray (integer or float), optional
@@ -1082,6 +1983,23 @@ def threshold(image, footprint, out=None, mask=None,
     shift_x, shift_y, shift_z : int
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before filtering, and intensity
+        outputs are mapped back to the input range, which trades accuracy for
+        speed on high bit-depth images. Default is None, which means no
+        quantization.
 
     Returns
     -------
@@ -1106,29 +2024,35 @@ def threshold(image, footprint, out=None, mask=None,
 
     """
 
-    np_image = np.asanyarray(image)
-    if np_image.ndim == 2:
-        return _apply_scalar_per_pixel(generic_cy._threshold, image, footprint,
-                                       out=out, mask=mask,
-                                       shift_x=shift_x, shift_y=shift_y)
-    else:
-        return _apply_scalar_per_pixel_3D(generic_cy._threshold_3D, image,
-                                          footprint, out=out, mask=mask,
-                                          shift_x=shift_x, shift_y=shift_y,
-                                          shift_z=shift_z)
+    if (mask is None and n_bins is None and max_n_bins is None
+            and _is_rectangle(footprint)):
+        return _apply_rectangle_mean(generic_cy._threshold, image, footprint,
+                                     out=out, shift_x=shift_x,
+                                     shift_y=shift_y, shift_z=shift_z)
+
+    return _apply_scalar_per_pixel(generic_cy._threshold, image, footprint,
+                                   out=out, mask=mask,
+                                   shift_x=shift_x, shift_y=shift_y,
+                                   shift_z=shift_z, n_bins=n_bins,
+                                   num_threads=num_threads,
+                                   max_n_bins=max_n_bins)
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
 def noise_filter(image, footprint, out=None, mask=None,
-                 shift_x=False, shift_y=False, shift_z=False):
+                 shift_x=False, shift_y=False, shift_z=False, n_bins=None,
+                 num_threads=None, max_n_bins=None):
     """Noise feature.
 
     Parameters
     ----------
     image : ([P,] M, N) ndarray (uint8, uint16)
         Input image.
-    footprint : ndarray
-        The neighborhood expressed as an ndarray of 1's and 0's.
+    footprint : ndarray, int or tuple of int
+        The neighborhood expressed as an ndarray of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along every
+        axis).
     out : ([P,] M, N) array (same dtype as input)
         If None, a new array is allocated.
     mask : ndarray (integer or float), optional
@@ -1137,6 +2061,23 @@ def noise_filter(image, footprint, out=None, mask=None,
     shift_x, shift_y, shift_z : int
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before filtering, and intensity
+        outputs are mapped back to the input range, which trades accuracy for
+        speed on high bit-depth images. Default is None, which means no
+        quantization.
 
     References
     ----------
@@ -1162,36 +2103,34 @@ def noise_filter(image, footprint, out=None, mask=None,
 
     """
 
-    np_image = np.asanyarray(image)
-    if np_image.ndim == 2:
-        # ensure that the central pixel in the footprint is empty
-        centre_r = int(footprint.shape[0] / 2) + shift_y
-        centre_c = int(footprint.shape[1] / 2) + shift_x
-        # make a local copy
-        footprint_cpy = footprint.copy()
-        footprint_cpy[centre_r, centre_c] = 0
-
-        return _apply_scalar_per_pixel(generic_cy._noise_filter, image,
-                                       footprint_cpy, out=out, mask=mask,
-                                       shift_x=shift_x, shift_y=shift_y)
+    # ensure that the central pixel in the footprint is empty, the shifts
+    # being ordered as the footprint axes (see `_to_3D`)
+    if footprint.ndim == 2:
+        shifts = (shift_y, shift_x)
     else:
-        # ensure that the central pixel in the footprint is empty
-        centre_r = int(footprint.shape[0] / 2) + shift_y
-        centre_c = int(footprint.shape[1] / 2) + shift_x
-        centre_z = int(footprint.shape[2] / 2) + shift_z
-        # make a local copy
-        footprint_cpy = footprint.copy()
-        footprint_cpy[centre_r, centre_c, centre_z] = 0
-
-        return _apply_scalar_per_pixel_3D(generic_cy._noise_filter_3D,
-                                          image, footprint_cpy, out=out,
-                                          mask=mask, shift_x=shift_x,
-                                          shift_y=shift_y, shift_z=shift_z)
+        shifts = (shift_x, shift_y, shift_z)
+    centre = tuple(int(s / 2) + shift
+                   for s, shift in zip(footprint.shape, shifts))
+    # the footprint of the caller is left untouched, it may be shared with
+    # other threads or be read-only, a copy is thus only made if its center
+    # is set
+    if footprint[centre]:
+        footprint = footprint.copy()
+        footprint[centre] = 0
+
+    return _apply_scalar_per_pixel(generic_cy._noise_filter, image,
+                                   footprint, out=out, mask=mask,
+                                   shift_x=shift_x, shift_y=shift_y,
+                                   shift_z=shift_z, n_bins=n_bins,
+                                   num_threads=num_threads,
+                                   max_n_bins=max_n_bins)
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
 def entropy(image, footprint, out=None, mask=None,
-            shift_x=False, shift_y=False, shift_z=False):
+            shift_x=False, shift_y=False, shift_z=False, n_bins=None,
+            num_threads=None, max_n_bins=None):
     """Local entropy.
 
     The entropy is computed using base 2 logarithm i.e. the filter returns the
@@ -1202,8 +2141,10 @@ def entropy(image, footprint, out=None, mask=None,
     ----------
     image : ([P,] M, N) ndarray (uint8, uint16)
         Input image.
-    footprint : ndarray
-        The neighborhood expressed as an ndarray of 1's and 0's.
+    footprint : ndarray, int or tuple of int
+        The neighborhood expressed as an ndarray of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along every
+        axis).
     out : ([P,] M, N) array (same dtype as input)
         If None, a new array is allocated.
     mask : ndarray (integer or float), optional
@@ -1212,6 +2153,23 @@ def entropy(image, footprint, out=None, mask=None,
     shift_x, shift_y, shift_z : int
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before filtering, and intensity
+        outputs are mapped back to the input range, which trades accuracy for
+        speed on high bit-depth images. Default is None, which means no
+        quantization.
 
     Returns
     -------
@@ -1236,30 +2194,29 @@ def entropy(image, footprint, out=None, mask=None,
 
     """
 
-    np_image = np.asanyarray(image)
-    if np_image.ndim == 2:
-        return _apply_scalar_per_pixel(generic_cy._entropy, image, footprint,
-                                       out=out, mask=mask,
-                                       shift_x=shift_x, shift_y=shift_y,
-                                       out_dtype=np.double)
-    else:
-        return _apply_scalar_per_pixel_3D(generic_cy._entropy_3D, image,
-                                          footprint, out=out, mask=mask,
-                                          shift_x=shift_x, shift_y=shift_y,
-                                          shift_z=shift_z, out_dtype=np.double)
+    return _apply_scalar_per_pixel(generic_cy._entropy, image, footprint,
+                                   out=out, mask=mask,
+                                   shift_x=shift_x, shift_y=shift_y,
+                                   shift_z=shift_z, out_dtype=np.double,
+                                   n_bins=n_bins, num_threads=num_threads,
+                                   max_n_bins=max_n_bins)
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
 def otsu(image, footprint, out=None, mask=None,
-         shift_x=False, shift_y=False, shift_z=False):
+         shift_x=False, shift_y=False, shift_z=False, n_bins=None,
+         num_threads=None, max_n_bins=None):
     """Local Otsu's threshold value for each pixel.
 
     Parameters
     ----------
     image : ([P,] M, N) ndarray (uint8, uint16)
         Input image.
-    footprint : ndarray
-        The neighborhood expressed as an ndarray of 1's and 0's.
+    footprint : ndarray, int or tuple of int
+        The neighborhood expressed as an ndarray of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along every
+        axis).
     out : ([P,] M, N) array (same dtype as input)
         If None, a new array is allocated.
     mask : ndarray (integer or float), optional
@@ -1268,6 +2225,23 @@ def otsu(image, footprint, out=None, mask=None,
     shift_x, shift_y, shift_z : int
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before filtering, and intensity
+        outputs are mapped back to the input range, which trades accuracy for
+        speed on high bit-depth images. Default is None, which means no
+        quantization.
 
     Returns
     -------
@@ -1294,29 +2268,29 @@ def otsu(image, footprint, out=None, mask=None,
 
     """
 
-    np_image = np.asanyarray(image)
-    if np_image.ndim == 2:
-        return _apply_scalar_per_pixel(generic_cy._otsu, image, footprint,
-                                       out=out, mask=mask,
-                                       shift_x=shift_x, shift_y=shift_y)
-    else:
-        return _apply_scalar_per_pixel_3D(generic_cy._otsu_3D, image,
-                                          footprint, out=out, mask=mask,
-                                          shift_x=shift_x, shift_y=shift_y,
-                                          shift_z=shift_z)
+    return _apply_scalar_per_pixel(generic_cy._otsu, image, footprint,
+                                   out=out, mask=mask,
+                                   shift_x=shift_x, shift_y=shift_y,
+                                   shift_z=shift_z, n_bins=n_bins,
+                                   num_threads=num_threads,
+                                   max_n_bins=max_n_bins)
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
 def windowed_histogram(image, footprint, out=None, mask=None,
-                       shift_x=False, shift_y=False, n_bins=None):
+                       shift_x=False, shift_y=False, n_bins=None,
+                       num_threads=None, max_n_bins=None):
     """Normalized sliding window histogram
 
     Parameters
     ----------
     image : 2-D array (integer or float)
         Input image.
-    footprint : 2-D array (integer or float)
-        The neighborhood expressed as a 2-D array of 1's and 0's.
+    footprint : 2-D array (integer or float), int or tuple of int
+        The neighborhood expressed as a 2-D array of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along both
+        axes).
     out : 2-D array (integer or float), optional
         If None, a new array is allocated.
     mask : ndarray (integer or float), optional
@@ -1326,18 +2300,32 @@ def windowed_histogram(image, footprint, out=None, mask=None,
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
     n_bins : int or None
-        The number of histogram bins. Will default to ``image.max() + 1``
-        if None is passed.
+        The number of histogram bins. If None (default), it is the length of
+        the last axis of `out` if given, otherwise 256 for 8-bit images and
+        ``image.max() + 1`` for 16-bit images, which are only scanned for
+        their maximum in this case. An 8 or 16-bit image with values beyond
+        the last axis of `out` raises a ValueError, while the values beyond
+        a supplied `n_bins`, or those of other images beyond the last axis of
+        `out` once converted to 8 bits, are left out of the histograms.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before computing the histograms,
+        which then have `max_n_bins` bins. Default is None, which means no
+        quantization.
 
     Returns
     -------
     out : 3-D array (float)
         Array of dimensions (H,W,N), where (H,W) are the dimensions of the
-        input image and N is n_bins or ``image.max() + 1`` if no value is
-        provided as a parameter. Effectively, each pixel is a N-D feature
-        vector that is the histogram. The sum of the elements in the feature
-        vector will be 1, unless no pixels in the window were covered by both
-        footprint and mask, in which case all elements will be 0.
+        input image and N is the number of bins (`max_n_bins` if the image is
+        quantized). Effectively, each pixel is a N-D feature vector that is
+        the histogram. The sum of the elements in the feature vector will be
+        1, unless no pixels in the window were covered by both footprint and
+        mask, in which case all elements will be 0.
 
     Examples
     --------
@@ -1352,19 +2340,46 @@ def windowed_histogram(image, footprint, out=None, mask=None,
 
     """
 
+    if max_n_bins is not None:
+        quantized, quantized_n_bins, scale = _quantize(image, n_bins,
+                                                       max_n_bins)
+        if scale is not None:
+            image, n_bins = quantized, quantized_n_bins
+
     if n_bins is None:
-        n_bins = int(image.max()) + 1
+        if np.ndim(out) == 3:
+            # the histograms fill the given output; the image is scanned for
+            # its maximum only if the output cannot hold its whole dtype range
+            n_bins = out.shape[-1]
+            dtype = np.asarray(image).dtype
+            if (dtype in (np.uint8, np.uint16)
+                    and n_bins <= np.iinfo(dtype).max
+                    and np.asarray(image).max(initial=0) >= n_bins):
+                raise ValueError(
+                    f'The last axis of out ({n_bins}) is too short to hold '
+                    f'the histograms of the image values, up to '
+                    f'{np.asarray(image).max()}.'
+                )
+        elif np.asarray(image).dtype == np.uint16:
+            n_bins = int(image.max()) + 1
+        else:
+            # the other images are filtered as 8-bit ones, the bounds of
+            # their dtype saving a scan of the image
+            n_bins = 256
 
     return _apply_vector_per_pixel(generic_cy._windowed_hist, image, footprint,
                                    out=out, mask=mask,
                                    shift_x=shift_x, shift_y=shift_y,
                                    out_dtype=np.double,
-                                   pixel_size=n_bins)
+                                   pixel_size=n_bins, n_bins=n_bins,
+                                   num_threads=num_threads)
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
+@_footprint_from_shape
 def majority(image, footprint, *, out=None, mask=None,
-             shift_x=False, shift_y=False, shift_z=False):
+             shift_x=False, shift_y=False, shift_z=False, n_bins=None,
+             num_threads=None, max_n_bins=None):
     """Majority filter assign to each pixel the most occuring value within
     its neighborhood.
 
@@ -1372,8 +2387,10 @@ def majority(image, footprint, *, out=None, mask=None,
     ----------
     image : ndarray
         Image array (uint8, uint16 array).
-    footprint : 2-D array (integer or float)
-        The neighborhood expressed as a 2-D array of 1's and 0's.
+    footprint : 2-D array (integer or float), int or tuple of int
+        The neighborhood expressed as a 2-D array of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along both
+        axes).
     out : ndarray (integer or float), optional
         If None, a new array will be allocated.
     mask : ndarray (integer or float), optional
@@ -1382,6 +2399,23 @@ def majority(image, footprint, *, out=None, mask=None,
     shift_x, shift_y : int, optional
         Offset added to the footprint center point. Shift is bounded to the
         footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+    max_n_bins : int, optional
+        Maximum number of histogram bins. A uint16 image needing more bins is
+        quantized into `max_n_bins` levels before filtering, and intensity
+        outputs are mapped back to the input range, which trades accuracy for
+        speed on high bit-depth images. Default is None, which means no
+        quantization.
 
     Returns
     -------
@@ -1402,13 +2436,110 @@ def majority(image, footprint, *, out=None, mask=None,
 
     """
 
-    np_image = np.asanyarray(image)
-    if np_image.ndim == 2:
-        return _apply_scalar_per_pixel(generic_cy._majority, image,
-                                       footprint, out=out, mask=mask,
-                                       shift_x=shift_x, shift_y=shift_y)
-    else:
-        return _apply_scalar_per_pixel_3D(generic_cy._majority_3D,
-                                          image, footprint, out=out, mask=mask,
-                                          shift_x=shift_x, shift_y=shift_y,
-                                          shift_z=shift_z)
+    return _apply_scalar_per_pixel(generic_cy._majority, image, footprint,
+                                   out=out, mask=mask,
+                                   shift_x=shift_x, shift_y=shift_y,
+                                   shift_z=shift_z, n_bins=n_bins,
+                                   num_threads=num_threads,
+                                   max_n_bins=max_n_bins)
+
+
+@_footprint_from_shape
+def multi(image, footprint, reducers, mask=None, shift_x=False,
+          shift_y=False, shift_z=False, n_bins=None, num_threads=None):
+    """Apply several rank filters with a single scan of the image.
+
+    The local histogram is built once per pixel and all the requested
+    reductions are computed from it, instead of scanning the image once per
+    filter.
+
+    Parameters
+    ----------
+    image : ([P,] M, N) ndarray (uint8, uint16)
+        Input image.
+    footprint : ndarray, int or tuple of int
+        The neighborhood expressed as an ndarray of 1's and 0's, or the shape
+        of a rectangular neighborhood (an int being its size along every
+        axis).
+    reducers : sequence of str
+        Names of the filters to apply, among ``'autolevel'``,
+        ``'equalize'``, ``'gradient'``, ``'maximum'``, ``'mean'``,
+        ``'geometric_mean'``, ``'subtract_mean'``, ``'median'``,
+        ``'minimum'``, ``'modal'``, ``'enhance_contrast'``, ``'pop'``,
+        ``'sum'``, ``'threshold'``, ``'entropy'``, ``'otsu'`` and
+        ``'majority'``, or ``'histogram'`` for the normalized local
+        histogram returned by `windowed_histogram`.
+    mask : ndarray (integer or float), optional
+        Mask array that defines (>0) area of the image included in the local
+        neighborhood. If None, the complete image is used (default).
+    shift_x, shift_y, shift_z : int
+        Offset added to the footprint center point. Shift is bounded to the
+        footprint sizes (center must be inside the given footprint).
+    n_bins : int, optional
+        Number of histogram bins, all the image values being lower than
+        `n_bins`. Default is None, which means 256 bins for uint8 images and
+        ``max(3, image.max()) + 1`` bins for uint16 images, at the cost of a
+        full scan of the image. A supplied value is not checked: larger image
+        values are left out of the bins the filters read, those finding no
+        value in their bins returning 0.
+    num_threads : int, optional
+        The maximum number of threads to use. If None (default), use the
+        OpenMP default value, typically equal to the maximum number of
+        virtual cores, or a single thread for images smaller than 256x256.
+
+    Returns
+    -------
+    out : dict of str to ndarray
+        Output of each filter of `reducers`, with the dtype of the input
+        image, except for ``'entropy'`` and ``'histogram'`` (float). The
+        histograms have an additional last axis of length `n_bins`.
+
+    Examples
+    --------
+    >>> from skimage import data
+    >>> from skimage.morphology import disk
+    >>> from skimage.filters.rank import multi
+    >>> img = data.camera()
+    >>> out = multi(img, disk(5), ['mean', 'entropy', 'otsu'])
+    >>> sorted(out)
+    ['entropy', 'mean', 'otsu']
+
+    """
+    reducers = list(dict.fromkeys(reducers))
+    unknown = set(reducers) - set(generic_cy.MULTI_REDUCERS)
+    if unknown:
+        raise ValueError(f'Unknown reducers {sorted(unknown)}, expected some '
+                         f'of {generic_cy.MULTI_REDUCERS}.')
+    if not reducers:
+        raise ValueError('At least one reducer is required.')
+
+    image, footprint, _, mask, n_bins = _preprocess_input(image, footprint,
+                                                          None, mask,
+                                                          n_bins=n_bins,
+                                                          strided=True)
+    num_threads = _default_num_threads(image, num_threads)
+
+    # the reductions are written in the order of their bit, the histogram
+    # taking the last `n_bins` values of each pixel
+    ordered = [name for name in generic_cy.MULTI_REDUCERS
+               if name in reducers]
+    depth = len(ordered) - 1 + n_bins if 'histogram' in reducers \
+        else len(ordered)
+    out = np.empty(image.shape + (depth,), dtype=np.double)
+    bits = 0
+    for name in ordered:
+        bits |= 1 << generic_cy.MULTI_REDUCERS.index(name)
+    generic_cy._multi(*_to_3D(image, footprint, out, mask, shift_x, shift_y,
+                              shift_z),
+                      n_bins=n_bins, reducers=bits, num_threads=num_threads)
+
+    results = {}
+    for k, name in enumerate(ordered):
+        if name == 'histogram':
+            results[name] = out[..., k:]
+        elif name == 'entropy':
+            results[name] = out[..., k]
+        else:
+            # same conversion as the kernels writing to an integer output
+            results[name] = out[..., k].astype(np.int64).astype(image.dtype)
+    return {name: results[name] for name in reducers}
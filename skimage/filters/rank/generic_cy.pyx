@@ -5,23 +5,25 @@
 
 cimport numpy as cnp
 from libc.math cimport log, exp
+from libc.stdlib cimport malloc, free
 
-from .core_cy cimport dtype_t, dtype_t_out, _core
-
-from .core_cy_3d cimport _core_3D
+from .core_cy_3d cimport (dtype_t, dtype_t_out, _core_3D, _histo_size,
+                          COARSE_SHIFT)
 
 from ..._shared.interpolation cimport round
 
 cnp.import_array()
 
 cdef inline void _kernel_autolevel(dtype_t_out* out, Py_ssize_t odepth,
-                                   Py_ssize_t[::1] histo,
+                                   Py_ssize_t* histo,
                                    double pop, dtype_t g,
                                    Py_ssize_t n_bins, Py_ssize_t mid_bin,
                                    double p0, double p1,
-                                   Py_ssize_t s0, Py_ssize_t s1) nogil:
+                                   Py_ssize_t s0, Py_ssize_t s1,
+                                   const double* lut) nogil:
 
-    cdef Py_ssize_t i, imin, imax, delta
+    # the extreme bins stay 0 if no value is below `n_bins`
+    cdef Py_ssize_t i, imin = 0, imax = 0, delta
 
     if pop:
         for i in range(n_bins - 1, -1, -1):
@@ -42,11 +44,12 @@ cdef inline void _kernel_autolevel(dtype_t_out* out, Py_ssize_t odepth,
 
 
 cdef inline void _kernel_equalize(dtype_t_out* out, Py_ssize_t odepth,
-                                  Py_ssize_t[::1] histo,
+                                  Py_ssize_t* histo,
                                   double pop, dtype_t g,
                                   Py_ssize_t n_bins, Py_ssize_t mid_bin,
                                   double p0, double p1,
-                                  Py_ssize_t s0, Py_ssize_t s1) nogil:
+                                  Py_ssize_t s0, Py_ssize_t s1,
+                                  const double* lut) nogil:
 
     cdef Py_ssize_t i
     cdef Py_ssize_t sum = 0
@@ -62,13 +65,15 @@ cdef inline void _kernel_equalize(dtype_t_out* out, Py_ssize_t odepth,
 
 
 cdef inline void _kernel_gradient(dtype_t_out* out, Py_ssize_t odepth,
-                                  Py_ssize_t[::1] histo,
+                                  Py_ssize_t* histo,
                                   double pop, dtype_t g,
                                   Py_ssize_t n_bins, Py_ssize_t mid_bin,
                                   double p0, double p1,
-                                  Py_ssize_t s0, Py_ssize_t s1) nogil:
+                                  Py_ssize_t s0, Py_ssize_t s1,
+                                  const double* lut) nogil:
 
-    cdef Py_ssize_t i, imin, imax
+    # the extreme bins stay 0 if no value is below `n_bins`
+    cdef Py_ssize_t i, imin = 0, imax = 0
 
     if pop:
         for i in range(n_bins - 1, -1, -1):
@@ -85,11 +90,12 @@ cdef inline void _kernel_gradient(dtype_t_out* out, Py_ssize_t odepth,
 
 
 cdef inline void _kernel_maximum(dtype_t_out* out, Py_ssize_t odepth,
-                                 Py_ssize_t[::1] histo,
+                                 Py_ssize_t* histo,
                                  double pop, dtype_t g,
                                  Py_ssize_t n_bins, Py_ssize_t mid_bin,
                                  double p0, double p1,
-                                 Py_ssize_t s0, Py_ssize_t s1) nogil:
+                                 Py_ssize_t s0, Py_ssize_t s1,
+                                 const double* lut) nogil:
 
     cdef Py_ssize_t i
 
@@ -98,16 +104,17 @@ cdef inline void _kernel_maximum(dtype_t_out* out, Py_ssize_t odepth,
             if histo[i]:
                 out[0] = <dtype_t_out>i
                 return
-    else:
-        out[0] = <dtype_t_out>0
+    # no value below `n_bins`
+    out[0] = <dtype_t_out>0
 
 
 cdef inline void _kernel_mean(dtype_t_out* out, Py_ssize_t odepth,
-                              Py_ssize_t[::1] histo,
+                              Py_ssize_t* histo,
                               double pop, dtype_t g,
                               Py_ssize_t n_bins, Py_ssize_t mid_bin,
                               double p0, double p1,
-                              Py_ssize_t s0, Py_ssize_t s1) nogil:
+                              Py_ssize_t s0, Py_ssize_t s1,
+                              const double* lut) nogil:
 
     cdef Py_ssize_t i
     cdef Py_ssize_t mean = 0
@@ -121,11 +128,12 @@ cdef inline void _kernel_mean(dtype_t_out* out, Py_ssize_t odepth,
 
 
 cdef inline void _kernel_geometric_mean(dtype_t_out* out, Py_ssize_t odepth,
-                                        Py_ssize_t[::1] histo,
+                                        Py_ssize_t* histo,
                                         double pop, dtype_t g,
                                         Py_ssize_t n_bins, Py_ssize_t mid_bin,
                                         double p0, double p1,
-                                        Py_ssize_t s0, Py_ssize_t s1) nogil:
+                                        Py_ssize_t s0, Py_ssize_t s1,
+                                        const double* lut) nogil:
 
     cdef Py_ssize_t i
     cdef double mean = 0.
@@ -140,11 +148,12 @@ cdef inline void _kernel_geometric_mean(dtype_t_out* out, Py_ssize_t odepth,
 
 
 cdef inline void _kernel_subtract_mean(dtype_t_out* out, Py_ssize_t odepth,
-                                       Py_ssize_t[::1] histo,
+                                       Py_ssize_t* histo,
                                        double pop, dtype_t g,
                                        Py_ssize_t n_bins, Py_ssize_t mid_bin,
                                        double p0, double p1,
-                                       Py_ssize_t s0, Py_ssize_t s1) nogil:
+                                       Py_ssize_t s0, Py_ssize_t s1,
+                                       const double* lut) nogil:
 
     cdef Py_ssize_t i
     cdef Py_ssize_t mean = 0
@@ -158,32 +167,41 @@ cdef inline void _kernel_subtract_mean(dtype_t_out* out, Py_ssize_t odepth,
 
 
 cdef inline void _kernel_median(dtype_t_out* out, Py_ssize_t odepth,
-                                Py_ssize_t[::1] histo,
+                                Py_ssize_t* histo,
                                 double pop, dtype_t g,
                                 Py_ssize_t n_bins, Py_ssize_t mid_bin,
                                 double p0, double p1,
-                                Py_ssize_t s0, Py_ssize_t s1) nogil:
+                                Py_ssize_t s0, Py_ssize_t s1,
+                                const double* lut) nogil:
 
-    cdef Py_ssize_t i
+    cdef Py_ssize_t i, k
     cdef double sum = pop / 2.0
+    # coarse histogram, maintained by the core (see `_median`)
+    cdef Py_ssize_t* coarse = histo + _histo_size(n_bins, odepth, g)
 
     if pop:
-        for i in range(n_bins):
+        # find the block of bins holding the median, then the median bin
+        k = 0
+        while coarse[k] <= sum:
+            sum -= coarse[k]
+            k += 1
+        for i in range(k << COARSE_SHIFT, n_bins):
             if histo[i]:
                 sum -= histo[i]
                 if sum < 0:
                     out[0] = <dtype_t_out>i
                     return
-    else:
-        out[0] = <dtype_t_out>0
+    # no median below `n_bins`
+    out[0] = <dtype_t_out>0
 
 
 cdef inline void _kernel_minimum(dtype_t_out* out, Py_ssize_t odepth,
-                                 Py_ssize_t[::1] histo,
+                                 Py_ssize_t* histo,
                                  double pop, dtype_t g,
                                  Py_ssize_t n_bins, Py_ssize_t mid_bin,
                                  double p0, double p1,
-                                 Py_ssize_t s0, Py_ssize_t s1) nogil:
+                                 Py_ssize_t s0, Py_ssize_t s1,
+                                 const double* lut) nogil:
 
     cdef Py_ssize_t i
 
@@ -192,16 +210,17 @@ cdef inline void _kernel_minimum(dtype_t_out* out, Py_ssize_t odepth,
             if histo[i]:
                 out[0] = <dtype_t_out>i
                 return
-    else:
-        out[0] = <dtype_t_out>0
+    # no value below `n_bins`
+    out[0] = <dtype_t_out>0
 
 
 cdef inline void _kernel_modal(dtype_t_out* out, Py_ssize_t odepth,
-                               Py_ssize_t[::1] histo,
+                               Py_ssize_t* histo,
                                double pop, dtype_t g,
                                Py_ssize_t n_bins, Py_ssize_t mid_bin,
                                double p0, double p1,
-                               Py_ssize_t s0, Py_ssize_t s1) nogil:
+                               Py_ssize_t s0, Py_ssize_t s1,
+                               const double* lut) nogil:
 
     cdef Py_ssize_t hmax = 0, imax = 0
 
@@ -217,15 +236,17 @@ cdef inline void _kernel_modal(dtype_t_out* out, Py_ssize_t odepth,
 
 cdef inline void _kernel_enhance_contrast(dtype_t_out* out,
                                           Py_ssize_t odepth,
-                                          Py_ssize_t[::1] histo,
+                                          Py_ssize_t* histo,
                                           double pop,
                                           dtype_t g,
                                           Py_ssize_t n_bins,
                                           Py_ssize_t mid_bin, double p0,
                                           double p1, Py_ssize_t s0,
-                                          Py_ssize_t s1) nogil:
+                                          Py_ssize_t s1,
+                                          const double* lut) nogil:
 
-    cdef Py_ssize_t i, imin, imax
+    # the extreme bins stay 0 if no value is below `n_bins`
+    cdef Py_ssize_t i, imin = 0, imax = 0
 
     if pop:
         for i in range(n_bins - 1, -1, -1):
@@ -245,21 +266,23 @@ cdef inline void _kernel_enhance_contrast(dtype_t_out* out,
 
 
 cdef inline void _kernel_pop(dtype_t_out* out, Py_ssize_t odepth,
-                             Py_ssize_t[::1] histo,
+                             Py_ssize_t* histo,
                              double pop, dtype_t g,
                              Py_ssize_t n_bins, Py_ssize_t mid_bin,
                              double p0, double p1,
-                             Py_ssize_t s0, Py_ssize_t s1) nogil:
+                             Py_ssize_t s0, Py_ssize_t s1,
+                             const double* lut) nogil:
 
     out[0] = <dtype_t_out>pop
 
 
 cdef inline void _kernel_sum(dtype_t_out* out, Py_ssize_t odepth,
-                             Py_ssize_t[::1] histo,
+                             Py_ssize_t* histo,
                              double pop, dtype_t g,
                              Py_ssize_t n_bins, Py_ssize_t mid_bin,
                              double p0, double p1,
-                             Py_ssize_t s0, Py_ssize_t s1) nogil:
+                             Py_ssize_t s0, Py_ssize_t s1,
+                             const double* lut) nogil:
 
     cdef Py_ssize_t i
     cdef Py_ssize_t sum = 0
@@ -273,11 +296,12 @@ cdef inline void _kernel_sum(dtype_t_out* out, Py_ssize_t odepth,
 
 
 cdef inline void _kernel_threshold(dtype_t_out* out, Py_ssize_t odepth,
-                                   Py_ssize_t[::1] histo,
+                                   Py_ssize_t* histo,
                                    double pop, dtype_t g,
                                    Py_ssize_t n_bins, Py_ssize_t mid_bin,
                                    double p0, double p1,
-                                   Py_ssize_t s0, Py_ssize_t s1) nogil:
+                                   Py_ssize_t s0, Py_ssize_t s1,
+                                   const double* lut) nogil:
 
     cdef Py_ssize_t i
     cdef Py_ssize_t mean = 0
@@ -291,11 +315,12 @@ cdef inline void _kernel_threshold(dtype_t_out* out, Py_ssize_t odepth,
 
 
 cdef inline void _kernel_noise_filter(dtype_t_out* out, Py_ssize_t odepth,
-                                      Py_ssize_t[::1] histo,
+                                      Py_ssize_t* histo,
                                       double pop, dtype_t g,
                                       Py_ssize_t n_bins, Py_ssize_t mid_bin,
                                       double p0, double p1,
-                                      Py_ssize_t s0, Py_ssize_t s1) nogil:
+                                      Py_ssize_t s0, Py_ssize_t s1,
+                                      const double* lut) nogil:
 
     cdef Py_ssize_t i
     cdef Py_ssize_t min_i
@@ -319,31 +344,39 @@ cdef inline void _kernel_noise_filter(dtype_t_out* out, Py_ssize_t odepth,
 
 
 cdef inline void _kernel_entropy(dtype_t_out* out, Py_ssize_t odepth,
-                                 Py_ssize_t[::1] histo,
+                                 Py_ssize_t* histo,
                                  double pop, dtype_t g,
                                  Py_ssize_t n_bins, Py_ssize_t mid_bin,
                                  double p0, double p1,
-                                 Py_ssize_t s0, Py_ssize_t s1) nogil:
+                                 Py_ssize_t s0, Py_ssize_t s1,
+                                 const double* lut) nogil:
     cdef Py_ssize_t i
     cdef double e, p
 
     if pop:
         e = 0.
-        for i in range(n_bins):
-            p = histo[i] / pop
-            if p > 0:
-                e -= p * log(p) / 0.6931471805599453
+        if lut is not NULL and pop == s1:
+            # terms of the full neighborhoods, of `s1` pixels, looked up in
+            # `lut` (see `_entropy`)
+            for i in range(n_bins):
+                e -= lut[histo[i]]
+        else:
+            for i in range(n_bins):
+                p = histo[i] / pop
+                if p > 0:
+                    e -= p * log(p) / 0.6931471805599453
         out[0] = <dtype_t_out>e
     else:
         out[0] = <dtype_t_out>0
 
 
 cdef inline void _kernel_otsu(dtype_t_out* out, Py_ssize_t odepth,
-                              Py_ssize_t[::1] histo,
+                              Py_ssize_t* histo,
                               double pop, dtype_t g,
                               Py_ssize_t n_bins, Py_ssize_t mid_bin,
                               double p0, double p1,
-                              Py_ssize_t s0, Py_ssize_t s1) nogil:
+                              Py_ssize_t s0, Py_ssize_t s1,
+                              const double* lut) nogil:
     cdef Py_ssize_t i
     cdef Py_ssize_t max_i
     cdef Py_ssize_t P, q1, mu1, mu2, mu = 0
@@ -385,11 +418,12 @@ cdef inline void _kernel_otsu(dtype_t_out* out, Py_ssize_t odepth,
 
 
 cdef inline void _kernel_win_hist(dtype_t_out* out, Py_ssize_t odepth,
-                                  Py_ssize_t[::1] histo,
+                                  Py_ssize_t* histo,
                                   double pop, dtype_t g,
                                   Py_ssize_t n_bins, Py_ssize_t mid_bin,
                                   double p0, double p1,
-                                  Py_ssize_t s0, Py_ssize_t s1) nogil:
+                                  Py_ssize_t s0, Py_ssize_t s1,
+                                  const double* lut) nogil:
     cdef Py_ssize_t i
     cdef Py_ssize_t max_i
     cdef double scale
@@ -403,11 +437,12 @@ cdef inline void _kernel_win_hist(dtype_t_out* out, Py_ssize_t odepth,
 
 
 cdef inline void _kernel_majority(dtype_t_out* out, Py_ssize_t odepth,
-                                  Py_ssize_t[::1] histo,
+                                  Py_ssize_t* histo,
                                   double pop, dtype_t g,
                                   Py_ssize_t n_bins, Py_ssize_t mid_bin,
                                   double p0, double p1,
-                                  Py_ssize_t s0, Py_ssize_t s1) nogil:
+                                  Py_ssize_t s0, Py_ssize_t s1,
+                                  const double* lut) nogil:
 
     cdef Py_ssize_t i
     cdef Py_ssize_t votes
@@ -423,389 +458,371 @@ cdef inline void _kernel_majority(dtype_t_out* out, Py_ssize_t odepth,
     out[0] = <dtype_t_out>(candidate)
 
 
-def _autolevel(dtype_t[:, ::1] image,
-               char[:, ::1] footprint,
-               char[:, ::1] mask,
-               dtype_t_out[:, :, ::1] out,
-               signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
+# reductions of `_multi`, each selected by the bit of its index; the last one
+# is the normalized histogram, which takes `n_bins` output values
+MULTI_REDUCERS = ('autolevel', 'equalize', 'gradient', 'maximum', 'mean',
+                  'geometric_mean', 'subtract_mean', 'median', 'minimum',
+                  'modal', 'enhance_contrast', 'pop', 'sum', 'threshold',
+                  'entropy', 'otsu', 'majority', 'histogram')
 
-    _core(_kernel_autolevel[dtype_t_out, dtype_t], image, footprint, mask, out,
-          shift_x, shift_y, 0, 0, 0, 0, n_bins)
 
+cdef inline void _kernel_multi(dtype_t_out* out, Py_ssize_t odepth,
+                               Py_ssize_t* histo,
+                               double pop, dtype_t g,
+                               Py_ssize_t n_bins, Py_ssize_t mid_bin,
+                               double p0, double p1,
+                               Py_ssize_t s0, Py_ssize_t s1,
+                               const double* lut) nogil:
 
-def _autolevel_3D(dtype_t[:, :, ::1] image,
-                  char[:, :, ::1] footprint,
-                  char[:, :, ::1] mask,
-                  dtype_t_out[:, :, :, ::1] out,
-                  signed char shift_x, signed char shift_y, signed char shift_z,
-                  Py_ssize_t n_bins):
+    # the reductions selected by `s0` are written in the order of
+    # `MULTI_REDUCERS`, all computed from the same histogram
+    cdef Py_ssize_t i
+    cdef Py_ssize_t k = 0
+    cdef double scale
 
-    _core_3D(_kernel_autolevel[dtype_t_out, dtype_t], image, footprint, mask,
-             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins)
+    if s0 & (1 << 0):
+        _kernel_autolevel(out + k, odepth, histo, pop, g, n_bins, mid_bin,
+                          p0, p1, 0, 0, NULL)
+        k += 1
+    if s0 & (1 << 1):
+        _kernel_equalize(out + k, odepth, histo, pop, g, n_bins, mid_bin,
+                         p0, p1, 0, 0, NULL)
+        k += 1
+    if s0 & (1 << 2):
+        _kernel_gradient(out + k, odepth, histo, pop, g, n_bins, mid_bin,
+                         p0, p1, 0, 0, NULL)
+        k += 1
+    if s0 & (1 << 3):
+        _kernel_maximum(out + k, odepth, histo, pop, g, n_bins, mid_bin,
+                        p0, p1, 0, 0, NULL)
+        k += 1
+    if s0 & (1 << 4):
+        _kernel_mean(out + k, odepth, histo, pop, g, n_bins, mid_bin,
+                     p0, p1, 0, 0, NULL)
+        k += 1
+    if s0 & (1 << 5):
+        _kernel_geometric_mean(out + k, odepth, histo, pop, g, n_bins, mid_bin,
+                               p0, p1, 0, 0, NULL)
+        k += 1
+    if s0 & (1 << 6):
+        _kernel_subtract_mean(out + k, odepth, histo, pop, g, n_bins, mid_bin,
+                              p0, p1, 0, 0, NULL)
+        k += 1
+    if s0 & (1 << 7):
+        _kernel_median(out + k, odepth, histo, pop, g, n_bins, mid_bin,
+                       p0, p1, 0, 0, NULL)
+        k += 1
+    if s0 & (1 << 8):
+        _kernel_minimum(out + k, odepth, histo, pop, g, n_bins, mid_bin,
+                        p0, p1, 0, 0, NULL)
+        k += 1
+    if s0 & (1 << 9):
+        _kernel_modal(out + k, odepth, histo, pop, g, n_bins, mid_bin,
+                      p0, p1, 0, 0, NULL)
+        k += 1
+    if s0 & (1 << 10):
+        _kernel_enhance_contrast(out + k, odepth, histo, pop, g, n_bins,
+                                 mid_bin, p0, p1, 0, 0, NULL)
+        k += 1
+    if s0 & (1 << 11):
+        _kernel_pop(out + k, odepth, histo, pop, g, n_bins, mid_bin,
+                    p0, p1, 0, 0, NULL)
+        k += 1
+    if s0 & (1 << 12):
+        _kernel_sum(out + k, odepth, histo, pop, g, n_bins, mid_bin,
+                    p0, p1, 0, 0, NULL)
+        k += 1
+    if s0 & (1 << 13):
+        _kernel_threshold(out + k, odepth, histo, pop, g, n_bins, mid_bin,
+                          p0, p1, 0, 0, NULL)
+        k += 1
+    if s0 & (1 << 14):
+        _kernel_entropy(out + k, odepth, histo, pop, g, n_bins, mid_bin,
+                        p0, p1, 0, 0, NULL)
+        k += 1
+    if s0 & (1 << 15):
+        _kernel_otsu(out + k, odepth, histo, pop, g, n_bins, mid_bin,
+                     p0, p1, 0, 0, NULL)
+        k += 1
+    if s0 & (1 << 16):
+        _kernel_majority(out + k, odepth, histo, pop, g, n_bins, mid_bin,
+                         p0, p1, 0, 0, NULL)
+        k += 1
+    if s0 & (1 << 17):
+        scale = 1.0 / pop if pop else 0
+        for i in range(n_bins):
+            out[k + i] = <dtype_t_out>(histo[i] * scale)
 
 
-def _equalize(dtype_t[:, ::1] image,
-              char[:, ::1] footprint,
-              char[:, ::1] mask,
-              dtype_t_out[:, :, ::1] out,
-              signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
+def _autolevel(dtype_t[:, :, :] image,
+               char[:, :, ::1] footprint,
+               char[::1] mask,
+               dtype_t_out[:, :, :, ::1] out,
+               signed char shift_x, signed char shift_y, signed char shift_z,
+               Py_ssize_t n_bins, int num_threads=0):
 
-    _core(_kernel_equalize[dtype_t_out, dtype_t], image, footprint, mask, out,
-          shift_x, shift_y, 0, 0, 0, 0, n_bins)
+    _core_3D(_kernel_autolevel[dtype_t_out, dtype_t], image, footprint, mask,
+             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins,
+             num_threads)
 
 
-def _equalize_3D(dtype_t[:, :, ::1] image,
-                 char[:, :, ::1] footprint,
-                 char[:, :, ::1] mask,
-                 dtype_t_out[:, :, :, ::1] out,
-                 signed char shift_x, signed char shift_y, signed char shift_z,
-                 Py_ssize_t n_bins):
+def _equalize(dtype_t[:, :, :] image,
+              char[:, :, ::1] footprint,
+              char[::1] mask,
+              dtype_t_out[:, :, :, ::1] out,
+              signed char shift_x, signed char shift_y, signed char shift_z,
+              Py_ssize_t n_bins, int num_threads=0):
 
     _core_3D(_kernel_equalize[dtype_t_out, dtype_t], image, footprint, mask,
-             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins)
-
-
-def _gradient(dtype_t[:, ::1] image,
-              char[:, ::1] footprint,
-              char[:, ::1] mask,
-              dtype_t_out[:, :, ::1] out,
-              signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
-
-    _core(_kernel_gradient[dtype_t_out, dtype_t], image, footprint, mask, out,
-          shift_x, shift_y, 0, 0, 0, 0, n_bins)
+             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins,
+             num_threads)
 
 
-def _gradient_3D(dtype_t[:, :, ::1] image,
-                 char[:, :, ::1] footprint,
-                 char[:, :, ::1] mask,
-                 dtype_t_out[:, :, :, ::1] out,
-                 signed char shift_x, signed char shift_y, signed char shift_z,
-                 Py_ssize_t n_bins):
+def _gradient(dtype_t[:, :, :] image,
+              char[:, :, ::1] footprint,
+              char[::1] mask,
+              dtype_t_out[:, :, :, ::1] out,
+              signed char shift_x, signed char shift_y, signed char shift_z,
+              Py_ssize_t n_bins, int num_threads=0):
 
     _core_3D(_kernel_gradient[dtype_t_out, dtype_t], image, footprint, mask,
-             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins)
-
+             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins,
+             num_threads)
 
-def _maximum(dtype_t[:, ::1] image,
-             char[:, ::1] footprint,
-             char[:, ::1] mask,
-             dtype_t_out[:, :, ::1] out,
-             signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
 
-    _core(_kernel_maximum[dtype_t_out, dtype_t], image, footprint, mask, out,
-          shift_x, shift_y, 0, 0, 0, 0, n_bins)
-
-
-def _maximum_3D(dtype_t[:, :, ::1] image,
-                char[:, :, ::1] footprint,
-                char[:, :, ::1] mask,
-                dtype_t_out[:, :, :, ::1] out,
-                signed char shift_x, signed char shift_y, signed char shift_z,
-                Py_ssize_t n_bins):
-
-    _core_3D(_kernel_maximum[dtype_t_out, dtype_t], image, footprint, mask,
-             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins)
-
-
-def _mean(dtype_t[:, ::1] image,
-          char[:, ::1] footprint,
-          char[:, ::1] mask,
-          dtype_t_out[:, :, ::1] out,
-          signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
-
-    _core(_kernel_mean[dtype_t_out, dtype_t], image, footprint, mask, out,
-          shift_x, shift_y, 0, 0, 0, 0, n_bins)
-
-
-def _mean_3D(dtype_t[:, :, ::1] image,
+def _maximum(dtype_t[:, :, :] image,
              char[:, :, ::1] footprint,
-             char[:, :, ::1] mask,
+             char[::1] mask,
              dtype_t_out[:, :, :, ::1] out,
              signed char shift_x, signed char shift_y, signed char shift_z,
-             Py_ssize_t n_bins):
+             Py_ssize_t n_bins, int num_threads=0):
 
-    _core_3D(_kernel_mean[dtype_t_out, dtype_t], image, footprint, mask, out,
-             shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins)
+    _core_3D(_kernel_maximum[dtype_t_out, dtype_t], image, footprint, mask,
+             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins,
+             num_threads)
 
 
-def _geometric_mean(dtype_t[:, ::1] image,
-                    char[:, ::1] footprint,
-                    char[:, ::1] mask,
-                    dtype_t_out[:, :, ::1] out,
-                    signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
+def _mean(dtype_t[:, :, :] image,
+          char[:, :, ::1] footprint,
+          char[::1] mask,
+          dtype_t_out[:, :, :, ::1] out,
+          signed char shift_x, signed char shift_y, signed char shift_z,
+          Py_ssize_t n_bins, int num_threads=0):
 
-    _core(_kernel_geometric_mean[dtype_t_out, dtype_t], image, footprint, mask,
-          out, shift_x, shift_y, 0, 0, 0, 0, n_bins)
+    _core_3D(_kernel_mean[dtype_t_out, dtype_t], image, footprint, mask,
+             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins,
+             num_threads)
 
 
-def _geometric_mean_3D(dtype_t[:, :, ::1] image,
-                       char[:, :, ::1] footprint,
-                       char[:, :, ::1] mask,
-                       dtype_t_out[:, :, :, ::1] out,
-                       signed char shift_x, signed char shift_y, signed char shift_z,
-                       Py_ssize_t n_bins):
+def _geometric_mean(dtype_t[:, :, :] image,
+                    char[:, :, ::1] footprint,
+                    char[::1] mask,
+                    dtype_t_out[:, :, :, ::1] out,
+                    signed char shift_x, signed char shift_y,
+                    signed char shift_z, Py_ssize_t n_bins,
+                    int num_threads=0):
 
     _core_3D(_kernel_geometric_mean[dtype_t_out, dtype_t], image, footprint,
-             mask, out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins)
-
+             mask, out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins,
+             num_threads)
 
-def _subtract_mean(dtype_t[:, ::1] image,
-                   char[:, ::1] footprint,
-                   char[:, ::1] mask,
-                   dtype_t_out[:, :, ::1] out,
-                   signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
 
-    _core(_kernel_subtract_mean[dtype_t_out, dtype_t], image, footprint, mask,
-          out, shift_x, shift_y, 0, 0, 0, 0, n_bins)
-
-
-def _subtract_mean_3D(dtype_t[:, :, ::1] image,
-                      char[:, :, ::1] footprint,
-                      char[:, :, ::1] mask,
-                      dtype_t_out[:, :, :, ::1] out,
-                      signed char shift_x, signed char shift_y, signed char shift_z,
-                      Py_ssize_t n_bins):
+def _subtract_mean(dtype_t[:, :, :] image,
+                   char[:, :, ::1] footprint,
+                   char[::1] mask,
+                   dtype_t_out[:, :, :, ::1] out,
+                   signed char shift_x, signed char shift_y,
+                   signed char shift_z, Py_ssize_t n_bins,
+                   int num_threads=0):
 
     _core_3D(_kernel_subtract_mean[dtype_t_out, dtype_t], image, footprint,
-             mask, out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins)
-
-
-def _median(dtype_t[:, ::1] image,
-            char[:, ::1] footprint,
-            char[:, ::1] mask,
-            dtype_t_out[:, :, ::1] out,
-            signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
-
-    _core(_kernel_median[dtype_t_out, dtype_t], image, footprint, mask, out,
-          shift_x, shift_y, 0, 0, 0, 0, n_bins)
+             mask, out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins,
+             num_threads)
 
 
-def _median_3D(dtype_t[:, :, ::1] image,
-               char[:, :, ::1] footprint,
-               char[:, :, ::1] mask,
-               dtype_t_out[:, :, :, ::1] out,
-               signed char shift_x, signed char shift_y, signed char shift_z,
-               Py_ssize_t n_bins):
-
-    _core_3D(_kernel_median[dtype_t_out, dtype_t], image, footprint, mask, out,
-             shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins)
-
-
-def _minimum(dtype_t[:, ::1] image,
-             char[:, ::1] footprint,
-             char[:, ::1] mask,
-             dtype_t_out[:, :, ::1] out,
-             signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
+def _median(dtype_t[:, :, :] image,
+            char[:, :, ::1] footprint,
+            char[::1] mask,
+            dtype_t_out[:, :, :, ::1] out,
+            signed char shift_x, signed char shift_y, signed char shift_z,
+            Py_ssize_t n_bins, int num_threads=0):
 
-    _core(_kernel_minimum[dtype_t_out, dtype_t], image, footprint, mask, out,
-          shift_x, shift_y, 0, 0, 0, 0, n_bins)
+    _core_3D(_kernel_median[dtype_t_out, dtype_t], image, footprint, mask,
+             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins,
+             num_threads, coarse_histo=True)
 
 
-def _minimum_3D(dtype_t[:, :, ::1] image,
-                char[:, :, ::1] footprint,
-                char[:, :, ::1] mask,
-                dtype_t_out[:, :, :, ::1] out,
-                signed char shift_x, signed char shift_y, signed char shift_z,
-                Py_ssize_t n_bins):
+def _minimum(dtype_t[:, :, :] image,
+             char[:, :, ::1] footprint,
+             char[::1] mask,
+             dtype_t_out[:, :, :, ::1] out,
+             signed char shift_x, signed char shift_y, signed char shift_z,
+             Py_ssize_t n_bins, int num_threads=0):
 
     _core_3D(_kernel_minimum[dtype_t_out, dtype_t], image, footprint, mask,
-             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins)
+             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins,
+             num_threads)
 
 
-def _enhance_contrast(dtype_t[:, ::1] image,
-                      char[:, ::1] footprint,
-                      char[:, ::1] mask,
-                      dtype_t_out[:, :, ::1] out,
-                      signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
+def _modal(dtype_t[:, :, :] image,
+           char[:, :, ::1] footprint,
+           char[::1] mask,
+           dtype_t_out[:, :, :, ::1] out,
+           signed char shift_x, signed char shift_y, signed char shift_z,
+           Py_ssize_t n_bins, int num_threads=0):
 
-    _core(_kernel_enhance_contrast[dtype_t_out, dtype_t], image, footprint, mask,
-          out, shift_x, shift_y, 0, 0, 0, 0, n_bins)
+    _core_3D(_kernel_modal[dtype_t_out, dtype_t], image, footprint, mask,
+             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins,
+             num_threads)
 
 
-def _enhance_contrast_3D(dtype_t[:, :, ::1] image,
-                         char[:, :, ::1] footprint,
-                         char[:, :, ::1] mask,
-                         dtype_t_out[:, :, :, ::1] out,
-                         signed char shift_x, signed char shift_y, signed char shift_z,
-                         Py_ssize_t n_bins):
+def _enhance_contrast(dtype_t[:, :, :] image,
+                      char[:, :, ::1] footprint,
+                      char[::1] mask,
+                      dtype_t_out[:, :, :, ::1] out,
+                      signed char shift_x, signed char shift_y,
+                      signed char shift_z, Py_ssize_t n_bins,
+                      int num_threads=0):
 
     _core_3D(_kernel_enhance_contrast[dtype_t_out, dtype_t], image, footprint,
-             mask, out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins)
+             mask, out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins,
+             num_threads)
 
 
-def _modal(dtype_t[:, ::1] image,
-           char[:, ::1] footprint,
-           char[:, ::1] mask,
-           dtype_t_out[:, :, ::1] out,
-           signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
+def _pop(dtype_t[:, :, :] image,
+         char[:, :, ::1] footprint,
+         char[::1] mask,
+         dtype_t_out[:, :, :, ::1] out,
+         signed char shift_x, signed char shift_y, signed char shift_z,
+         Py_ssize_t n_bins, int num_threads=0):
 
-    _core(_kernel_modal[dtype_t_out, dtype_t], image, footprint, mask, out,
-          shift_x, shift_y, 0, 0, 0, 0, n_bins)
+    _core_3D(_kernel_pop[dtype_t_out, dtype_t], image, footprint, mask,
+             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins,
+             num_threads)
 
 
-def _modal_3D(dtype_t[:, :, ::1] image,
-              char[:, :, ::1] footprint,
-              char[:, :, ::1] mask,
-              dtype_t_out[:, :, :, ::1] out,
-              signed char shift_x, signed char shift_y, signed char shift_z,
-              Py_ssize_t n_bins):
-
-    _core_3D(_kernel_modal[dtype_t_out, dtype_t], image, footprint, mask, out,
-             shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins)
-
+def _sum(dtype_t[:, :, :] image,
+         char[:, :, ::1] footprint,
+         char[::1] mask,
+         dtype_t_out[:, :, :, ::1] out,
+         signed char shift_x, signed char shift_y, signed char shift_z,
+         Py_ssize_t n_bins, int num_threads=0):
 
-def _pop(dtype_t[:, ::1] image,
-         char[:, ::1] footprint,
-         char[:, ::1] mask,
-         dtype_t_out[:, :, ::1] out,
-         signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
+    _core_3D(_kernel_sum[dtype_t_out, dtype_t], image, footprint, mask,
+             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins,
+             num_threads)
 
-    _core(_kernel_pop[dtype_t_out, dtype_t], image, footprint, mask, out,
-          shift_x, shift_y, 0, 0, 0, 0, n_bins)
 
+def _threshold(dtype_t[:, :, :] image,
+               char[:, :, ::1] footprint,
+               char[::1] mask,
+               dtype_t_out[:, :, :, ::1] out,
+               signed char shift_x, signed char shift_y, signed char shift_z,
+               Py_ssize_t n_bins, int num_threads=0):
 
-def _pop_3D(dtype_t[:, :, ::1] image,
-            char[:, :, ::1] footprint,
-            char[:, :, ::1] mask,
-            dtype_t_out[:, :, :, ::1] out,
-            signed char shift_x, signed char shift_y, signed char shift_z,
-            Py_ssize_t n_bins):
-
-    _core_3D(_kernel_pop[dtype_t_out, dtype_t], image, footprint, mask, out,
-             shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins)
-
-
-def _sum(dtype_t[:, ::1] image,
-         char[:, ::1] footprint,
-         char[:, ::1] mask,
-         dtype_t_out[:, :, ::1] out,
-         signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
-
-    _core(_kernel_sum[dtype_t_out, dtype_t], image, footprint, mask,
-          out, shift_x, shift_y, 0, 0, 0, 0, n_bins)
-
-
-def _sum_3D(dtype_t[:, :, ::1] image,
-            char[:, :, ::1] footprint,
-            char[:, :, ::1] mask,
-            dtype_t_out[:, :, :, ::1] out,
-            signed char shift_x, signed char shift_y, signed char shift_z,
-            Py_ssize_t n_bins):
-
-    _core_3D(_kernel_sum[dtype_t_out, dtype_t], image, footprint, mask, out,
-             shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins)
-
-
-def _threshold(dtype_t[:, ::1] image,
-               char[:, ::1] footprint,
-               char[:, ::1] mask,
-               dtype_t_out[:, :, ::1] out,
-               signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
-
-    _core(_kernel_threshold[dtype_t_out, dtype_t], image, footprint, mask, out,
-          shift_x, shift_y, 0, 0, 0, 0, n_bins)
+    _core_3D(_kernel_threshold[dtype_t_out, dtype_t], image, footprint, mask,
+             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins,
+             num_threads)
 
 
-def _threshold_3D(dtype_t[:, :, ::1] image,
+def _noise_filter(dtype_t[:, :, :] image,
                   char[:, :, ::1] footprint,
-                  char[:, :, ::1] mask,
+                  char[::1] mask,
                   dtype_t_out[:, :, :, ::1] out,
-                  signed char shift_x, signed char shift_y, signed char shift_z,
-                  Py_ssize_t n_bins):
-
-    _core_3D(_kernel_threshold[dtype_t_out, dtype_t], image, footprint, mask,
-             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins)
-
-
-def _noise_filter(dtype_t[:, ::1] image,
-                  char[:, ::1] footprint,
-                  char[:, ::1] mask,
-                  dtype_t_out[:, :, ::1] out,
-                  signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
-
-    _core(_kernel_noise_filter[dtype_t_out, dtype_t], image, footprint, mask,
-          out, shift_x, shift_y, 0, 0, 0, 0, n_bins)
-
-
-def _noise_filter_3D(dtype_t[:, :, ::1] image,
-                     char[:, :, ::1] footprint,
-                     char[:, :, ::1] mask,
-                     dtype_t_out[:, :, :, ::1] out,
-                     signed char shift_x, signed char shift_y, signed char shift_z,
-                     Py_ssize_t n_bins):
+                  signed char shift_x, signed char shift_y,
+                  signed char shift_z, Py_ssize_t n_bins,
+                  int num_threads=0):
 
     _core_3D(_kernel_noise_filter[dtype_t_out, dtype_t], image, footprint,
-             mask, out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins)
-
-
-def _entropy(dtype_t[:, ::1] image,
-             char[:, ::1] footprint,
-             char[:, ::1] mask,
-             dtype_t_out[:, :, ::1] out,
-             signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
-
-    _core(_kernel_entropy[dtype_t_out, dtype_t], image, footprint, mask, out,
-          shift_x, shift_y, 0, 0, 0, 0, n_bins)
-
-
-def _entropy_3D(dtype_t[:, :, ::1] image,
-                char[:, :, ::1] footprint,
-                char[:, :, ::1] mask,
-                dtype_t_out[:, :, :, ::1] out,
-                signed char shift_x, signed char shift_y, signed char shift_z,
-                Py_ssize_t n_bins):
+             mask, out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins,
+             num_threads)
 
-    _core_3D(_kernel_entropy[dtype_t_out, dtype_t], image, footprint, mask,
-             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins)
 
-
-def _otsu(dtype_t[:, ::1] image,
-          char[:, ::1] footprint,
-          char[:, ::1] mask,
-          dtype_t_out[:, :, ::1] out,
-          signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
-
-    _core(_kernel_otsu[dtype_t_out, dtype_t], image, footprint, mask, out,
-          shift_x, shift_y, 0, 0, 0, 0, n_bins)
-
-
-def _otsu_3D(dtype_t[:, :, ::1] image,
+def _entropy(dtype_t[:, :, :] image,
              char[:, :, ::1] footprint,
-             char[:, :, ::1] mask,
+             char[::1] mask,
              dtype_t_out[:, :, :, ::1] out,
              signed char shift_x, signed char shift_y, signed char shift_z,
-             Py_ssize_t n_bins):
-
-    _core_3D(_kernel_otsu[dtype_t_out, dtype_t], image, footprint, mask, out,
-             shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins)
-
-
-def _windowed_hist(dtype_t[:, ::1] image,
-                   char[:, ::1] footprint,
-                   char[:, ::1] mask,
-                   dtype_t_out[:, :, ::1] out,
-                   signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
-
-    _core(_kernel_win_hist[dtype_t_out, dtype_t], image, footprint, mask, out,
-          shift_x, shift_y, 0, 0, 0, 0, n_bins)
-
+             Py_ssize_t n_bins, int num_threads=0):
+
+    cdef Py_ssize_t p, r, c, k
+    cdef Py_ssize_t size = 0
+    cdef double q
+    cdef double* terms
+
+    for p in range(footprint.shape[0]):
+        for r in range(footprint.shape[1]):
+            for c in range(footprint.shape[2]):
+                if footprint[p, r, c]:
+                    size += 1
+
+    # the entropy term of each count of the neighborhoods holding all the
+    # `size` pixels of the footprint, computed once instead of a logarithm
+    # per bin and pixel; the other neighborhoods, on the image borders or
+    # masked, compute their terms in the same way
+    terms = <double*>malloc((size + 1) * sizeof(double))
+    if terms is NULL:
+        raise MemoryError()
+    terms[0] = 0
+    for k in range(1, size + 1):
+        q = k / <double>size
+        terms[k] = q * log(q) / 0.6931471805599453
+
+    try:
+        _core_3D(_kernel_entropy[dtype_t_out, dtype_t], image, footprint,
+                 mask, out, shift_x, shift_y, shift_z, 0, 0, 0, size,
+                 n_bins, num_threads, lut=terms)
+    finally:
+        free(terms)
+
+
+def _otsu(dtype_t[:, :, :] image,
+          char[:, :, ::1] footprint,
+          char[::1] mask,
+          dtype_t_out[:, :, :, ::1] out,
+          signed char shift_x, signed char shift_y, signed char shift_z,
+          Py_ssize_t n_bins, int num_threads=0):
+
+    _core_3D(_kernel_otsu[dtype_t_out, dtype_t], image, footprint, mask,
+             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins,
+             num_threads)
+
+
+def _windowed_hist(dtype_t[:, :, :] image,
+                   char[:, :, ::1] footprint,
+                   char[::1] mask,
+                   dtype_t_out[:, :, :, ::1] out,
+                   signed char shift_x, signed char shift_y,
+                   signed char shift_z, Py_ssize_t n_bins,
+                   int num_threads=0):
+
+    _core_3D(_kernel_win_hist[dtype_t_out, dtype_t], image, footprint, mask,
+             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins,
+             num_threads)
+
+
+def _majority(dtype_t[:, :, :] image,
+              char[:, :, ::1] footprint,
+              char[::1] mask,
+              dtype_t_out[:, :, :, ::1] out,
+              signed char shift_x, signed char shift_y, signed char shift_z,
+              Py_ssize_t n_bins, int num_threads=0):
 
-def _majority(dtype_t[:, ::1] image,
-              char[:, ::1] footprint,
-              char[:, ::1] mask,
-              dtype_t_out[:, :, ::1] out,
-              signed char shift_x, signed char shift_y, Py_ssize_t n_bins):
+    _core_3D(_kernel_majority[dtype_t_out, dtype_t], image, footprint, mask,
+             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins,
+             num_threads)
 
-    _core(_kernel_majority[dtype_t_out, dtype_t], image, footprint, mask, out,
-          shift_x, shift_y, 0, 0, 0, 0, n_bins)
 
+def _multi(dtype_t[:, :, :] image,
+           char[:, :, ::1] footprint,
+           char[::1] mask,
+           dtype_t_out[:, :, :, ::1] out,
+           signed char shift_x, signed char shift_y, signed char shift_z,
+           Py_ssize_t n_bins, Py_ssize_t reducers, int num_threads=0):
 
-def _majority_3D(dtype_t[:, :, ::1] image,
-                 char[:, :, ::1] footprint,
-                 char[:, :, ::1] mask,
-                 dtype_t_out[:, :, :, ::1] out,
-                 signed char shift_x, signed char shift_y, signed char shift_z,
-                 Py_ssize_t n_bins):
+    # the median needs the coarse histogram
+    cdef bint coarse_histo = reducers & (1 << MULTI_REDUCERS.index('median'))
 
-    _core_3D(_kernel_majority[dtype_t_out, dtype_t], image, footprint, mask,
-             out, shift_x, shift_y, shift_z, 0, 0, 0, 0, n_bins)
+    _core_3D(_kernel_multi[dtype_t_out, dtype_t], image, footprint, mask,
+             out, shift_x, shift_y, shift_z, 0, 0, reducers, 0, n_bins,
+             num_threads, coarse_histo=coarse_histo)
@@ -6,15 +6,19 @@ from skimage._shared import testing
 
 from skimage.util import img_as_ubyte, img_as_float
 from skimage import data, util, morphology
-from skimage.morphology import gray, disk, ball
+from skimage.morphology import gray, disk, ball, diamond, octahedron
 from skimage.filters import rank
-from skimage.filters.rank import __all__ as all_rank_filters
-from skimage.filters.rank import subtract_mean
+from skimage.filters.rank import __all__ as all_rank_functions
+from skimage.filters.rank import subtract_mean, generic_cy
 from skimage._shared._warnings import expected_warnings
 from skimage._shared.testing import test_parallel, parametrize, fetch
 import pytest
 
 
+# `multi` applies several of the filters at once
+all_rank_filters = [name for name in all_rank_functions if name != 'multi']
+
+
 def test_otsu_edge_case():
     # This is an edge case that causes OTSU to appear to misbehave
     # Pixel [1, 1] may take a value of of 41 or 81. Both should be considered
@@ -287,6 +291,46 @@ class TestRank():
         with testing.raises(NotImplementedError):
             rank.mean(image, footprint, out=out)
 
+    def test_reused_output(self):
+        # the output buffer is filled in place and can be reused
+        image = util.img_as_ubyte(data.camera()[::4, ::4])
+        out = np.empty_like(image)
+        for footprint in (disk(1), disk(3)):
+            result = rank.mean(image, footprint, out=out)
+            assert result is out
+            assert_equal(out, rank.mean(image, footprint))
+
+        volume = image[:60].reshape((3, 20, -1))
+        out = np.empty_like(volume)
+        result = rank.maximum(volume, ball(1), out=out)
+        assert result is out
+        assert_equal(out, rank.maximum(volume, ball(1)))
+
+    def test_invalid_output(self):
+        image = util.img_as_ubyte(data.camera()[::4, ::4])
+        with testing.raises(ValueError):
+            rank.mean(image, disk(1), out=np.empty((10, 10), np.uint8))
+        with testing.raises(ValueError):
+            out = np.empty(image.shape + (512,))[..., ::2]
+            rank.windowed_histogram(image, disk(1), out=out)
+        with testing.raises(ValueError):
+            # too few bins for the image values
+            out = np.empty(image.shape + (10,))
+            rank.windowed_histogram(image, disk(1), out=out)
+        with testing.raises(ValueError):
+            out = np.empty(image.shape + (10,))
+            rank.windowed_histogram(image.astype(np.uint16), disk(1), out=out)
+
+    def test_strided_output(self):
+        # views are filled in place, without a copy
+        image = util.img_as_ubyte(data.camera()[::4, ::4])
+        expected = rank.mean(image, disk(1))
+        for out in (np.zeros((256, 256), np.uint8)[::2, ::2],
+                    np.zeros_like(image).T):
+            result = rank.mean(image, disk(1), out=out)
+            assert result is out
+            assert_equal(out, expected)
+
     def test_compare_autolevels(self):
         # compare autolevel and percentile autolevel with p0=0.0 and p1=1.0
         # should returns the same arrays
@@ -636,6 +680,8 @@ class TestRank():
     def test_16bit(self):
         image = np.zeros((21, 21), dtype=np.uint16)
         footprint = np.ones((3, 3), dtype=np.uint8)
+        # a mask forces the use of a histogram for the rectangular footprint
+        mask = np.ones(image.shape, dtype=bool)
 
         for bitdepth in range(17):
             value = 2 ** bitdepth - 1
@@ -647,8 +693,9 @@ class TestRank():
             with expected_warnings(expected):
                 assert rank.minimum(image, footprint)[10, 10] == 0
                 assert rank.maximum(image, footprint)[10, 10] == value
-                mean_val = rank.mean(image, footprint)[10, 10]
+                mean_val = rank.mean(image, footprint, mask=mask)[10, 10]
                 assert mean_val == int(value / footprint.size)
+            assert rank.mean(image, footprint)[10, 10] == mean_val
 
     def test_bilateral(self):
         image = np.zeros((21, 21), dtype=np.uint16)
@@ -797,6 +844,11 @@ class TestRank():
         )
         assert larger_output.shape[2] == 5
 
+        # without n_bins, the number of bins is given by out or the dtype
+        assert rank.windowed_histogram(image8, elem).shape[2] == 256
+        image16 = image8.astype(np.uint16)
+        assert rank.windowed_histogram(image16, elem).shape[2] == 2
+
     def test_median_default_value(self):
         a = np.zeros((3, 3), dtype=np.uint8)
         a[1] = 1
@@ -825,3 +877,336 @@ class TestRank():
         elem = np.ones((3, 3), dtype=bool)
         with testing.raises(ValueError):
             rank.maximum(image=image, footprint=elem)
+
+    @parametrize('filter', ['equalize', 'otsu', 'autolevel', 'gradient',
+                            'majority', 'maximum', 'mean', 'geometric_mean',
+                            'subtract_mean', 'median', 'minimum', 'modal',
+                            'enhance_contrast', 'pop', 'sum', 'threshold',
+                            'noise_filter', 'entropy'])
+    def test_2d_same_as_single_plane_3d(self, filter):
+        image = img_as_ubyte(data.camera()[::4, ::4])
+        mask = image > 50
+        func = getattr(rank, filter)
+        out_2d = func(image, disk(3), mask=mask, shift_x=1, shift_y=-1)
+        out_3d = func(image[np.newaxis], disk(3)[np.newaxis],
+                      mask=mask[np.newaxis], shift_y=-1, shift_z=1)
+        assert_equal(out_2d, out_3d[0])
+
+    @parametrize('filter', ['equalize', 'otsu', 'autolevel', 'gradient',
+                            'majority', 'maximum', 'mean', 'geometric_mean',
+                            'subtract_mean', 'median', 'minimum', 'modal',
+                            'enhance_contrast', 'pop', 'sum', 'threshold',
+                            'noise_filter', 'entropy'])
+    def test_n_bins(self, filter):
+        image = (data.camera()[::4, ::4] * 4).astype(np.uint16)
+        func = getattr(rank, filter)
+        n_bins = int(max(3, image.max())) + 1
+        assert_equal(func(image, disk(3)),
+                     func(image, disk(3), n_bins=n_bins))
+        volume = image[:16].reshape((4, 4, -1))
+        n_bins = int(max(3, volume.max())) + 1
+        assert_equal(func(volume, ball(1)),
+                     func(volume, ball(1), n_bins=n_bins))
+
+    def test_n_bins_lower_than_image_max(self):
+        # values beyond the supplied number of bins must not be written out
+        # of the histogram bounds
+        image = np.full((50, 50), 1000, dtype=np.uint16)
+        image8 = np.full((50, 50), 255, dtype=np.uint8)
+        rank.maximum(image, disk(3), n_bins=10)
+        rank.maximum(image8, disk(3), n_bins=10)
+        hist = rank.windowed_histogram(image8, disk(3), n_bins=300)
+        assert_equal(hist[..., 255], 1)
+        assert_equal(hist.sum(axis=-1), 1)
+
+    @parametrize('filter', ['autolevel', 'gradient', 'enhance_contrast',
+                            'maximum', 'minimum', 'median'])
+    def test_n_bins_below_all_values(self, filter):
+        # the filters finding no value in their bins return 0
+        image = np.full((50, 50), 1000, dtype=np.uint16)
+        image[::7, ::5] = 2000
+        func = getattr(rank, filter)
+        assert_equal(func(image, disk(3), n_bins=10), 0)
+
+    @parametrize('filter', ['equalize', 'otsu', 'autolevel', 'majority',
+                            'mean', 'median', 'noise_filter', 'entropy'])
+    @parametrize('num_threads', [None, 1, 2])
+    def test_num_threads(self, filter, num_threads):
+        image = img_as_ubyte(data.camera()[::2, ::3])
+        mask = image > 50
+        func = getattr(rank, filter)
+        expected = func(image, disk(3), mask=mask, shift_x=1, shift_y=-1,
+                        num_threads=1)
+        out = func(image, disk(3), mask=mask, shift_x=1, shift_y=-1,
+                   num_threads=num_threads)
+        assert_equal(expected, out)
+        volume = image[:120].reshape((3, 40, -1))
+        expected = func(volume, ball(2), num_threads=1)
+        assert_equal(expected, func(volume, ball(2), num_threads=num_threads))
+
+    @parametrize('filter', ['minimum', 'maximum', 'mean', 'modal', 'majority',
+                            'pop', 'sum', 'threshold', 'entropy', 'otsu'])
+    def test_numba_backend(self, filter, monkeypatch):
+        pytest.importorskip('numba')
+        func = getattr(rank, filter)
+        image = np.random.randint(0, 256, size=(20, 31)).astype(np.uint8)
+        volume = np.random.randint(0, 256, size=(6, 20, 31)).astype(np.uint8)
+        mask = image > 50
+        expected = [func(image, disk(3), mask=mask, shift_x=1),
+                    func(volume, ball(2))]
+        monkeypatch.setenv('SKIMAGE_BACKEND', 'numba')
+        assert_allclose(func(image, disk(3), mask=mask, shift_x=1),
+                        expected[0])
+        assert_allclose(func(volume, ball(2)), expected[1])
+
+    @parametrize('filter', ['minimum', 'maximum', 'mean', 'pop', 'sum'])
+    def test_numba_specialized(self, filter, monkeypatch):
+        # small footprints without mask use kernels generated for them
+        pytest.importorskip('numba')
+        func = getattr(rank, filter)
+        image = np.random.randint(0, 256, size=(20, 31)).astype(np.uint8)
+        # the last image is smaller than the footprint, without interior
+        cases = [(image, disk(2)), (image, np.array([[0, 1, 1], [1, 0, 0]])),
+                 (image, disk(1)), (image[:2, :3], disk(2))]
+        expected = [func(img, fp, shift_y=-1) for img, fp in cases]
+        monkeypatch.setenv('SKIMAGE_BACKEND', 'numba')
+        for (img, fp), out in zip(cases, expected):
+            assert_equal(func(img, fp, shift_y=-1), out)
+
+    def test_default_num_threads(self):
+        from skimage.filters.rank.generic import _default_num_threads
+        small = np.zeros((100, 100), dtype=np.uint8)
+        large = np.zeros((512, 512), dtype=np.uint8)
+        assert _default_num_threads(small, None) == 1
+        assert _default_num_threads(large, None) == 0
+        assert _default_num_threads(small, 4) == 4
+        assert _default_num_threads(large, 1) == 1
+
+    def test_windowed_histogram_max_n_bins(self):
+        image = data.camera().astype(np.uint16) * 200
+        hist = rank.windowed_histogram(image, disk(3), max_n_bins=256)
+        assert hist.shape == image.shape + (256,)
+        quantized = (image * (255 / int(image.max()))).astype(np.uint8)
+        assert_allclose(hist, rank.windowed_histogram(quantized, disk(3),
+                                                      n_bins=256))
+        # images with few enough bins are not quantized
+        image8 = data.camera()[:50, :50].astype(np.uint16)
+        assert_equal(rank.windowed_histogram(image8, disk(3), max_n_bins=256),
+                     rank.windowed_histogram(image8, disk(3)))
+
+    @parametrize('dtype', [np.uint8, np.uint16])
+    def test_multi(self, dtype):
+        # each reduction of the single scan matches its own filter
+        reducers = [name for name in generic_cy.MULTI_REDUCERS
+                    if name != 'histogram']
+        image = np.random.randint(0, 1000, size=(20, 31))
+        image = np.minimum(image, np.iinfo(dtype).max).astype(dtype)
+        volume = np.random.randint(0, 256, size=(6, 20, 31)).astype(dtype)
+        for img, footprint in [(image, disk(2)), (volume, ball(1))]:
+            mask = np.random.rand(*img.shape) > 0.2
+            for kwargs in ({}, {'mask': mask}):
+                out = rank.multi(img, footprint, reducers, **kwargs)
+                assert list(out) == reducers
+                for name in reducers:
+                    expected = getattr(rank, name)(img, footprint, **kwargs)
+                    assert out[name].dtype == expected.dtype
+                    assert_equal(out[name], expected)
+
+        out = rank.multi(image, disk(2), ['histogram', 'sum'])
+        assert_equal(out['sum'], rank.sum(image, disk(2)))
+        assert_allclose(out['histogram'],
+                        rank.windowed_histogram(image, disk(2)))
+        with pytest.raises(ValueError):
+            rank.multi(image, disk(2), ['mean', 'tophat'])
+
+    def test_max_n_bins(self):
+        image = data.camera().astype(np.uint16) * 200
+        exact = rank.maximum(image, disk(3))
+        with expected_warnings([]):
+            approx = rank.maximum(image, disk(3), max_n_bins=256)
+        assert approx.dtype == np.uint16
+        # the error is bounded by the width of a quantization bin
+        step = (int(image.max()) + 1) / 256
+        assert np.abs(approx.astype(int) - exact).max() <= step
+        assert_equal(rank.pop(image, disk(3), max_n_bins=256),
+                     rank.pop(image, disk(3)))
+        # images needing fewer bins are not quantized
+        image8 = data.camera().astype(np.uint16)
+        assert_equal(rank.median(image8, disk(3), max_n_bins=1024),
+                     rank.median(image8, disk(3)))
+
+    @parametrize('dtype', [np.uint8, np.uint16])
+    def test_degenerate_footprint(self, dtype):
+        image = np.random.randint(0, 1000, size=(15, 17))
+        image = np.minimum(image, np.iinfo(dtype).max).astype(dtype)
+        mask = np.ones(image.shape, dtype=bool)
+        centre = np.zeros((3, 3), dtype=np.uint8)
+        centre[1, 1] = 1
+        for filter in ['maximum', 'mean', 'median', 'modal', 'entropy',
+                       'gradient', 'pop']:
+            func = getattr(rank, filter)
+            # a mask forces the use of histograms
+            assert_equal(func(image, centre), func(image, centre, mask=mask))
+            assert_equal(func(image, np.zeros((3, 3))), 0)
+        assert_equal(rank.median(image, centre), image)
+        # off-center single elements are not the identity
+        assert_equal(rank.median(image, centre, shift_x=1),
+                     rank.median(image, centre, shift_x=1, mask=mask))
+
+    def test_wide_image(self):
+        # the rows spanned by the footprint exceed the size of a tile of
+        # columns, which are processed separately
+        image = np.random.randint(0, 256, size=(20, 40000)).astype(np.uint8)
+        footprint = disk(6)
+        assert_equal(rank.maximum(image, footprint),
+                     gray.dilation(image, footprint))
+        assert_equal(rank.minimum(image, footprint),
+                     gray.erosion(image, footprint))
+
+    @parametrize('dtype', [bool, np.uint8, np.int64, np.float64])
+    def test_mask_dtype(self, dtype):
+        # the area of the mask is where it is positive, whatever its dtype
+        image = util.img_as_ubyte(data.camera()[::8, ::8])
+        mask = np.zeros(image.shape, dtype=bool)
+        mask[10:40, 5:50] = True
+        expected = rank.median(image, disk(2), mask=mask)
+        assert_equal(rank.median(image, disk(2), mask=mask.astype(dtype)),
+                     expected)
+
+    def test_noise_filter_footprint_untouched(self):
+        image = util.img_as_ubyte(data.camera()[::4, ::4])
+        footprint = disk(2)
+        footprint.flags.writeable = False
+        hollow = disk(2)
+        hollow[2, 2] = 0
+        assert_equal(rank.noise_filter(image, footprint),
+                     rank.noise_filter(image, hollow))
+        assert_equal(footprint, disk(2))
+
+    @parametrize('filter', ['equalize', 'median', 'modal', 'entropy',
+                            'noise_filter', 'windowed_histogram'])
+    def test_strided_image(self, filter):
+        # strided views are filtered without being copied first
+        func = getattr(rank, filter)
+        image = np.random.randint(0, 256, size=(60, 90)).astype(np.uint8)
+        view = image[::2, ::-3]
+        mask = view > 30
+        assert_equal(func(view, disk(3), mask=mask),
+                     func(view.copy(), disk(3), mask=mask))
+        assert_equal(func(view, disk(3)), func(view.copy(), disk(3)))
+        if filter != 'windowed_histogram':
+            volume = np.random.randint(0, 256, size=(20, 8, 30))
+            volume = volume.astype(np.uint16).transpose(1, 0, 2)
+            assert_equal(func(volume, ball(2)),
+                         func(volume.copy(), ball(2)))
+
+    def test_cupy_input_without_cucim(self):
+        # arrays from the cupy module are forwarded to the CUDA filters or to
+        # cuCIM, which are not available here
+        FakeCupyArray = type('ndarray', (np.ndarray,),
+                             {'__module__': 'cupy._core.core'})
+        image = util.img_as_ubyte(data.camera()[::8, ::8])
+        with testing.raises(TypeError):
+            rank.median(image.view(FakeCupyArray), disk(1))
+        with testing.raises(TypeError):
+            rank.minimum(image.view(FakeCupyArray), disk(1))
+        # the images the CUDA filters do not support go to cuCIM
+        with testing.raises(TypeError, match='requires cuCIM'):
+            rank.minimum(image.astype(float).view(FakeCupyArray), disk(1))
+
+    def test_footprint_modified_in_place(self):
+        # the footprint offsets are cached on the footprint content
+        image = util.img_as_ubyte(data.camera()[::4, ::4])
+        footprint = disk(2)
+        assert_equal(rank.maximum(image, footprint),
+                     gray.dilation(image, footprint))
+        footprint[:] = 0
+        footprint[2, 2] = 1
+        assert_equal(rank.maximum(image, footprint), image)
+
+    @parametrize('shape', [(3, 4), (30, 41), (5, 30, 41)])
+    def test_no_mask_same_as_full_mask(self, shape):
+        image = np.random.randint(0, 256, size=shape).astype(np.uint8)
+        footprint = disk(3) if len(shape) == 2 else ball(2)
+        mask = np.ones(shape, dtype=bool)
+        for shift in (-1, 0, 1):
+            assert_equal(rank.mean(image, footprint, shift_y=shift),
+                         rank.mean(image, footprint, shift_y=shift, mask=mask))
+            assert_equal(rank.maximum(image, footprint, shift_x=shift),
+                         rank.maximum(image, footprint, shift_x=shift,
+                                      mask=mask))
+
+    @parametrize('filter', ['minimum', 'maximum', 'mean', 'subtract_mean',
+                            'pop', 'sum', 'threshold', 'gradient',
+                            'enhance_contrast'])
+    @parametrize('dtype', [np.uint8, np.uint16])
+    def test_rectangle_footprint(self, filter, dtype):
+        # rectangular footprints without mask use separable SciPy filters or
+        # cumulative sums, which must match the histogram-based filter
+        func = getattr(rank, filter)
+        image = np.random.randint(0, 1000, size=(20, 31)).astype(dtype)
+        image = np.minimum(image, np.iinfo(dtype).max)
+        volume = np.random.randint(0, 256, size=(6, 20, 31)).astype(dtype)
+        for img, footprint in [(image, np.ones((3, 4))),
+                               (image, np.ones((3, 8))),
+                               (volume, np.ones((3, 4, 5)))]:
+            mask = np.ones(img.shape, dtype=bool)
+            for shift in (-1, 0, 1):
+                assert_equal(func(img, footprint, shift_x=shift),
+                             func(img, footprint, shift_x=shift, mask=mask))
+                assert_equal(func(img, footprint, shift_y=shift),
+                             func(img, footprint, shift_y=shift, mask=mask))
+
+    @parametrize('filter', ['minimum', 'maximum', 'mean', 'median', 'modal',
+                            'sum', 'entropy', 'majority'])
+    def test_footprint_shape(self, filter):
+        # an int or a tuple of ints stands for the rectangle of this shape
+        func = getattr(rank, filter)
+        image = np.random.randint(0, 256, size=(20, 31)).astype(np.uint8)
+        volume = np.random.randint(0, 256, size=(6, 20, 31)).astype(np.uint8)
+        assert_equal(func(image, (3, 4)), func(image, np.ones((3, 4))))
+        assert_equal(func(image, 5), func(image, np.ones((5, 5))))
+        assert_equal(func(volume, (3, 4, 5)), func(volume, np.ones((3, 4, 5))))
+        assert_equal(func(volume, 3), func(volume, np.ones((3, 3, 3))))
+
+    @parametrize('filter', ['minimum', 'maximum', 'enhance_contrast'])
+    def test_footprint_sequence(self, filter):
+        # a sequence of footprints filters with their Minkowski sum, also on
+        # the image borders
+        func = getattr(rank, filter)
+        image = np.random.randint(0, 256, size=(20, 31)).astype(np.uint8)
+        volume = np.random.randint(0, 256, size=(6, 20, 31)).astype(np.uint8)
+        assert_equal(func(image, ((diamond(1), 2),)), func(image, diamond(2)))
+        assert_equal(func(image, ((np.ones((1, 3)), 2), (np.ones((3, 1)), 1))),
+                     func(image, np.ones((3, 5))))
+        assert_equal(func(volume, ((octahedron(1), 2),)),
+                     func(volume, octahedron(2)))
+        with pytest.raises(ValueError):
+            func(image, ((diamond(1), 2),), mask=image > 10)
+
+    @parametrize('dtype', [np.uint8, np.uint16])
+    def test_median_3x3(self, dtype):
+        # the default 3x3 square is sorted by a network of minima and maxima
+        footprint = np.ones((3, 3))
+        for shape in [(3, 3), (3, 10), (25, 4), (31, 37)]:
+            image = np.random.randint(0, 1000, size=shape)
+            image = np.minimum(image, np.iinfo(dtype).max).astype(dtype)
+            mask = np.ones(shape, dtype=bool)
+            assert_equal(rank.median(image),
+                         rank.median(image, footprint, mask=mask))
+
+    @parametrize('dtype', [np.uint8, np.uint16])
+    def test_median_brute_force(self, dtype):
+        image = np.random.randint(0, 1000, size=(15, 17))
+        image = np.minimum(image, np.iinfo(dtype).max).astype(dtype)
+        mask = np.random.rand(*image.shape) > 0.3
+        footprint = disk(2)
+        result = rank.median(image, footprint, mask=mask)
+        padded = np.pad(image, 2)
+        valid = np.pad(mask, 2)
+        for r in range(image.shape[0]):
+            for c in range(image.shape[1]):
+                window = footprint & valid[r:r + 5, c:c + 5]
+                values = np.sort(padded[r:r + 5, c:c + 5][window > 0])
+                expected = values[values.size // 2] if values.size else 0
+                assert result[r, c] == expected
@@ -11,7 +11,7 @@ from .convex_hull import convex_hull_image, convex_hull_object
 from .grayreconstruct import reconstruction
 from .misc import remove_small_objects, remove_small_holes
 from .extrema import h_minima, h_maxima, local_maxima, local_minima
-from ._flood_fill import flood, flood_fill
+from ._flood_fill import flood, flood_fill, flood_many
 from .max_tree import (max_tree, area_opening, area_closing,
                        diameter_opening, diameter_closing,
                        max_tree_local_maxima)
@@ -53,6 +53,7 @@ __all__ = ['binary_erosion',
            'local_minima',
            'flood',
            'flood_fill',
+           'flood_many',
            'max_tree',
            'area_opening',
            'area_closing',
@@ -4,14 +4,181 @@ This module provides a function to fill all equal (or within tolerance) values
 connected to a given seed point with a different value.
 """
 
+import math
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from warnings import warn
 
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from scipy import ndimage as ndi
 
 from .._shared.utils import deprecate_kwarg
-from ._flood_fill_cy import _flood_fill_equal, _flood_fill_tolerance
-from ._util import (_offsets_to_raveled_neighbors, _resolve_neighborhood,
-                    _set_border_values,)
+from . import _flood_fill_cy
+from ._util import _resolve_neighborhood
+
+
+# number of pixels up to which images are filled by a binary propagation,
+# setting up the flood fill costing more than it saves
+_MAX_PROPAGATION_SIZE = 256 * 256
+
+# flags of the last shapes flooded in each thread, and the largest number of
+# bytes of the packed flags kept
+_flags_cache = threading.local()
+_FLAGS_CACHE_SIZE = 4
+_MAX_CACHED_FLAGS_SIZE = 2 ** 24
+
+
+def _tolerance_bounds(dtype, seed_value, tolerance):
+    """Return the range of values within `tolerance` of the seed value.
+
+    The bounds are values of `dtype`, each clipped to its range to avoid
+    overflows. They are exact for integers, whose distance to the seed value
+    is within the tolerance if it is within its integer part, and rounded
+    inward for floats, so that the values of `dtype` between them are exactly
+    those within the tolerance. The lower bound exceeds the upper one if the
+    tolerance is negative. An infinite or NaN tolerance spans the whole range.
+    """
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        seed_value = int(seed_value)
+    else:
+        info = np.finfo(dtype)
+        seed_value = float(seed_value)
+
+    # the tolerance is first clipped to the span of the dtype, `min` keeping
+    # the span for a NaN tolerance
+    span = float(info.max) - float(info.min)
+    tolerance = max(-span, min(span, tolerance))
+    if np.issubdtype(dtype, np.integer):
+        tolerance = math.floor(tolerance)
+
+    high_tol = min(info.max, max(info.min, seed_value + tolerance))
+    low_tol = min(info.max, max(info.min, seed_value - tolerance))
+    if np.issubdtype(dtype, np.integer):
+        return dtype.type(low_tol), dtype.type(high_tol)
+
+    # the bounds rounded to the nearest values of the dtype, such as those of
+    # half floats, may lie outside of the tolerance
+    low, high = dtype.type(low_tol), dtype.type(high_tol)
+    if float(low) < low_tol:
+        low = np.nextafter(low, dtype.type(np.inf))
+    if float(high) > high_tol:
+        high = np.nextafter(high, dtype.type(-np.inf))
+    return low, high
+
+
+def _fill_values(image, seed_value, tolerance):
+    """Return the mask of the pixels whose value may be filled."""
+    if tolerance is None:
+        return image == seed_value
+    low_tol, high_tol = _tolerance_bounds(image.dtype, seed_value, tolerance)
+    return (image >= low_tol) & (image <= high_tol)
+
+
+def _neighbor_offsets(footprint):
+    """Return the offsets of the neighbors of a footprint, nearest first."""
+    offsets = np.stack(np.nonzero(footprint), axis=-1) - 1
+    offsets = offsets[np.argsort(np.abs(offsets).sum(axis=1), kind='stable')]
+    return offsets[np.any(offsets, axis=1)]
+
+
+def _element_strides(shape, axes):
+    """Return the strides, in elements, of a contiguous array.
+
+    The axes of the array are laid out in memory in the order `axes`, the
+    last one varying the fastest.
+    """
+    strides = [0] * len(shape)
+    stride = 1
+    for axis in reversed(axes):
+        strides[axis] = stride
+        stride *= shape[axis]
+    return tuple(strides)
+
+
+def _border_indices(shape, strides):
+    """Return the raveled indices of the elements on the border of an array.
+
+    The elements on several faces, such as the corners, are repeated.
+    """
+    ranges = [np.arange(size) * stride for size, stride in zip(shape, strides)]
+    faces = []
+    for axis, size in enumerate(shape):
+        grid = list(ranges)
+        grid[axis] = np.array([0, (size - 1) * strides[axis]])
+        faces.append(sum(np.ix_(*grid)).ravel())
+    return np.concatenate(faces)
+
+
+def _border_flags(flags_shape, flags_strides):
+    """Return the packed flags of the padded image, set on its border."""
+    flags_size = int(np.prod(flags_shape))
+    flags_bits = np.zeros((flags_size + 7) // 8, dtype=np.uint8)
+    border = _border_indices(flags_shape, flags_strides)
+    np.bitwise_or.at(flags_bits, border >> 3,
+                     np.left_shift(1, border & 7).astype(np.uint8))
+    return flags_bits
+
+
+def _new_flags(flags_shape, flags_strides):
+    """Return packed flags set on the border, reusing those of the thread.
+
+    The flags of the last shapes flooded in each thread are kept with their
+    initial value, which is copied to them again instead of being computed.
+    """
+    cache = getattr(_flags_cache, 'flags', None)
+    if cache is None:
+        cache = _flags_cache.flags = OrderedDict()
+    key = (flags_shape, flags_strides)
+    if key in cache:
+        cache.move_to_end(key)
+        border_bits, flags_bits = cache[key]
+        np.copyto(flags_bits, border_bits)
+        return flags_bits
+
+    border_bits = _border_flags(flags_shape, flags_strides)
+    if border_bits.size > _MAX_CACHED_FLAGS_SIZE:
+        return border_bits
+    flags_bits = border_bits.copy()
+    cache[key] = border_bits, flags_bits
+    if len(cache) > _FLAGS_CACHE_SIZE:
+        cache.popitem(last=False)
+    return flags_bits
+
+
+@lru_cache(maxsize=32)
+def _connectivity_neighborhood(connectivity, ndim):
+    """Return the footprint of a connectivity and its neighbor offsets.
+
+    They are cached, flood fills being often repeated with the same
+    connectivity, and must thus not be modified.
+    """
+    footprint = _resolve_neighborhood(None, connectivity, ndim)
+    offsets = _neighbor_offsets(footprint)
+    footprint.flags.writeable = False
+    offsets.flags.writeable = False
+    return footprint, offsets
+
+
+def _flood_fill_funcs():
+    """Return the module of the flood fill loops to use.
+
+    The Numba loops of `_flood_fill_numba` replace their Cython counterparts
+    when the ``SKIMAGE_BACKEND`` environment variable is set to ``numba``.
+    """
+    if os.environ.get('SKIMAGE_BACKEND') != 'numba':
+        return _flood_fill_cy
+    try:
+        # Numba is an optional dependency, only imported when selected
+        from . import _flood_fill_numba
+    except ImportError:
+        raise RuntimeError("Could not import 'numba'. Please install "
+                           "using 'pip install numba'")
+    return _flood_fill_numba
 
 
 @deprecate_kwarg(kwarg_mapping={'selem': 'footprint'}, removed_version="1.0")
@@ -115,13 +282,14 @@ def flood_fill(image, seed_point, new_value, *, footprint=None,
              category=FutureWarning)
         in_place = inplace
 
-    mask = flood(image, seed_point, footprint=footprint,
-                 connectivity=connectivity, tolerance=tolerance)
-
     if not in_place:
         image = image.copy()
 
-    image[mask] = new_value
+    # the fill is written by the flood loops if possible, in a single pass
+    mask = _flood(image, seed_point, footprint, connectivity, tolerance,
+                  new_value=new_value)
+    if mask is not None:
+        image[mask] = new_value
     return image
 
 
@@ -173,6 +341,10 @@ def flood(image, seed_point, *, footprint=None, connectivity=None,
     simply run `numpy.nonzero` on the result, save the indices, and discard
     this mask.
 
+    When the ``SKIMAGE_BACKEND`` environment variable is set to ``numba``, the
+    fill uses a Numba implementation compiled for the image dtype, which
+    requires the optional ``numba`` package.
+
     Examples
     --------
     >>> from skimage.morphology import flood
@@ -220,15 +392,25 @@ def flood(image, seed_point, *, footprint=None, connectivity=None,
            [5, 5, 5, 5, 2, 2, 5],
            [5, 5, 5, 5, 5, 5, 3]])
     """
-    # Correct start point in ravelled image - only copy if non-contiguous
+    return _flood(image, seed_point, footprint, connectivity, tolerance)
+
+
+def _flood(image, seed_point, footprint, connectivity, tolerance,
+           new_value=None):
+    """Return the mask of a flood fill, or write a value to the fill.
+
+    If `new_value` is given, and the fill is found by the flood loops in
+    `image` itself, they write `new_value` to its pixels and None is
+    returned. Otherwise, the mask of the fill is returned.
+    """
+    # The image is read in place whatever its layout, only copied if its
+    # strides are negative or not multiples of its item size
     image = np.asarray(image)
-    if image.flags.f_contiguous is True:
-        order = 'F'
-    elif image.flags.c_contiguous is True:
-        order = 'C'
-    else:
+    if any(stride < 0 or stride % image.itemsize
+           for stride in image.strides):
         image = np.ascontiguousarray(image)
-        order = 'C'
+        # the fill would be written to the copy
+        new_value = None
 
     # Shortcut for rank zero
     if 0 in image.shape:
@@ -241,58 +423,224 @@ def flood(image, seed_point, *, footprint=None, connectivity=None,
         seed_point = (seed_point,)
 
     seed_value = image[seed_point]
-    seed_point = tuple(np.asarray(seed_point) % image.shape)
+    seed_point = tuple(int(index) % size
+                       for index, size in zip(seed_point, image.shape))
 
-    footprint = _resolve_neighborhood(footprint, connectivity, image.ndim)
+    if footprint is None:
+        footprint, offsets = _connectivity_neighborhood(connectivity,
+                                                        image.ndim)
+    else:
+        footprint = _resolve_neighborhood(footprint, connectivity, image.ndim)
+        offsets = _neighbor_offsets(footprint)
+
+    if tolerance is not None and tolerance < 0:
+        # No value is within a negative tolerance of the seed value, the
+        # bounds of which are reversed, and would wrap around in the unsigned
+        # comparisons of the flood loops; the seed belongs to the fill in any
+        # case
+        mask = np.zeros(image.shape, dtype=bool)
+        mask[seed_point] = True
+        return mask
+
+    if image.dtype == np.float16:
+        # Half floats have no C type for the flood loops: the pixels of the
+        # fill values are found by NumPy, then the fill by flooding them as a
+        # boolean image, the seed belonging to the fill in any case
+        fill_values = _fill_values(image, seed_value, tolerance)
+        fill_values[seed_point] = True
+        return _flood(fill_values, seed_point, footprint, None, None)
+
+    if image.dtype == bool:
+        if np.array_equal(footprint, footprint[(slice(None, None, -1),)
+                                               * image.ndim]):
+            # The fill of a boolean image is the connected component of the
+            # seed among the pixels of its value, or among all of them if the
+            # tolerance spans both values; it is found by labeling them, the
+            # symmetric footprint connecting the pixels both ways
+            if tolerance is None or tolerance < 1:
+                fill_values = image == seed_value
+            else:
+                fill_values = np.ones(image.shape, dtype=bool)
+            labels, _ = ndi.label(fill_values, structure=footprint)
+            return labels == labels[seed_point]
+        # otherwise filled as their bytes, of value 0 or 1, the value of the
+        # fill being cast as when assigned to the boolean image
+        if new_value is not None:
+            fill_value = np.empty((), dtype=bool)
+            fill_value[()] = new_value
+            new_value = fill_value[()]
+        image = image.view(np.uint8)
+        seed_value = image[seed_point]
+
+    if image.size <= _MAX_PROPAGATION_SIZE:
+        # Small images are filled by propagating the seed through the pixels
+        # of the fill values, the seed belonging to the fill in any case
+        fill_values = _fill_values(image, seed_value, tolerance)
+        fill_values[seed_point] = True
+        seed = np.zeros(image.shape, dtype=bool)
+        seed[seed_point] = True
+        # the filled pixels must be kept by each dilation
+        structure = footprint
+        if not structure[(1,) * image.ndim]:
+            structure = structure.copy()
+            structure[(1,) * image.ndim] = True
+        return ndi.binary_propagation(seed, structure=structure,
+                                      mask=fill_values)
+
+    # The flags hold one bit per pixel of the image padded by one pixel along
+    # each axis, set for the border and the fill; see _flood_fill_cy.pyx. Only
+    # the flags are padded to annotate the borders, the image being read in
+    # place
+    flags_shape = tuple(size + 2 for size in image.shape)
+    flags_size = int(np.prod(flags_shape))
+    # the axes of the flags are laid out in the order of the image strides
+    axes = sorted(range(image.ndim), key=lambda axis: -image.strides[axis])
+    flags_strides = _element_strides(flags_shape, axes)
+    flags_bits = _new_flags(flags_shape, flags_strides)
+    # a flat view of the memory spanned by the image, from its first pixel
+    span = sum((size - 1) * stride
+               for size, stride in zip(image.shape, image.strides))
+    image_flat = as_strided(image, shape=(span // image.itemsize + 1,),
+                            strides=(image.itemsize,))
+
+    # Stride-aware neighbors - works for any strides. The neighbors have an
+    # offset in the flags and another in the image
+    flag_offsets = offsets @ np.array(flags_strides, dtype=np.intp)
+    image_offsets = offsets @ (np.array(image.strides, dtype=np.intp)
+                               // image.itemsize)
+    flag_seed_idx = sum((index + 1) * stride
+                        for index, stride in zip(seed_point, flags_strides))
+    image_seed_idx = sum(index * stride for index, stride
+                         in zip(seed_point, image.strides)) // image.itemsize
+
+    if new_value is not None and image.flags.writeable:
+        # cast as when assigned to the image
+        fill_value = np.empty((), dtype=image.dtype)
+        fill_value[()] = new_value
+        output = {'out': image_flat, 'new_value': fill_value[()]}
+    elif image_flat.size == image.size:
+        # The pixels of the image fill the memory it spans: the fill is
+        # written to a mask laid out as the image, at the indices of the
+        # pixels in the image
+        mask_flat = np.zeros(image.size, dtype=np.uint8)
+        output = {'mask': mask_flat}
+    else:
+        output = {}
+
+    funcs = _flood_fill_funcs()
+    if tolerance is not None:
+        # Check if tolerance could create overflow problems
+        low_tol, high_tol = _tolerance_bounds(image.dtype, seed_value,
+                                              tolerance)
+
+        funcs._flood_fill_tolerance(image_flat,
+                                    flags_bits,
+                                    flag_offsets,
+                                    image_offsets,
+                                    flag_seed_idx,
+                                    image_seed_idx,
+                                    seed_value,
+                                    low_tol,
+                                    high_tol,
+                                    **output)
+    else:
+        funcs._flood_fill_equal(image_flat,
+                                flags_bits,
+                                flag_offsets,
+                                image_offsets,
+                                flag_seed_idx,
+                                image_seed_idx,
+                                seed_value,
+                                **output)
+
+    if 'out' in output:
+        return None
+    if 'mask' in output:
+        mask = mask_flat.reshape([image.shape[axis] for axis in axes])
+        return mask.transpose(np.argsort(axes)).view(bool)
+
+    # Output what the user requested; the bits left once the border is
+    # cropped are those of the fill
+    flags = np.unpackbits(flags_bits, count=flags_size, bitorder='little')
+    flags = flags.reshape([flags_shape[axis] for axis in axes])
+    flags = flags.transpose(np.argsort(axes))
+    return flags[(slice(1, -1),) * image.ndim].view(bool)
 
-    # Must annotate borders
-    working_image = np.pad(image, 1, mode='constant',
-                           constant_values=image.min())
 
-    # Stride-aware neighbors - works for both C- and Fortran-contiguity
-    ravelled_seed_idx = np.ravel_multi_index([i + 1 for i in seed_point],
-                                             working_image.shape, order=order)
-    neighbor_offsets = _offsets_to_raveled_neighbors(
-        working_image.shape, footprint, center=((1,) * image.ndim),
-        order=order)
+def flood_many(image, seed_points, *, footprint=None, connectivity=None,
+               tolerance=None, num_workers=None):
+    """Union of the masks of the flood fills from several seed points.
 
-    # Use a set of flags; see _flood_fill_cy.pyx for meanings
-    flags = np.zeros(working_image.shape, dtype=np.uint8, order=order)
-    _set_border_values(flags, value=2)
+    Parameters
+    ----------
+    image : ndarray
+        An n-dimensional array.
+    seed_points : iterable of tuple or int
+        The points in `image` used as the starting points of the flood fills.
+        If the image is 1D, these points may be given as integers.
+    footprint : ndarray, optional
+        The footprint (structuring element) used to determine the neighborhood
+        of each evaluated pixel, as in `flood`.
+    connectivity : int, optional
+        A number used to determine the neighborhood of each evaluated pixel,
+        as in `flood`. Ignored if `footprint` is not None.
+    tolerance : float or int, optional
+        If None (default), adjacent values must be strictly equal to the value
+        of `image` at each seed point. If a value is given, the values within
+        tolerance of the value at the seed point are also filled (inclusive).
+    num_workers : int or None, optional
+        The number of parallel threads to use. If set to ``None``, the full
+        set of available cores are used.
 
-    try:
-        if tolerance is not None:
-            # Check if tolerance could create overflow problems
-            try:
-                max_value = np.finfo(working_image.dtype).max
-                min_value = np.finfo(working_image.dtype).min
-            except ValueError:
-                max_value = np.iinfo(working_image.dtype).max
-                min_value = np.iinfo(working_image.dtype).min
-
-            high_tol = min(max_value, seed_value + tolerance)
-            low_tol = max(min_value, seed_value - tolerance)
-
-            _flood_fill_tolerance(working_image.ravel(order),
-                                  flags.ravel(order),
-                                  neighbor_offsets,
-                                  ravelled_seed_idx,
-                                  seed_value,
-                                  low_tol,
-                                  high_tol)
-        else:
-            _flood_fill_equal(working_image.ravel(order),
-                              flags.ravel(order),
-                              neighbor_offsets,
-                              ravelled_seed_idx,
-                              seed_value)
-    except TypeError:
-        if working_image.dtype == np.float16:
-            # Provide the user with clearer error message
-            raise TypeError("dtype of `image` is float16 which is not "
-                            "supported, try upcasting to float32")
-        else:
-            raise
-
-    # Output what the user requested; view does not create a new copy.
-    return flags[(slice(1, -1),) * image.ndim].view(bool)
+    Returns
+    -------
+    mask : ndarray
+        A Boolean array with the same shape as `image`, with True values for
+        the areas connected to and equal (or within tolerance of) any of the
+        seed points.
+
+    Notes
+    -----
+    Each seed point is filled independently by `flood`, whose loops release
+    the GIL, so that the fills run in parallel threads, `num_workers` seed
+    points at a time. Without tolerance, the seed points already in the fill
+    of earlier ones are skipped, their fill being part of it. Otherwise, the
+    fills are not merged when their regions meet: a point within tolerance
+    of two seed points is filled from both.
+
+    Examples
+    --------
+    >>> from skimage.morphology import flood_many
+    >>> image = np.zeros((4, 7), dtype=int)
+    >>> image[1:3, 1:3] = 1
+    >>> image[1:3, 4:6] = 2
+    >>> flood_many(image, [(1, 1), (2, 5)]).astype(int)
+    array([[0, 0, 0, 0, 0, 0, 0],
+           [0, 1, 1, 0, 1, 1, 0],
+           [0, 1, 1, 0, 1, 1, 0],
+           [0, 0, 0, 0, 0, 0, 0]])
+    """
+    image = np.asarray(image)
+    seed_points = [tuple(np.atleast_1d(seed_point))
+                   for seed_point in seed_points]
+    mask = np.zeros(image.shape, dtype=bool)
+    if not seed_points:
+        return mask
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+
+    def fill(seed_point):
+        return flood(image, seed_point, footprint=footprint,
+                     connectivity=connectivity, tolerance=tolerance)
+
+    # The seed points are filled by windows of one per thread, so that the
+    # masks awaiting to be merged are at most one per thread
+    with ThreadPoolExecutor(max_workers=num_workers) as ex:
+        for start in range(0, len(seed_points), num_workers):
+            window = seed_points[start:start + num_workers]
+            if tolerance is None:
+                window = [seed_point for seed_point in window
+                          if not mask[seed_point]]
+            for seed_mask in ex.map(fill, window):
+                mask |= seed_mask
+    return mask
@@ -8,8 +8,11 @@
 cimport numpy as cnp
 cnp.import_array()
 
-# Must be defined to use QueueWithHistory
-ctypedef Py_ssize_t QueueItem
+# Must be defined to use QueueWithHistory; each pixel of the fill is queued
+# with its index in the padded flags and in the image, which is not padded
+ctypedef struct QueueItem:
+    Py_ssize_t flag_index
+    Py_ssize_t image_index
 
 include "../morphology/_queue_with_history.pxi"
 
@@ -27,21 +30,44 @@ ctypedef fused dtype_t:
     cnp.float64_t
 
 
-# Definition of flag values used for `flags` in _flood_fill & _fill_plateau
-cdef:
-    # Border value - do not cross!
-    unsigned char BORDER = 2
-    # Part of the flood fill
-    unsigned char FILL = 1
-    # Not checked yet
-    unsigned char UNKNOWN = 0
+# The flags hold one bit per pixel of the padded image, the bits of each byte
+# being ordered from the least significant one, as unpacked by
+# `numpy.unpackbits` with ``bitorder='little'``. The bit of a pixel is set if
+# it is on the border, which must not be crossed, or part of the flood fill,
+# and unset if it was not checked yet.
+cdef inline bint _flag_is_set(unsigned char* bits, Py_ssize_t index) nogil:
+    return bits[index >> 3] & (1 << (index & 7))
 
 
-cpdef inline void _flood_fill_equal(dtype_t[::1] image,
+cdef inline void _set_flag(unsigned char* bits, Py_ssize_t index) nogil:
+    bits[index >> 3] |= 1 << (index & 7)
+
+
+cdef inline bint _within_tolerance(dtype_t value, dtype_t low_tol,
+                                   dtype_t high_tol,
+                                   cnp.uint64_t span) nogil:
+    """Return whether `value` is in ``[low_tol, high_tol]``.
+
+    Integers are compared once, as the difference of the value and the lower
+    limit, wrapped around to an unsigned integer, is at most
+    ``span = high_tol - low_tol`` for the values within the limits only.
+    """
+    if dtype_t is cnp.float32_t or dtype_t is cnp.float64_t:
+        return low_tol <= value <= high_tol
+    else:
+        return <cnp.uint64_t>value - <cnp.uint64_t>low_tol <= span
+
+
+cpdef inline void _flood_fill_equal(const dtype_t[::1] image,
                                     unsigned char[::1] flags,
-                                    Py_ssize_t[::1] neighbor_offsets,
-                                    Py_ssize_t start_index,
-                                    dtype_t seed_value):
+                                    Py_ssize_t[::1] flag_offsets,
+                                    Py_ssize_t[::1] image_offsets,
+                                    Py_ssize_t flag_start,
+                                    Py_ssize_t image_start,
+                                    dtype_t seed_value,
+                                    dtype_t[::1] out=None,
+                                    dtype_t new_value=0,
+                                    unsigned char[::1] mask=None):
     """Find connected areas to fill, requiring strict equality.
 
     Parameters
@@ -49,50 +75,89 @@ cpdef inline void _flood_fill_equal(dtype_t[::1] image,
     image : ndarray, one-dimensional
         The raveled view of a n-dimensional array.
     flags : ndarray, one-dimensional
-        An array of flags that is used to store the state of each pixel during
-        evaluation.
-    neighbor_offsets : ndarray
+        The packed bits that store the state of each pixel during evaluation,
+        set for the border and the fill. They are those of the raveled array
+        padded by one border pixel along each axis, unlike `image`.
+    flag_offsets : ndarray
         A one-dimensional array that contains the offsets to find the
-        connected neighbors for any index in `image`.
-    start_index : int
-        Start position for the flood-fill.
+        connected neighbors for any index in `flags`.
+    image_offsets : ndarray
+        The offsets of the same neighbors for any index in `image`.
+    flag_start, image_start : int
+        Start position for the flood-fill in the bits of `flags` and in
+        `image`.
     seed_value :
-        Value of ``image[start_index]``.
+        Value of ``image[image_start]``.
+    out : ndarray, one-dimensional, optional
+        If given, `new_value` is written to the pixels of the fill in `out`,
+        which is raveled as `image` and may share its memory, the pixels of
+        the fill not being read again.
+    new_value :
+        Value written to the fill in `out`.
+    mask : ndarray, one-dimensional, optional
+        If given, 1 is written to the pixels of the fill in `mask`, which is
+        raveled as `image`.
     """
     cdef:
         QueueWithHistory queue
-        QueueItem current_index, neighbor
+        QueueItem current, neighbor
+        unsigned char* bits = &flags[0]
+        dtype_t* out_ptr = NULL
+        unsigned char* mask_ptr = NULL
+
+    if out is not None:
+        out_ptr = &out[0]
+    if mask is not None:
+        mask_ptr = &mask[0]
 
     with nogil:
         # Initialize the queue
         queue_init(&queue, 64)
         try:
-            queue_push(&queue, &start_index)
-            flags[start_index] = FILL
+            current.flag_index = flag_start
+            current.image_index = image_start
+            queue_push(&queue, &current)
+            _set_flag(bits, flag_start)
+            if out_ptr != NULL:
+                out_ptr[image_start] = new_value
+            if mask_ptr != NULL:
+                mask_ptr[image_start] = 1
             # Break loop if all queued positions were evaluated
-            while queue_pop(&queue, &current_index):
+            while queue_pop(&queue, &current):
                 # Look at all neighboring samples
-                for i in range(neighbor_offsets.shape[0]):
-                    neighbor = current_index + neighbor_offsets[i]
-
-                    # Shortcut if neighbor is already part of fill
-                    if flags[neighbor] == UNKNOWN:
-                        if image[neighbor] == seed_value:
+                for i in range(flag_offsets.shape[0]):
+                    neighbor.flag_index = current.flag_index + flag_offsets[i]
+
+                    # Shortcut if neighbor is already part of fill; the
+                    # image is only read inside the border
+                    if not _flag_is_set(bits, neighbor.flag_index):
+                        neighbor.image_index = (current.image_index
+                                                + image_offsets[i])
+                        if image[neighbor.image_index] == seed_value:
                             # Neighbor is in fill; check its neighbors too.
-                            flags[neighbor] = FILL
-                            queue_push(&queue, &neighbor)
+                            _set_flag(bits, neighbor.flag_index)
+                            if out_ptr != NULL:
+                                out_ptr[neighbor.image_index] = new_value
+                            if mask_ptr != NULL:
+                                mask_ptr[neighbor.image_index] = 1
+                            queue_push_discard(&queue, &neighbor)
         finally:
             # Ensure memory released
             queue_exit(&queue)
 
 
-cpdef inline void _flood_fill_tolerance(dtype_t[::1] image,
+cpdef inline void _flood_fill_tolerance(const dtype_t[::1] image,
                                         unsigned char[::1] flags,
-                                        Py_ssize_t[::1] neighbor_offsets,
-                                        Py_ssize_t start_index,
+                                        Py_ssize_t[::1] flag_offsets,
+                                        Py_ssize_t[::1] image_offsets,
+                                        Py_ssize_t flag_start,
+                                        Py_ssize_t image_start,
                                         dtype_t seed_value,
                                         dtype_t low_tol,
-                                        dtype_t high_tol):
+                                        dtype_t high_tol,
+                                        dtype_t[::1] out=None,
+                                        dtype_t new_value=0,
+                                        unsigned char[::1] mask=None):
     """Find connected areas to fill, within a tolerance.
 
     Parameters
@@ -100,42 +165,84 @@ cpdef inline void _flood_fill_tolerance(dtype_t[::1] image,
     image : ndarray, one-dimensional
         The raveled view of a n-dimensional array.
     flags : ndarray, one-dimensional
-        An array of flags that is used to store the state of each pixel during
-        evaluation.
-    neighbor_offsets : ndarray
+        The packed bits that store the state of each pixel during evaluation,
+        set for the border and the fill. They are those of the raveled array
+        padded by one border pixel along each axis, unlike `image`.
+    flag_offsets : ndarray
         A one-dimensional array that contains the offsets to find the
-        connected neighbors for any index in `image`.
-    start_index : int
-        Start position for the flood-fill.
+        connected neighbors for any index in `flags`.
+    image_offsets : ndarray
+        The offsets of the same neighbors for any index in `image`.
+    flag_start, image_start : int
+        Start position for the flood-fill in the bits of `flags` and in
+        `image`.
     seed_value :
-        Value of ``image[start_index]``.
+        Value of ``image[image_start]``.
     low_tol :
         Lower limit for tolerance comparison.
     high_tol :
         Upper limit for tolerance comparison.
+    out : ndarray, one-dimensional, optional
+        If given, `new_value` is written to the pixels of the fill in `out`,
+        which is raveled as `image` and may share its memory, the pixels of
+        the fill not being read again.
+    new_value :
+        Value written to the fill in `out`.
+    mask : ndarray, one-dimensional, optional
+        If given, 1 is written to the pixels of the fill in `mask`, which is
+        raveled as `image`.
     """
     cdef:
         QueueWithHistory queue
-        QueueItem current_index, neighbor
+        QueueItem current, neighbor
+        unsigned char* bits = &flags[0]
+        dtype_t* out_ptr = NULL
+        unsigned char* mask_ptr = NULL
+        cnp.uint64_t span = 0
+
+    if out is not None:
+        out_ptr = &out[0]
+    if mask is not None:
+        mask_ptr = &mask[0]
+
+    if dtype_t is cnp.float32_t or dtype_t is cnp.float64_t:
+        # floats are compared to both limits
+        pass
+    else:
+        span = <cnp.uint64_t>high_tol - <cnp.uint64_t>low_tol
 
     with nogil:
         # Initialize the queue and push start position
         queue_init(&queue, 64)
         try:
-            queue_push(&queue, &start_index)
-            flags[start_index] = FILL
+            current.flag_index = flag_start
+            current.image_index = image_start
+            queue_push(&queue, &current)
+            _set_flag(bits, flag_start)
+            if out_ptr != NULL:
+                out_ptr[image_start] = new_value
+            if mask_ptr != NULL:
+                mask_ptr[image_start] = 1
             # Break loop if all queued positions were evaluated
-            while queue_pop(&queue, &current_index):
+            while queue_pop(&queue, &current):
                 # Look at all neighboring samples
-                for i in range(neighbor_offsets.shape[0]):
-                    neighbor = current_index + neighbor_offsets[i]
-
-                    # Only do comparisons on points not (yet) part of fill
-                    if flags[neighbor] == UNKNOWN:
-                        if low_tol <= image[neighbor] <= high_tol:
+                for i in range(flag_offsets.shape[0]):
+                    neighbor.flag_index = current.flag_index + flag_offsets[i]
+
+                    # Only do comparisons on points not (yet) part of fill,
+                    # the image being only read inside the border
+                    if not _flag_is_set(bits, neighbor.flag_index):
+                        neighbor.image_index = (current.image_index
+                                                + image_offsets[i])
+                        if _within_tolerance(image[neighbor.image_index],
+                                             low_tol, high_tol, span):
                             # Neighbor is in fill; check its neighbors too.
-                            flags[neighbor] = FILL
-                            queue_push(&queue, &neighbor)
+                            _set_flag(bits, neighbor.flag_index)
+                            if out_ptr != NULL:
+                                out_ptr[neighbor.image_index] = new_value
+                            if mask_ptr != NULL:
+                                mask_ptr[neighbor.image_index] = 1
+                            queue_push_discard(&queue, &neighbor)
         finally:
             # Ensure memory released
             queue_exit(&queue)
@@ -0,0 +1,194 @@
+"""Numba implementation of the flood fill loops of `_flood_fill_cy`.
+
+These functions take the same arguments as their Cython counterparts, and are
+used in their place when the ``SKIMAGE_BACKEND`` environment variable is set
+to ``numba`` (see `_flood_fill._flood_fill_funcs`). They are compiled for the
+dtype of each image on first use, and release the GIL.
+
+The loops of the neighborhoods of up to 26 neighbors, such as those of the
+connectivities in 2-D and 3-D, are unrolled by loops generated for their
+number of neighbors (see `_unrolled_flood_fill`).
+
+"""
+
+from functools import lru_cache
+
+import numba
+import numpy as np
+
+
+@numba.njit(cache=True, nogil=True)
+def _flag_is_set(flags, index):
+    """Return whether the bit of a pixel is set, as in _flood_fill_cy.pyx."""
+    return flags[index >> 3] & (1 << (index & 7)) != 0
+
+
+@numba.njit(cache=True, nogil=True)
+def _set_flag(flags, index):
+    """Set the bit of a pixel."""
+    flags[index >> 3] |= np.uint8(1 << (index & 7))
+
+
+@numba.njit(cache=True, nogil=True)
+def _grow(queue):
+    """Return a copy of the queue with twice its capacity."""
+    grown = np.empty((2 * queue.shape[0], 2), dtype=queue.dtype)
+    grown[:queue.shape[0]] = queue
+    return grown
+
+
+@numba.njit(cache=True, nogil=True)
+def _push(queue, head, tail, flag_index, image_index):
+    """Push a pixel to the queue, returning it with its new head and tail."""
+    if tail == queue.shape[0]:
+        # the checked pixels are dropped if they fill at least half of the
+        # queue, as in `queue_push_discard`
+        if 2 * head >= queue.shape[0]:
+            for k in range(tail - head):
+                queue[k] = queue[head + k]
+            tail -= head
+            head = 0
+        else:
+            queue = _grow(queue)
+    queue[tail, 0] = flag_index
+    queue[tail, 1] = image_index
+    return queue, head, tail + 1
+
+
+@numba.njit(cache=True, nogil=True)
+def _flood_fill(image, flags, flag_offsets, image_offsets, flag_start,
+                image_start, low_tol, high_tol, out, new_value, write, mask,
+                write_mask):
+    # FIFO of the indices in the flags and in the image of the pixels of the
+    # fill whose neighbors remain to be checked, the fill being traversed
+    # breadth first
+    queue = np.empty((64, 2), dtype=np.intp)
+    queue[0, 0] = flag_start
+    queue[0, 1] = image_start
+    head = 0
+    tail = 1
+    _set_flag(flags, flag_start)
+    if write:
+        out[image_start] = new_value
+    if write_mask:
+        mask[image_start] = 1
+    while head < tail:
+        flag_index = queue[head, 0]
+        image_index = queue[head, 1]
+        head += 1
+        for i in range(flag_offsets.shape[0]):
+            neighbor = flag_index + flag_offsets[i]
+            # the image is only read inside the border
+            if not _flag_is_set(flags, neighbor):
+                value = image[image_index + image_offsets[i]]
+                if low_tol <= value <= high_tol:
+                    _set_flag(flags, neighbor)
+                    if write:
+                        out[image_index + image_offsets[i]] = new_value
+                    if write_mask:
+                        mask[image_index + image_offsets[i]] = 1
+                    queue, head, tail = _push(queue, head, tail, neighbor,
+                                              image_index + image_offsets[i])
+
+
+# maximum number of neighbors of the unrolled loops, that of the full
+# connectivity in 3-D
+_MAX_UNROLLED_NEIGHBORS = 26
+
+
+@lru_cache(maxsize=32)
+def _unrolled_flood_fill(n_neighbors):
+    """Generate `_flood_fill` for a number of neighbors.
+
+    The offsets of the neighbors are read once, and each neighbor of a
+    pixel is checked by its own lines of the generated source, without loop.
+
+    Parameters
+    ----------
+    n_neighbors : int
+        Number of neighbors of each pixel.
+
+    Returns
+    -------
+    flood_fill : function
+        Numba function taking the arguments of `_flood_fill`.
+
+    """
+    offsets = [f'    f{i} = flag_offsets[{i}]\n    i{i} = image_offsets[{i}]'
+               for i in range(n_neighbors)]
+    checks = [f'''
+        neighbor = flag_index + f{i}
+        if not _flag_is_set(flags, neighbor):
+            value = image[image_index + i{i}]
+            if low_tol <= value <= high_tol:
+                _set_flag(flags, neighbor)
+                if write:
+                    out[image_index + i{i}] = new_value
+                if write_mask:
+                    mask[image_index + i{i}] = 1
+                queue, head, tail = _push(queue, head, tail, neighbor,
+                                          image_index + i{i})'''
+              for i in range(n_neighbors)]
+    source = '\n'.join(
+        ['def flood_fill(image, flags, flag_offsets, image_offsets, '
+         'flag_start, image_start, low_tol, high_tol, out, new_value, '
+         'write, mask, write_mask):']
+        + offsets
+        + ['    queue = np.empty((64, 2), dtype=np.intp)',
+           '    queue[0, 0] = flag_start',
+           '    queue[0, 1] = image_start',
+           '    head = 0',
+           '    tail = 1',
+           '    _set_flag(flags, flag_start)',
+           '    if write:',
+           '        out[image_start] = new_value',
+           '    if write_mask:',
+           '        mask[image_start] = 1',
+           '    while head < tail:',
+           '        flag_index = queue[head, 0]',
+           '        image_index = queue[head, 1]',
+           '        head += 1']
+        + checks
+    )
+    namespace = {'np': np, '_flag_is_set': _flag_is_set,
+                 '_set_flag': _set_flag, '_push': _push}
+    exec(source, namespace)
+    return numba.njit(nogil=True)(namespace['flood_fill'])
+
+
+def _kernel(flag_offsets):
+    """Return the flood fill loop for the number of neighbors."""
+    if flag_offsets.shape[0] <= _MAX_UNROLLED_NEIGHBORS:
+        return _unrolled_flood_fill(flag_offsets.shape[0])
+    return _flood_fill
+
+
+def _output_args(image, out, new_value, mask):
+    """Return the output arguments of `_flood_fill`, of fixed types."""
+    if out is None:
+        args = (np.empty(0, dtype=image.dtype), image.dtype.type(0), False)
+    else:
+        args = (out, image.dtype.type(new_value), True)
+    if mask is None:
+        return args + (np.empty(0, dtype=np.uint8), False)
+    return args + (mask, True)
+
+
+def _flood_fill_equal(image, flags, flag_offsets, image_offsets, flag_start,
+                      image_start, seed_value, out=None, new_value=0,
+                      mask=None):
+    """Find connected areas to fill, requiring strict equality."""
+    flood_fill = _kernel(flag_offsets)
+    flood_fill(image, flags, flag_offsets, image_offsets, flag_start,
+               image_start, seed_value, seed_value,
+               *_output_args(image, out, new_value, mask))
+
+
+def _flood_fill_tolerance(image, flags, flag_offsets, image_offsets,
+                          flag_start, image_start, seed_value, low_tol,
+                          high_tol, out=None, new_value=0, mask=None):
+    """Find connected areas to fill, within a tolerance."""
+    flood_fill = _kernel(flag_offsets)
+    flood_fill(image, flags, flag_offsets, image_offsets, flag_start,
+               image_start, low_tol, high_tol,
+               *_output_args(image, out, new_value, mask))
@@ -40,6 +40,7 @@ Example
 """
 
 from libc.stdlib cimport malloc, realloc, free
+from libc.string cimport memmove
 
 
 # Store state of queue
@@ -75,6 +76,21 @@ cdef inline void queue_push(QueueWithHistory* self, QueueItem* item_ptr) nogil:
     self._buffer_ptr[self._index_valid] = item_ptr[0]
 
 
+cdef inline void queue_push_discard(QueueWithHistory* self,
+                                    QueueItem* item_ptr) nogil:
+    """Enqueue a new item, discarding the consumed items if needed.
+
+    Before the buffer is grown, the consumed items are dropped if they fill at
+    least half of it, so that its size is bounded by the number of items
+    queued at once, rather than by all the items ever queued. The consumed
+    items can then no longer be restored with `queue_restore`.
+    """
+    if (self._index_valid + 1 >= self._buffer_size
+            and 2 * (self._index_consumed + 1) >= self._buffer_size):
+        _queue_discard_consumed(self)
+    queue_push(self, item_ptr)
+
+
 cdef inline unsigned char queue_pop(QueueWithHistory* self,
                                     QueueItem* item_ptr) nogil:
     """If not empty pop an item and return 1 otherwise return 0.
@@ -127,3 +143,12 @@ cdef inline void _queue_grow_buffer(QueueWithHistory* self) nogil:
         with gil:
             raise MemoryError("couldn't reallocate buffer")
     self._buffer_ptr = new_buffer_ptr
+
+
+cdef inline void _queue_discard_consumed(QueueWithHistory* self) nogil:
+    """Move the items not consumed yet to the start of the buffer."""
+    cdef Py_ssize_t n_consumed = self._index_consumed + 1
+    memmove(self._buffer_ptr, self._buffer_ptr + n_consumed,
+            (self._index_valid + 1 - n_consumed) * sizeof(QueueItem))
+    self._index_valid -= n_consumed
+    self._index_consumed = -1
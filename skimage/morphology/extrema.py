@@ -390,10 +390,31 @@ def local_maxima(image, footprint=None, connectivity=None, indices=False,
         else:
             return np.zeros(image.shape, dtype=bool)
 
+    # Whether the image is padded with the lowest value of its dtype
+    lowest_padded = False
     if allow_borders:
         # Ensure that local maxima are always at least one smaller sample away
-        # from the image border
-        image = np.pad(image, 1, mode='constant', constant_values=image.min())
+        # from the image border. The lowest value of the dtype spares a scan
+        # of the image for its minimum, but only if the footprint holds the
+        # face neighbors: otherwise the samples equal to the image minimum may
+        # form a class closed under the neighborhood, which the border would
+        # no longer merge with and which would thus become a maximum
+        footprint = _util._resolve_neighborhood(footprint, connectivity,
+                                                image.ndim)
+        center = (1,) * image.ndim
+        has_faces = all(
+            footprint[center[:axis] + (i,) + center[axis + 1:]]
+            for axis in range(image.ndim) for i in (0, 2)
+        )
+        if has_faces and image.dtype.kind in 'iuf':
+            lowest_padded = True
+            if image.dtype.kind == 'f':
+                lowest = -np.inf
+            else:
+                lowest = np.iinfo(image.dtype).min
+        else:
+            lowest = image.min()
+        image = np.pad(image, 1, mode='constant', constant_values=lowest)
 
     # Array of flags used to store the state of each pixel during evaluation.
     # See _extrema_cy.pyx for their meaning
@@ -428,6 +449,11 @@ def local_maxima(image, footprint=None, connectivity=None, indices=False,
     if allow_borders:
         # Revert padding performed at the beginning of the function
         flags = crop(flags, 1)
+        if lowest_padded and flags.all():
+            # With the face neighbors, only the samples of a constant image
+            # are all maxima, the border being lower than them unless they
+            # equal the lowest value; such an image has no maximum
+            flags[...] = 0
     else:
         # No padding was performed but set edge values back to 0
         _util._set_border_values(flags, value=0)
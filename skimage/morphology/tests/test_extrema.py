@@ -460,6 +460,40 @@ class TestLocalMaxima(unittest.TestCase):
         assert result_footprint_x.dtype == bool
         assert_equal(result_footprint_x, expected_footprint_x)
 
+        # Without neighbors, every sample is a maximum, constant or not
+        footprint_center = np.zeros((3, 3), dtype=bool)
+        footprint_center[1, 1] = True
+        expected_center = np.ones(self.image.shape, dtype=bool)
+        for image in [self.image, np.full(self.image.shape, 42, np.uint8)]:
+            result_footprint_center = extrema.local_maxima(
+                image, footprint=footprint_center)
+            assert_equal(result_footprint_center, expected_center)
+            result_footprint_center = extrema.local_minima(
+                image, footprint=footprint_center)
+            assert_equal(result_footprint_center, expected_center)
+
+        # The samples equal to the image minimum form a class closed under
+        # the diagonal neighborhood, which is not a maximum
+        checkerboard = np.indices((6, 7)).sum(axis=0) % 2 == 0
+        image = np.where(checkerboard, 5, 0).astype(np.int16)
+        assert_equal(extrema.local_maxima(image, footprint=footprint_x),
+                     checkerboard)
+        image[checkerboard] = np.arange(1, checkerboard.sum() + 1)
+        result_footprint_x = extrema.local_maxima(image,
+                                                  footprint=footprint_x)
+        assert not result_footprint_x[~checkerboard].any()
+        footprint_row = np.array([[0, 0, 0], [1, 1, 1], [0, 0, 0]],
+                                 dtype=bool)
+        image = np.full((4, 5), 3, dtype=np.int16)
+        image[1] = 0
+        image[2, 2] = 7
+        expected_row = np.zeros((4, 5), dtype=bool)
+        expected_row[[0, 3]] = True
+        expected_row[2, 2] = True
+        result_footprint_row = extrema.local_maxima(image,
+                                                    footprint=footprint_row)
+        assert_equal(result_footprint_row, expected_row)
+
     def test_indices(self):
         """Test output if indices of peaks are desired."""
         # Connectivity 1
@@ -548,6 +582,23 @@ class TestLocalMaxima(unittest.TestCase):
             assert result.dtype == bool
             assert_equal(result, expected)
 
+    def test_dtype_limits(self):
+        """Test maxima at the border with the limits of the dtype."""
+        for dtype in self.supported_dtypes:
+            try:
+                info = np.iinfo(dtype)
+            except ValueError:
+                info = np.finfo(dtype)
+            image = np.full((4, 5), info.min, dtype=dtype)
+            image[0, 1:3] = info.max
+            image[3, 4] = 0
+            expected = np.zeros((4, 5), dtype=bool)
+            expected[0, 1:3] = True
+            expected[3, 4] = info.min < 0
+            assert_equal(extrema.local_maxima(image), expected)
+            assert_equal(extrema.local_maxima(image[:1, :1]),
+                         np.zeros((1, 1), dtype=bool))
+
     def test_extrema_float(self):
         """Specific tests for float type."""
         # Copied from old unit test for local_maxma
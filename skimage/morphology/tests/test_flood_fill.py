@@ -2,7 +2,7 @@ import numpy as np
 import pytest
 
 from skimage._shared.testing import expected_warnings
-from skimage.morphology import flood, flood_fill
+from skimage.morphology import _flood_fill, flood, flood_fill, flood_many
 
 eps = 1e-12
 
@@ -27,8 +27,31 @@ def test_selem_kwarg_deprecation():
 
 def test_float16():
     image = np.array([9., 0.1, 42], dtype=np.float16)
-    with pytest.raises(TypeError, match="dtype of `image` is float16"):
-        flood_fill(image, 0, 1)
+    output = flood_fill(image, 0, 1)
+    assert output.dtype == np.float16
+    np.testing.assert_array_equal(output, [1., image[1], 42])
+
+    output = flood_fill(image, 1, 5, tolerance=9)
+    np.testing.assert_array_equal(output, [5., 5., 42])
+
+    # the tolerance bounds are not rounded to the spacing of half floats
+    image = np.array([1000, 1000.5], dtype=np.float16)
+    np.testing.assert_array_equal(flood(image, 0, tolerance=0.3),
+                                  [True, False])
+    np.testing.assert_array_equal(flood(image, 1, tolerance=0.3),
+                                  [False, True])
+
+
+@pytest.mark.parametrize("tolerance", [None, 0.3, 0.5, 0.7])
+def test_float16_large(tolerance):
+    # the values are exact half floats, 0.5 apart
+    rng = np.random.default_rng(0)
+    image = 1000 + rng.integers(0, 4, size=(300, 250)) / 2
+    image[::7, ::5] = np.nan
+    expected = flood(image, (5, 6), tolerance=tolerance)
+    np.testing.assert_array_equal(
+        flood(image.astype(np.float16), (5, 6), tolerance=tolerance),
+        expected)
 
 
 def test_overrange_tolerance_int():
@@ -298,5 +321,244 @@ def test_negative_indexing_seed_point():
     np.testing.assert_allclose(image, expected)
 
 
+@pytest.mark.parametrize("tolerance", [None, 0])
+def test_read_only_image(tolerance):
+    # the image is read in place, without padded copy
+    image = np.zeros((4, 5), dtype=np.uint8)
+    image[1:3, 1:4] = 1
+    image.flags.writeable = False
+    mask = flood(image, (1, 1), tolerance=tolerance)
+    np.testing.assert_array_equal(mask, image == 1)
+
+
+@pytest.mark.parametrize("order", ["C", "F"])
+def test_singleton_axes(order):
+    image = np.array([[0, 0, 1, 0]], order=order)
+    expected = np.array([[True, True, False, False]])
+    np.testing.assert_array_equal(flood(image, (0, 1)), expected)
+    np.testing.assert_array_equal(flood(image.T, (1, 0)), expected.T)
+    volume = np.zeros((3, 1, 4), order=order)
+    volume[1, 0, 1:] = 1
+    np.testing.assert_array_equal(flood(volume, (1, 0, 2)), volume == 1)
+
+
+@pytest.mark.parametrize("tolerance", [None, 0, 2])
+def test_numba_backend(tolerance, monkeypatch):
+    pytest.importorskip('numba')
+    rng = np.random.default_rng(0)
+    # large enough not to be filled by a binary propagation
+    image = rng.integers(0, 4, size=(300, 250)).astype(np.float32)
+    volume = np.asfortranarray(rng.integers(0, 3, size=(40, 45, 50)))
+    # with more neighbors than the unrolled loops
+    hypervolume = rng.integers(0, 2, size=(10, 11, 12, 13)).astype(np.uint8)
+    monkeypatch.setattr(_flood_fill, '_MAX_PROPAGATION_SIZE', 0)
+    expected = [flood(image, (3, 4), tolerance=tolerance),
+                flood(volume, (2, 3, 4), connectivity=1, tolerance=tolerance),
+                flood(hypervolume, (1, 2, 3, 4), tolerance=tolerance)]
+    monkeypatch.setenv('SKIMAGE_BACKEND', 'numba')
+    np.testing.assert_array_equal(flood(image, (3, 4), tolerance=tolerance),
+                                  expected[0])
+    np.testing.assert_array_equal(
+        flood(volume, (2, 3, 4), connectivity=1, tolerance=tolerance),
+        expected[1])
+    np.testing.assert_array_equal(
+        flood(hypervolume, (1, 2, 3, 4), tolerance=tolerance), expected[2])
+
+
+@pytest.mark.parametrize("tolerance", [None, 0, 1])
+def test_binary_propagation(tolerance, monkeypatch):
+    # small images are filled by a binary propagation of the seed
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 3, size=(30, 40)).astype(np.uint8)
+    image[0, 0] = 255
+    volume = rng.integers(0, 3, size=(10, 12, 14))
+    footprint = np.array([[0, 1, 0], [0, 1, 1], [0, 0, 0]], dtype=bool)
+    cases = [(image, (5, 6), {}), (image, (0, 0), {}),
+             (image, (5, 6), {'footprint': footprint}),
+             (volume, (2, 3, 4), {'connectivity': 1})]
+    expected = [flood(img, seed, tolerance=tolerance, **kwargs)
+                for img, seed, kwargs in cases]
+    monkeypatch.setattr(_flood_fill, '_MAX_PROPAGATION_SIZE', 0)
+    for (img, seed, kwargs), mask in zip(cases, expected):
+        np.testing.assert_array_equal(
+            flood(img, seed, tolerance=tolerance, **kwargs), mask)
+
+
+@pytest.mark.parametrize("tolerance", [None, 0, 1])
+@pytest.mark.parametrize("shape", [(30, 40), (300, 250)])
+def test_bool(tolerance, shape):
+    rng = np.random.default_rng(0)
+    image = rng.random(shape) > 0.4
+    image_uint8 = image.astype(np.uint8)
+    asymmetric = np.array([[0, 1, 0], [0, 1, 1], [0, 0, 0]], dtype=bool)
+    for footprint in [None, asymmetric]:
+        for seed in [(0, 0), (5, 6), (-1, -1)]:
+            expected = flood(image_uint8, seed, footprint=footprint,
+                             tolerance=tolerance)
+            np.testing.assert_array_equal(
+                flood(image, seed, footprint=footprint, tolerance=tolerance),
+                expected)
+            filled = image.copy()
+            filled[expected] = True
+            np.testing.assert_array_equal(
+                flood_fill(image, seed, True, footprint=footprint,
+                           tolerance=tolerance),
+                filled)
+            # the new value is cast to bool, as when assigned
+            for new_value in [2, 0.5]:
+                output = flood_fill(image, seed, new_value,
+                                    footprint=footprint, tolerance=tolerance)
+                np.testing.assert_array_equal(output, filled)
+                assert output.view(np.uint8).max() <= 1
+
+
+@pytest.mark.parametrize("tolerance", [None, 1])
+@pytest.mark.parametrize("order", ["C", "F"])
+def test_fill_written_by_loops(tolerance, order, monkeypatch):
+    # the flood loops write the new value to the fill of contiguous images
+    monkeypatch.setattr(_flood_fill, '_MAX_PROPAGATION_SIZE', 0)
+    rng = np.random.default_rng(0)
+    image = np.asarray(rng.integers(0, 4, size=(30, 40)), order=order)
+    mask = flood(image, (5, 6), tolerance=tolerance)
+    expected = image.copy()
+    expected[mask] = 7
+
+    filled = flood_fill(image, (5, 6), 7.6, tolerance=tolerance)
+    np.testing.assert_array_equal(filled, expected)
+    assert not np.shares_memory(filled, image)
+
+    filled = flood_fill(image, (5, 6), 7.6, tolerance=tolerance,
+                        in_place=True)
+    assert filled is image
+    np.testing.assert_array_equal(image, expected)
+
+    # and to the fill of non-contiguous images, read in place
+    image = np.zeros((30, 80), dtype=np.int64)
+    flood_fill(image[:, ::2], (5, 6), 7, tolerance=tolerance, in_place=True)
+    assert np.all(image[:, ::2] == 7)
+    assert np.all(image[:, 1::2] == 0)
+
+
+@pytest.mark.parametrize("tolerance", [None, 1])
+def test_strided_image(tolerance, monkeypatch):
+    # images of any strides are filled in place by the flood loops
+    monkeypatch.setattr(_flood_fill, '_MAX_PROPAGATION_SIZE', 0)
+    rng = np.random.default_rng(0)
+    volume = rng.integers(0, 4, size=(12, 14, 16))
+    views = [volume.transpose(1, 2, 0), volume[::2, :, ::3],
+             volume[:, ::-1], np.broadcast_to(volume[0], (5, 14, 16))]
+    for view in views:
+        expected = flood(np.ascontiguousarray(view), (3, 4, 5),
+                         connectivity=1, tolerance=tolerance)
+        np.testing.assert_array_equal(
+            flood(view, (3, 4, 5), connectivity=1, tolerance=tolerance),
+            expected)
+
+
+def test_mask_layout(monkeypatch):
+    # the mask written by the flood loops is laid out as the image
+    monkeypatch.setattr(_flood_fill, '_MAX_PROPAGATION_SIZE', 0)
+    rng = np.random.default_rng(0)
+    volume = rng.integers(0, 2, size=(12, 14, 16))
+    expected = flood(volume, (3, 4, 5))
+    cases = [(volume, (3, 4, 5), expected),
+             (np.asfortranarray(volume), (3, 4, 5), expected),
+             (volume.transpose(2, 0, 1), (5, 3, 4),
+              expected.transpose(2, 0, 1))]
+    for image, seed, expected_mask in cases:
+        mask = flood(image, seed)
+        assert mask.strides == tuple(stride // image.itemsize
+                                     for stride in image.strides)
+        np.testing.assert_array_equal(mask, expected_mask)
+
+
+def test_reused_flags(monkeypatch):
+    # the flags reused by the floods of the same shape are reset each time
+    monkeypatch.setattr(_flood_fill, '_MAX_PROPAGATION_SIZE', 0)
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 2, size=(30, 40))
+    expected = [flood(image[:, ::2], seed) for seed in [(0, 0), (5, 6)]]
+    for _ in range(2):
+        for seed, mask in zip([(0, 0), (5, 6)], expected):
+            np.testing.assert_array_equal(flood(image[:, ::2], seed), mask)
+            np.testing.assert_array_equal(
+                flood(np.ascontiguousarray(image[:, ::2]), seed), mask)
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint64, np.int8, np.int64,
+                                   np.float32])
+def test_tolerance_limits(dtype, monkeypatch):
+    # the values at and beyond both limits of the tolerance, and at the ends
+    # of the range of the dtype, with the comparisons of the flood loops
+    try:
+        info = np.iinfo(dtype)
+    except ValueError:
+        info = np.finfo(dtype)
+    values = np.array([info.min, info.min + 1, 0, 1, 2, 3, 4, 5, 6,
+                       info.max - 1, info.max], dtype=dtype)
+    rng = np.random.default_rng(0)
+    image = rng.choice(values, size=(40, 50))
+    image[20, 25] = 3
+    image[0, 0] = info.max
+    image[0, 1] = info.min
+    cases = [((20, 25), 2), ((20, 25), 3), ((20, 25), 0), ((20, 25), -1),
+             ((0, 0), -1), ((0, 1), -1), ((0, 0), 1), ((20, 25), np.inf),
+             ((20, 25), np.nan)]
+    expected = [flood(image, seed, tolerance=tolerance)
+                for seed, tolerance in cases]
+    for (seed, tolerance), mask in zip(cases, expected):
+        if tolerance < 0:
+            # only the seed is filled
+            assert mask.sum() == 1 and mask[seed]
+        elif not np.isfinite(tolerance):
+            # every value is within the tolerance
+            assert mask.all()
+    monkeypatch.setattr(_flood_fill, '_MAX_PROPAGATION_SIZE', 0)
+    for (seed, tolerance), mask in zip(cases, expected):
+        np.testing.assert_array_equal(
+            flood(image, seed, tolerance=tolerance), mask)
+    # the bounds are clipped to the range of the dtype
+    assert _flood_fill._tolerance_bounds(image.dtype, info.max, -1)[0] == \
+        info.max
+    assert _flood_fill._tolerance_bounds(image.dtype, info.min, -1)[1] == \
+        info.min
+
+
+@pytest.mark.parametrize("tolerance", [None, 1])
+@pytest.mark.parametrize("num_workers", [None, 1, 3])
+def test_flood_many(tolerance, num_workers):
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 4, size=(300, 280)).astype(np.uint8)
+    seeds = [(0, 0), (150, 140), (299, 279), (10, 200), (150, 140)]
+    expected = np.zeros(image.shape, dtype=bool)
+    for seed in seeds:
+        expected |= flood(image, seed, connectivity=1, tolerance=tolerance)
+    mask = flood_many(image, seeds, connectivity=1, tolerance=tolerance,
+                      num_workers=num_workers)
+    np.testing.assert_array_equal(mask, expected)
+
+    assert not flood_many(image, [], num_workers=num_workers).any()
+
+
+def test_flood_many_skipped_seeds(monkeypatch):
+    # the seed points within the fill of earlier ones are not filled again
+    calls = []
+
+    def counted_flood(image, seed_point, **kwargs):
+        calls.append(seed_point)
+        return flood(image, seed_point, **kwargs)
+
+    monkeypatch.setattr(_flood_fill, 'flood', counted_flood)
+    image = np.zeros(300, dtype=np.uint8)
+    image[100] = 1
+    mask = flood_many(image, [0, 50, 200, -1, 100], num_workers=1)
+    assert mask.all()
+    assert calls == [(0,), (200,), (100,)]
+
+    calls.clear()
+    flood_many(image, [0, 50], tolerance=0, num_workers=1)
+    assert len(calls) == 2
+
+
 if __name__ == "__main__":
     np.testing.run_module_suite()